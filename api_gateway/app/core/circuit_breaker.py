@@ -0,0 +1,143 @@
+import logging
+import time
+from typing import Dict, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Per-service circuit breaker.
+
+    closed:    requests pass; consecutive failures are counted
+    open:      requests fail fast until the cool-down has elapsed
+    half_open: a limited number of trial requests decide between closed and open
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float, half_open_max_calls: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open_since: Optional[float] = None
+        self.half_open_calls = 0
+
+        # Metrics
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_failure: Optional[str] = None
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"🔌 Circuit {self.name}: {self.state} → {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self.failures = 0
+            self.opened_at = None
+        self.half_open_since = time.monotonic() if state == HALF_OPEN else None
+        self.half_open_calls = 0
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit lets a trial request through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent (reserves a trial slot when half-open)"""
+        if self.state == OPEN and self.retry_after() == 0:
+            self._transition(HALF_OPEN)
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self.half_open_calls < self.half_open_max_calls:
+            self.half_open_calls += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def release(self):
+        """Give back a trial slot without a verdict (e.g. the gateway's own pool was busy)"""
+        if self.state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED)
+        self.failures = 0
+
+    def record_failure(self, reason: str):
+        self.last_failure = reason
+        if self.state == HALF_OPEN:
+            self._transition(OPEN)
+            return
+
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def record_probe(self, healthy: bool, reason: str = None):
+        """
+        Signal from the active health monitor: a failing probe counts as a
+        failure, a passing probe shortens the cool-down of an open circuit,
+        closes a half-open one no trial request is deciding, and clears the
+        failures counted while closed
+        """
+        if not healthy:
+            self.record_failure(reason or "health probe failed")
+        elif self.state == OPEN:
+            self._transition(HALF_OPEN)
+        elif self.state == HALF_OPEN:
+            # Trial slots still taken after a whole cool-down were never given back
+            if self.half_open_calls == 0 or time.monotonic() - self.half_open_since >= self.recovery_timeout:
+                self._transition(CLOSED)
+        else:
+            self.failures = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "last_failure": self.last_failure
+        }
+
+
+# Circuit breakers, one per service name (see settings.SERVICE_MAP)
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the circuit breaker of a service (created on first use)"""
+    breaker = breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=settings.CIRCUIT_RECOVERY_TIMEOUT,
+            half_open_max_calls=settings.CIRCUIT_HALF_OPEN_MAX_CALLS
+        )
+        breakers[name] = breaker
+    return breaker
+
+
+def get_breaker_states() -> Dict[str, dict]:
+    """Breaker state of every known service"""
+    return {name: get_breaker(name).to_dict() for name in settings.SERVICE_MAP}
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request headers that change the upstream answer, so they are part of the key
+VARY_HEADERS = ("accept", "accept-encoding", "if-none-match", "if-modified-since", "range")
+
+# (status_code, raw_headers, body) shared by all waiters of one upstream call
+Snapshot = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+class RequestCoalescer:
+    """
+    Single-flight for identical concurrent GETs: the first request (leader)
+    goes upstream, identical requests arriving meanwhile wait for its result.
+    """
+
+    def __init__(self, routes: List[str], max_body_bytes: int):
+        self.routes = routes
+        self.max_body_bytes = max_body_bytes
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # Metrics
+        self.leaders = 0
+        self.coalesced = 0
+        self.not_shared = 0
+
+    def key_for(self, request: Request, identity: Optional[dict]) -> str:
+        query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+        parts = [request.method, request.url.path, query]
+        parts += [request.headers.get(header, "") for header in VARY_HEADERS]
+        parts.append(f"{identity.get('sub')}|{identity.get('role')}" if identity else "anonymous")
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    async def _snapshot(self, response: Response) -> Tuple[Optional[Snapshot], Response]:
+        """
+        Buffer the leader's response so it can be replayed to the waiters.
+        Returns (None, response) when the body is too large to share.
+        """
+        if not isinstance(response, StreamingResponse):
+            return (response.status_code, list(response.raw_headers), bytes(response.body)), response
+
+        chunks = []
+        size = 0
+        iterator = response.body_iterator.__aiter__()
+        async for chunk in iterator:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                # Leader keeps streaming the rest; waiters go upstream themselves
+                async def rest():
+                    for buffered in chunks:
+                        yield buffered
+                    async for remaining in iterator:
+                        yield remaining
+
+                response.body_iterator = rest()
+                return None, response
+
+        if response.background is not None:
+            await response.background()
+            response.background = None
+        snapshot = (response.status_code, list(response.raw_headers), b"".join(chunks))
+        return snapshot, replay(snapshot)
+
+    async def run(self, key: str, forward: Callable[[], Awaitable[Response]]) -> Response:
+        """Forward once per key; concurrent callers share the result"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            snapshot = await asyncio.shield(future)
+            if snapshot is None:
+                self.not_shared += 1
+                return await forward()
+            return replay(snapshot, coalesced=True)
+
+        self.leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await forward()
+            snapshot, response = await self._snapshot(response)
+            future.set_result(snapshot)
+            return response
+        except asyncio.CancelledError:
+            # Leader went away (client disconnected): waiters go upstream themselves
+            future.set_result(None)
+            raise
+        except Exception as e:
+            # Waiters get the same error (e.g. 503 from the circuit breaker)
+            future.set_exception(e)
+            # Mark as retrieved when nobody was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "enabled": settings.COALESCE_ENABLED,
+            "routes": self.routes,
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+            "not_shared": self.not_shared
+        }
+
+
+def replay(snapshot: Snapshot, coalesced: bool = False) -> Response:
+    """Build a fresh response from a shared snapshot"""
+    status_code, headers, body = snapshot
+    response = Response(content=body, status_code=status_code)
+    response.raw_headers = list(headers)
+    if coalesced:
+        response.raw_headers.append((b"x-coalesced", b"1"))
+    return response
+
+
+coalescer = RequestCoalescer(settings.COALESCE_ROUTES, settings.COALESCE_MAX_BODY_BYTES)
@@ -1,5 +1,10 @@
+import json
 import os
-from typing import Dict
+from typing import Dict, List
+
+def _url_list(name: str, default: str) -> List[str]:
+    """Comma separated URLs from env, or the single default URL"""
+    return [url.strip() for url in os.getenv(name, default).split(",") if url.strip()]
 
 class Settings:
     # Gateway
@@ -27,6 +32,35 @@ class Settings:
         "payment_service": PAYMENT_SERVICE_URL,
     }
     
+    # Backend instances per service route (comma separated, e.g.
+    # USER_SERVICE_URLS=http://user_service_1:8001,http://user_service_2:8001)
+    SERVICE_INSTANCES: Dict[str, List[str]] = {
+        "users": _url_list("USER_SERVICE_URLS", USER_SERVICE_URL),
+        "vehicles": _url_list("VEHICLE_SERVICE_URLS", VEHICLE_SERVICE_URL),
+        "bookings": _url_list("BOOKING_SERVICE_URLS", BOOKING_SERVICE_URL),
+        "payments": _url_list("PAYMENT_SERVICE_URLS", PAYMENT_SERVICE_URL),
+    }
+    
+    # Optional JSON file overriding SERVICE_INSTANCES, reloaded when it changes:
+    # {"users": {"policy": "p2c", "instances": ["http://a:8001", "http://b:8001"]}}
+    SERVICE_INSTANCES_FILE: str = os.getenv("SERVICE_INSTANCES_FILE", "")
+    SERVICE_INSTANCES_RELOAD_INTERVAL: float = float(os.getenv("SERVICE_INSTANCES_RELOAD_INTERVAL", "5"))
+    
+    # Load balancing: round_robin | least_outstanding | p2c (power of two choices on latency)
+    LB_POLICY: str = os.getenv("LB_POLICY", "round_robin")
+    
+    # Outlier ejection: consecutive failures before an instance is taken out of rotation
+    INSTANCE_EJECTION_FAILURES: int = int(os.getenv("INSTANCE_EJECTION_FAILURES", "3"))
+    INSTANCE_EJECTION_TIME: float = float(os.getenv("INSTANCE_EJECTION_TIME", "30"))
+    
+    # Route prefix -> service name (key of SERVICE_MAP)
+    SERVICE_NAMES: Dict[str, str] = {
+        "users": "user_service",
+        "vehicles": "vehicle_service",
+        "bookings": "booking_service",
+        "payments": "payment_service",
+    }
+    
     # Health check endpoints
     HEALTH_CHECK_ENDPOINTS: Dict[str, str] = {
         "user_service": f"{USER_SERVICE_URL}/health",
@@ -35,26 +69,182 @@ class Settings:
         "payment_service": f"{PAYMENT_SERVICE_URL}/health",
     }
     
+    # Background health monitor
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+    HEALTH_HISTORY_SIZE: int = int(os.getenv("HEALTH_HISTORY_SIZE", "30"))
+    
+    # Circuit breaker (per service)
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RECOVERY_TIMEOUT: float = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30"))
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+    # Upstream responses counted as failures
+    CIRCUIT_FAILURE_STATUS_CODES: set = {502, 503, 504}
+    
     # Request timeout
     REQUEST_TIMEOUT: float = 30.0
     
+    # Retries for idempotent requests (connect errors and RETRY_STATUS_CODES)
+    RETRY_MAX_RETRIES: int = int(os.getenv("RETRY_MAX_RETRIES", "2"))
+    RETRY_METHODS: set = {"GET", "HEAD", "OPTIONS"}
+    RETRY_STATUS_CODES: set = {502, 503, 504}
+    RETRY_BACKOFF_BASE: float = float(os.getenv("RETRY_BACKOFF_BASE", "0.025"))
+    
+    # Retry budget (token bucket per service): each request adds RETRY_BUDGET_RATIO
+    # tokens, each retry or hedge costs one, so retries stay a fraction of traffic
+    RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+    RETRY_BUDGET_MAX_TOKENS: float = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "10"))
+    RETRY_BUDGET_MIN_PER_SECOND: float = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+    
+    # Hedged requests: after the observed p95 latency, a second copy of an
+    # idempotent request is sent to another instance and the first response wins
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+    HEDGE_ROUTES: list = [
+        route.strip()
+        for route in os.getenv("HEDGE_ROUTES", "/api/users/me,/api/users/users/").split(",")
+        if route.strip()
+    ]
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+    HEDGE_MIN_DELAY: float = float(os.getenv("HEDGE_MIN_DELAY", "0.005"))
+    HEDGE_DEFAULT_DELAY: float = float(os.getenv("HEDGE_DEFAULT_DELAY", "0.1"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_LATENCY_WINDOW: int = int(os.getenv("HEDGE_LATENCY_WINDOW", "500"))
+    # The hedge delay (percentile of the window) is recomputed at most this often
+    HEDGE_DELAY_REFRESH: float = float(os.getenv("HEDGE_DELAY_REFRESH", "1.0"))
+    
+    # Gateway response cache for GET routes. Rules map route patterns ('*' = one
+    # path segment) to a TTL and a scope: "user" entries are per identity,
+    # "public" entries are shared (only for routes the upstream does not authorize)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_RULES: str = os.getenv("RESPONSE_CACHE_RULES", json.dumps({
+        "/api/users/users/*/verify": {"ttl": 30, "scope": "public"},
+        "/api/users/me": {"ttl": 15, "scope": "user"},
+        "/api/users/stats": {"ttl": 30, "scope": "user"},
+    }))
+    RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+    
+    # Request coalescing: identical concurrent GETs (method, URL, identity) on
+    # these route patterns share one upstream call
+    COALESCE_ENABLED: bool = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+    COALESCE_ROUTES: list = [
+        route.strip()
+        for route in os.getenv("COALESCE_ROUTES", "/api/users/users/*/verify,/api/users/me,/api/users/users/*").split(",")
+        if route.strip()
+    ]
+    COALESCE_MAX_BODY_BYTES: int = int(os.getenv("COALESCE_MAX_BODY_BYTES", str(1024 * 1024)))
+    
+    # Rate limiting (token buckets). Each rule applies to paths starting with
+    # "route", per client IP ("ip") or per token subject ("sub"); rate is in
+    # requests/second. Every matching rule must have a token for a request to pass.
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_RULES: str = os.getenv("RATE_LIMIT_RULES", json.dumps([
+        {"route": "/api/users/login", "by": "ip", "rate": 1, "burst": 5},
+        {"route": "/api/users/register", "by": "ip", "rate": 0.2, "burst": 3},
+        {"route": "/api/users/forgot-password", "by": "ip", "rate": 0.2, "burst": 3},
+        {"route": "/api/", "by": "ip", "rate": 50, "burst": 100},
+        {"route": "/api/", "by": "sub", "rate": 20, "burst": 40},
+    ]))
+    # Optional shared store so all gateway instances share the buckets
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    # Use the first X-Forwarded-For hop as client IP (only behind a trusted proxy)
+    RATE_LIMIT_TRUST_FORWARDED: bool = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+    
+    # Max in-flight requests per upstream (0 = unlimited), with a short wait
+    # queue; when it is full or the wait times out the client gets 429
+    UPSTREAM_DEFAULT_MAX_CONCURRENCY: int = int(os.getenv("UPSTREAM_DEFAULT_MAX_CONCURRENCY", "100"))
+    UPSTREAM_MAX_CONCURRENCY: Dict[str, int] = json.loads(os.getenv("UPSTREAM_MAX_CONCURRENCY", json.dumps({
+        "users": 64,
+    })))
+    UPSTREAM_QUEUE_SIZE: int = int(os.getenv("UPSTREAM_QUEUE_SIZE", "50"))
+    UPSTREAM_QUEUE_TIMEOUT: float = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "2"))
+    
+    # Upstream connection pools (one pooled client per service)
+    UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+    UPSTREAM_MAX_KEEPALIVE: int = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+    UPSTREAM_KEEPALIVE_EXPIRY: float = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+    UPSTREAM_CONNECT_TIMEOUT: float = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+    UPSTREAM_POOL_TIMEOUT: float = float(os.getenv("UPSTREAM_POOL_TIMEOUT", "5"))
+    UPSTREAM_HTTP2: bool = os.getenv("UPSTREAM_HTTP2", "false").lower() == "true"
+    
+    # Proxy mode: responses are streamed through untouched by default.
+    # Routes listed here (path prefixes, comma separated) keep the old
+    # "normalize" mode: buffered, parsed and re-encoded as JSON.
+    NORMALIZE_ROUTES: list = [
+        route.strip() for route in os.getenv("NORMALIZE_ROUTES", "").split(",") if route.strip()
+    ]
+    
     # JWT
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
+    # Must match user_service (tokens are verified at the gateway)
+    SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     
+    # Verified-token cache (entries expire at the token's exp)
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    TOKEN_CACHE_DEFAULT_TTL: float = float(os.getenv("TOKEN_CACHE_DEFAULT_TTL", "300"))
+    
+    # Shared secret sent with trusted identity headers (X-User-*).
+    # Backends only trust those headers when the secret matches.
+    GATEWAY_SHARED_SECRET: str = os.getenv("GATEWAY_SHARED_SECRET", "")
+    
     # CORS
     CORS_ORIGINS: list = ["*"]
     
-    # Public routes (không cần authentication)
+    # Public routes (không cần authentication) - exact paths
     PUBLIC_ROUTES: list = [
-        "/api/users/register",
-        "/api/users/login",
-        "/health",
         "/",
+        "/health",
+        "/api/health/all",
+        "/api/services",
         "/docs",
         "/redoc",
-        "/openapi.json"
+        "/openapi.json",
+        "/metrics",
     ]
     
+    # Public route prefixes (path and everything below it)
+    PUBLIC_ROUTE_PREFIXES: list = [
+        "/api/users/register",
+        "/api/users/login",
+    ]
+    
+    # Memoized route policies (see core/route_table.py)
+    ROUTE_CACHE_SIZE: int = int(os.getenv("ROUTE_CACHE_SIZE", "10000"))
+    
+    # Logging: JSON lines (or "text") written by a background thread.
+    # Records beyond LOG_QUEUE_SIZE pending are dropped rather than blocking.
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    
+    # Access log sampling for successful requests (errors and requests slower
+    # than LOG_SLOW_REQUEST_MS are always logged). Rules map route prefixes
+    # to a rate, the longest matching prefix wins: {"/health": 0, "/api/users/me": 0.05}
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    LOG_SAMPLE_RULES: Dict[str, float] = json.loads(os.getenv("LOG_SAMPLE_RULES", "{}"))
+    LOG_SLOW_REQUEST_MS: float = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+    
+    # Prometheus metrics on /metrics. Route labels are path templates (ids
+    # replaced by "{id}"); templates beyond METRICS_MAX_ROUTES and label sets
+    # beyond METRICS_MAX_SERIES per metric are reported as "other".
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_MAX_ROUTES: int = int(os.getenv("METRICS_MAX_ROUTES", "200"))
+    METRICS_MAX_SERIES: int = int(os.getenv("METRICS_MAX_SERIES", "2000"))
+    
+    # Tracing (W3C traceparent propagated to upstreams). New traces are
+    # sampled with TRACE_SAMPLE_RATE; incoming traceparents keep their decision.
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+    # OTLP/HTTP JSON endpoint, e.g. http://otel-collector:4318/v1/traces
+    OTLP_TRACES_ENDPOINT: str = os.getenv("OTLP_TRACES_ENDPOINT", "")
+    OTLP_TIMEOUT: float = float(os.getenv("OTLP_TIMEOUT", "5"))
+    # Where spans go without a reachable endpoint: console | file | none
+    TRACE_FALLBACK: str = os.getenv("TRACE_FALLBACK", "console")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    TRACE_QUEUE_SIZE: int = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+    TRACE_EXPORT_BATCH_SIZE: int = int(os.getenv("TRACE_EXPORT_BATCH_SIZE", "512"))
+    TRACE_EXPORT_INTERVAL: float = float(os.getenv("TRACE_EXPORT_INTERVAL", "2"))
+    
 settings = Settings()
\ No newline at end of file
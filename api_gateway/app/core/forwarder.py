@@ -1,74 +1,480 @@
 from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
 import httpx
 import logging
+import random
+import weakref
+from typing import Callable, Optional
 from .config import settings
+from .http_client import get_client, HOP_BY_HOP_HEADERS
+from .circuit_breaker import get_breaker
+from .load_balancer import get_pool, Instance, ServicePool
+from .retry import get_retry_budget, get_latency_tracker
+from .response_cache import response_cache, CacheRule
+from .coalescer import coalescer
+from .rate_limiter import acquire_concurrency_slot
+from .route_table import resolve_route, RoutePolicy
+from .metrics import UPSTREAM_ATTEMPT_DURATION, UPSTREAM_ERRORS
+from .tracing import start_span, current_span, CLIENT
 
 logger = logging.getLogger(__name__)
 
-async def forward_request(request: Request, target_url: str, authorization: str = None):
+# Requests that may change upstream data (invalidate cached responses)
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Trusted identity headers set by the gateway after JWT verification
+IDENTITY_HEADER_PREFIXES = ("x-user-", "x-gateway-")
+
+def build_identity_headers(identity: dict) -> dict:
+    """Identity headers for backends (they may skip re-verifying the JWT)"""
+    headers = {
+        "x-user-email": str(identity.get("sub", "")),
+        "x-user-role": str(identity.get("role", "")),
+    }
+    if identity.get("exp") is not None:
+        headers["x-user-token-exp"] = str(int(identity["exp"]))
+    if settings.GATEWAY_SHARED_SECRET:
+        headers["x-gateway-secret"] = settings.GATEWAY_SHARED_SECRET
+    return headers
+
+def build_upstream_headers(request: Request, authorization: str = None, identity: dict = None) -> dict:
+    """Copy client headers for the upstream request"""
+    # Client supplied identity headers are never trusted
+    headers = {
+        key: value for key, value in request.headers.items()
+        if key not in HOP_BY_HOP_HEADERS
+        and key != "host"
+        and not key.startswith(IDENTITY_HEADER_PREFIXES)
+    }
+    
+    # Add authorization if provided
+    if authorization:
+        headers["authorization"] = authorization
+    
+    if identity:
+        headers.update(build_identity_headers(identity))
+    
+    return headers
+
+def has_request_body(request: Request) -> bool:
+    """Check whether the client is sending a body"""
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        return content_length != "0"
+    return "transfer-encoding" in request.headers
+
+async def send_upstream(client: httpx.AsyncClient, request: Request, target_url: str, headers: dict, stream: bool) -> httpx.Response:
     """
-    Forward HTTP request to target service
+    Send the request upstream.
+    stream=True: the request body is forwarded as it arrives and only the
+    response headers are read (the body is streamed back later).
+    stream=False: request and response are buffered (normalize mode).
+    """
+    if stream:
+        # Body framing is redone by httpx: the client's Content-Length is kept,
+        # otherwise the body is sent chunked
+        content = request.stream() if has_request_body(request) else None
+    else:
+        content = await request.body()
+    
+    upstream_request = client.build_request(
+        method=request.method,
+        url=target_url,
+        headers=headers,
+        content=content,
+        params=request.query_params
+    )
+    # Redirects are never followed: the identity headers and gateway secret
+    # must not reach a host other than the configured upstream
+    return await client.send(upstream_request, stream=stream, follow_redirects=False)
+
+def gateway_location(location: str, instance_url: str, request: Request, target_path: str) -> str:
+    """
+    Location of an upstream redirect as the client must see it: redirects
+    within the upstream are mapped back under the gateway path, redirects to
+    other hosts (e.g. presigned object store URLs) are passed through
+    """
+    if location.startswith(instance_url):
+        location = location[len(instance_url):]
+        if location and location[0] not in "/?":
+            return instance_url + location  # another host sharing the prefix
+    elif not location.startswith("/") or location.startswith("//"):
+        return location
+    
+    path = request.url.path
+    if target_path and path.endswith(target_path):
+        path = path[:-len(target_path)]
+    return path.rstrip("/") + (location or "/")
+
+def build_streaming_response(response: httpx.Response) -> StreamingResponse:
+    """
+    Streaming pass-through: the upstream bytes/headers are streamed back
+    untouched (constant memory)
     """
+    logger.debug("✅ Response: %s (stream)", response.status_code)
+    
+    streaming_response = StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        background=BackgroundTask(response.aclose)
+    )
+    # Keep duplicate headers (e.g. Set-Cookie) and the original encoding/length
+    streaming_response.raw_headers = [
+        (key, value) for key, value in response.headers.raw
+        if key.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+    ]
+    return streaming_response
+
+def build_normalized_response(response: httpx.Response) -> JSONResponse:
+    """
+    Normalize mode: always return JSON
+    (non-JSON payloads are wrapped as {"data": text})
+    """
+    logger.debug("✅ Response: %s", response.status_code)
+    
+    # Parse response
     try:
-        # Get request data
-        body = await request.body()
+        if "application/json" in response.headers.get("content-type", ""):
+            content = response.json()
+        else:
+            content = {"data": response.text}
+    except Exception:
+        content = {"data": response.text}
+    
+    # Build response headers
+    response_headers = {}
+    for key, value in response.headers.items():
+        if key.lower() not in ['content-encoding', 'content-length', 'transfer-encoding', 'connection']:
+            response_headers[key] = value
+    
+    return JSONResponse(
+        content=content,
+        status_code=response.status_code,
+        headers=response_headers
+    )
+
+def release_after_body(response, release: Callable[[], None]):
+    """
+    Keep an upstream concurrency slot until a streamed body has been sent
+    (or the response is dropped); buffered responses release it at once
+    """
+    if not isinstance(response, StreamingResponse):
+        release()
+        return response
+    
+    iterator = response.body_iterator
+    background = response.background
+    
+    async def body():
+        try:
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            release()
+    
+    async def finish():
+        try:
+            if background is not None:
+                await background()
+        finally:
+            release()
+    
+    response.body_iterator = body()
+    response.background = BackgroundTask(finish)
+    # Client gone before the body was started: release when the response is dropped
+    weakref.finalize(response, release)
+    return response
+
+def is_retryable_request(request: Request) -> bool:
+    """Only idempotent requests without a body are retried or hedged"""
+    return request.method in settings.RETRY_METHODS and not has_request_body(request)
+
+def _discard(task: asyncio.Task):
+    """Cancel a losing attempt; close its response if it already arrived"""
+    def close_response(done: asyncio.Task):
+        if not done.cancelled() and done.exception() is None:
+            asyncio.ensure_future(done.result().aclose())
+    
+    task.cancel()
+    task.add_done_callback(close_response)
+
+class UpstreamCall:
+    """One proxied request: attempts, retries and hedges against a service pool"""
+    
+    def __init__(self, request: Request, service: str, target_path: str, headers: dict, normalize: bool):
+        self.request = request
+        self.service = service
+        self.target_path = target_path
+        self.headers = headers
+        self.stream = not normalize
+        self.pool: ServicePool = get_pool(service)
+        self.client = get_client(service)
+        self.budget = get_retry_budget(service)
+        self.latency = get_latency_tracker(service)
+    
+    async def attempt(self, instance: Instance) -> httpx.Response:
+        """Send one attempt to an instance, feeding its load balancing stats"""
+        target_url = f"{instance.url}/{self.target_path}" if self.target_path else instance.url
+        logger.debug("🎯 Forwarding to: %s", target_url)
         
-        # Prepare headers
-        headers = dict(request.headers)
-        headers.pop("host", None)
+        # Client span per attempt; the upstream continues the trace from it
+        span = start_span(
+            f"{self.request.method} {self.service}", CLIENT,
+            {"http.method": self.request.method, "http.url": target_url, "upstream": self.service}
+        )
+        headers = self.headers
+        traceparent = span.traceparent()
+        if traceparent:
+            headers = {**self.headers, "traceparent": traceparent}
         
-        # Add authorization if provided
-        if authorization:
-            headers["authorization"] = authorization
+        started = instance.start()
+        try:
+            response = await send_upstream(self.client, self.request, target_url, headers, self.stream)
+        except asyncio.CancelledError:
+            # Losing hedge: no verdict on the instance
+            instance.cancel()
+            span.set_attribute("cancelled", True)
+            span.end()
+            raise
+        except httpx.PoolTimeout as e:
+            # Gateway side saturation: no verdict on the instance
+            instance.cancel()
+            span.set_error(f"PoolTimeout: {e}")
+            span.end()
+            raise
+        except Exception as e:
+            latency = instance.finish(started, success=False)
+            if settings.METRICS_ENABLED:
+                UPSTREAM_ATTEMPT_DURATION.labels(self.service, "error").observe(latency)
+            span.set_error(f"{type(e).__name__}: {e}")
+            span.end()
+            raise
         
-        logger.info(f"🎯 Forwarding to: {target_url}")
-        logger.info(f"📋 Headers: {list(headers.keys())}")
+        location = response.headers.get("location")
+        if location and response.is_redirect:
+            response.headers["location"] = gateway_location(location, instance.url, self.request, self.target_path)
         
-        # Create HTTP client with timeout
-        async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as client:
-            
-            # Forward request
-            response = await client.request(
-                method=request.method,
-                url=target_url,
-                headers=headers,
-                content=body,
-                params=request.query_params,
-                follow_redirects=True
-            )
+        failed = response.status_code in settings.CIRCUIT_FAILURE_STATUS_CODES
+        latency = instance.finish(started, success=not failed)
+        if not failed:
+            self.latency.record(latency)
+        if settings.METRICS_ENABLED:
+            UPSTREAM_ATTEMPT_DURATION.labels(self.service, "failure" if failed else "success").observe(latency)
+        span.set_attribute("http.status_code", response.status_code)
+        if failed:
+            span.set_error(f"HTTP {response.status_code}")
+        span.end()
+        return response
+    
+    async def hedged_attempt(self, instance: Instance) -> httpx.Response:
+        """
+        Send an attempt; if no response arrives within the observed p95,
+        send a copy to another instance and keep whichever answers first
+        """
+        primary = asyncio.ensure_future(self.attempt(instance))
+        pending = {primary}
+        fallback = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.latency.hedge_delay())
+            if done or not self.budget.withdraw():
+                pending = set()
+                return await primary
             
-            logger.info(f"✅ Response: {response.status_code}")
+            self.latency.hedges += 1
+            hedge = asyncio.ensure_future(self.attempt(self.pool.choose(exclude=instance)))
+            pending.add(hedge)
+            logger.info(f"🪃 Hedged request to {self.service}")
             
-            # Parse response
+            winner = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    ok = task.exception() is None and task.result().status_code not in settings.RETRY_STATUS_CODES
+                    if ok and winner is None:
+                        winner = task
+                    elif fallback is None:
+                        fallback = task
+                    else:
+                        _discard(task)
+                
+                if winner is not None:
+                    if winner is hedge:
+                        self.latency.hedge_wins += 1
+                    if fallback is not None:
+                        _discard(fallback)
+                    return winner.result()
+            # Both copies failed: report the first outcome
+            return fallback.result()
+        finally:
+            for task in pending:
+                _discard(task)
+    
+    async def send(self, hedged: bool) -> httpx.Response:
+        """Send with retries on connect errors and retryable statuses, within the retry budget"""
+        retryable = is_retryable_request(self.request)
+        self.budget.deposit()
+        
+        instance = None
+        retries = 0
+        while True:
+            instance = self.pool.choose(exclude=instance)
+            can_retry = retryable and retries < settings.RETRY_MAX_RETRIES
             try:
-                if "application/json" in response.headers.get("content-type", ""):
-                    content = response.json()
+                if hedged and retryable:
+                    response = await self.hedged_attempt(instance)
                 else:
-                    content = {"data": response.text}
-            except Exception:
-                content = {"data": response.text}
+                    response = await self.attempt(instance)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if not (can_retry and self.budget.withdraw()):
+                    raise
+                logger.warning(f"🔁 Retry {retries + 1} for {self.service}: {type(e).__name__}")
+            else:
+                if response.status_code not in settings.RETRY_STATUS_CODES or not (can_retry and self.budget.withdraw()):
+                    return response
+                logger.warning(f"🔁 Retry {retries + 1} for {self.service}: HTTP {response.status_code}")
+                await response.aclose()
             
-            # Build response headers
-            response_headers = {}
-            for key, value in response.headers.items():
-                if key.lower() not in ['content-encoding', 'content-length', 'transfer-encoding', 'connection']:
-                    response_headers[key] = value
-            
-            return JSONResponse(
-                content=content,
-                status_code=response.status_code,
-                headers=response_headers
+            retries += 1
+            # Exponential backoff with full jitter
+            await asyncio.sleep(random.uniform(0, settings.RETRY_BACKOFF_BASE * (2 ** retries)))
+
+async def forward_request(
+    request: Request,
+    target_path: str,
+    authorization: str = None,
+    service: str = None,
+    identity: dict = None,
+    policy: RoutePolicy = None
+):
+    """
+    Forward HTTP request to target service
+    An instance of the service is picked by its load balancing policy and
+    `target_path` is appended to its URL.
+    Uses the pooled client of the service (keep-alive connections are reused).
+    `identity` holds the claims verified by the gateway.
+    `policy` (from the route table) decides the rest:
+    - streams by default; normalize keeps the buffered JSON behavior
+    - idempotent requests are retried within the service's retry budget
+      and, with hedge, hedged after the observed p95 latency
+    - GET routes with a cache rule are served from the response cache;
+      writes invalidate the cached entries of the service
+    - identical concurrent GETs on coalesced routes share one upstream call
+    Each upstream attempt is a client span of the request's trace and sends
+    its own traceparent. Requests to a service whose circuit is open fail
+    fast with 503.
+    """
+    if policy is None:
+        policy = resolve_route(request.url.path)
+    
+    cache_rule = cache_key = generation = None
+    if request.method == "GET" and not policy.normalize:
+        cache_rule = policy.cache_rule
+    if cache_rule:
+        cache_key = response_cache.key_for(request, cache_rule, identity)
+        # Client asked for revalidation: skip the cached copy
+        if "no-cache" not in request.headers.get("cache-control", ""):
+            entry = response_cache.get(cache_key)
+            if entry is not None:
+                current_span().set_attribute("gateway.cache", "hit")
+                return response_cache.serve(entry, request)
+        generation = response_cache.generation(service)
+    
+    async def forward():
+        # Upstream concurrency limit (429 when its queue is full), held until
+        # the response body has been streamed
+        release = await acquire_concurrency_slot(service)
+        try:
+            response = await _forward_upstream(
+                request, target_path, authorization, service, policy.normalize, identity, policy.hedge,
+                cache_rule, cache_key, generation
+            )
+        except BaseException:
+            release()
+            raise
+        return release_after_body(response, release)
+    
+    if policy.coalesce and request.method == "GET":
+        return await coalescer.run(coalescer.key_for(request, identity), forward)
+    return await forward()
+
+async def _forward_upstream(
+    request: Request,
+    target_path: str,
+    authorization: Optional[str],
+    service: str,
+    normalize: bool,
+    identity: Optional[dict],
+    hedge: bool,
+    cache_rule: Optional[CacheRule],
+    cache_key: Optional[str],
+    generation: Optional[int]
+):
+    """Circuit breaker check, upstream call and response building"""
+    breaker = get_breaker(settings.SERVICE_NAMES.get(service, service))
+    if not breaker.allow_request():
+        retry_after = max(1, int(breaker.retry_after() + 0.5))
+        UPSTREAM_ERRORS.labels(service, "circuit_open").inc()
+        logger.warning(f"🔌 Circuit open for {breaker.name} - failing fast")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service unavailable: {breaker.name} circuit is open",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
+    # Every path must give the breaker a verdict or its half-open slot back,
+    # including cancellation (client disconnect, shutdown)
+    settled = False
+    try:
+        headers = build_upstream_headers(request, authorization, identity)
+        
+        # Reuse pooled HTTP client of the target service
+        call = UpstreamCall(request, service, target_path, headers, normalize)
+        response = await call.send(hedged=hedge)
+        
+        if response.status_code in settings.CIRCUIT_FAILURE_STATUS_CODES:
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.record_success()
+        settled = True
+        
+        if request.method in WRITE_METHODS:
+            response_cache.invalidate(service)
+        
+        if cache_rule:
+            return await response_cache.store_and_serve(
+                response, request, cache_key, cache_rule, service, generation
             )
+        if normalize:
+            return build_normalized_response(response)
+        return build_streaming_response(response)
             
     except httpx.ConnectError as e:
+        breaker.record_failure("connect error")
+        settled = True
+        UPSTREAM_ERRORS.labels(service, "connect").inc()
         logger.error(f"❌ Connection error: {e}")
         raise HTTPException(
             status_code=503,
             detail="Service unavailable: Could not connect to backend service"
         )
     
+    except httpx.PoolTimeout as e:
+        # Gateway side saturation, not an upstream failure
+        breaker.release()
+        settled = True
+        UPSTREAM_ERRORS.labels(service, "pool_timeout").inc()
+        logger.error(f"⏱️ Connection pool exhausted: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Service busy: No free connection to backend service"
+        )
+    
     except httpx.TimeoutException as e:
+        breaker.record_failure("timeout")
+        settled = True
+        UPSTREAM_ERRORS.labels(service, "timeout").inc()
         logger.error(f"⏱️ Timeout error: {e}")
         raise HTTPException(
             status_code=504,
@@ -76,8 +482,16 @@ async def forward_request(request: Request, target_url: str, authorization: str
         )
     
     except Exception as e:
+        if not settled:
+            breaker.record_failure(type(e).__name__)
+            settled = True
+        UPSTREAM_ERRORS.labels(service, "error").inc()
         logger.error(f"❌ Unexpected error: {e}", exc_info=True)
         raise HTTPException(
             status_code=502,
             detail=f"Bad Gateway: {str(e)}"
-        )
\ No newline at end of file
+        )
+    
+    finally:
+        if not settled:
+            breaker.release()
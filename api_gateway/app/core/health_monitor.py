@@ -0,0 +1,195 @@
+import asyncio
+import httpx
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from .config import settings
+from .circuit_breaker import get_breaker
+from .load_balancer import get_pool
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceHealth:
+    """
+    Rolling health status and latency history of one service.
+    `healthy` comes from the HTTP result of the probes (2xx); `status` is
+    what the service reports in its /health body, for display only.
+    """
+
+    def __init__(self, name: str, url: str, history_size: int):
+        self.name = name
+        self.url = url
+        self.status = "unknown"
+        self.healthy = False
+        self.error: Optional[str] = None
+        self.latency_ms: Optional[float] = None
+        self.last_checked: Optional[str] = None
+        self.consecutive_failures = 0
+        self.history = deque(maxlen=history_size)
+        self.instances: Dict[str, str] = {}
+
+    def record(self, healthy: bool, status: str, latency_ms: Optional[float], error: Optional[str] = None):
+        self.healthy = healthy
+        self.status = status
+        self.error = error
+        self.latency_ms = latency_ms
+        self.last_checked = datetime.now(timezone.utc).isoformat()
+        self.consecutive_failures = 0 if healthy else self.consecutive_failures + 1
+        self.history.append((self.last_checked, healthy, status, latency_ms))
+
+    def to_dict(self, include_history: bool = False) -> dict:
+        latencies = [latency for _, _, _, latency in self.history if latency is not None]
+        healthy = sum(1 for _, ok, _, _ in self.history if ok)
+
+        result = {
+            "status": self.status,
+            "healthy": self.healthy,
+            "url": self.url,
+            "latency_ms": self.latency_ms,
+            "last_checked": self.last_checked,
+            "consecutive_failures": self.consecutive_failures,
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "availability": round(healthy / len(self.history), 4) if self.history else None
+        }
+        if len(self.instances) > 1:
+            result["instances"] = self.instances
+        if self.error:
+            result["error"] = self.error
+        if include_history:
+            result["history"] = [
+                {"timestamp": timestamp, "healthy": ok, "status": status, "latency_ms": latency}
+                for timestamp, ok, status, latency in self.history
+            ]
+        return result
+
+
+class HealthMonitor:
+    """
+    Probes the health endpoint of every service instance concurrently in the
+    background. A service is healthy while at least one instance is.
+    """
+
+    def __init__(self, services: Dict[str, str], interval: float, timeout: float, history_size: int):
+        self.interval = interval
+        self.timeout = timeout
+        # service name -> route of its instance pool
+        self.routes = {name: route for route, name in services.items()}
+        self.services = {
+            name: ServiceHealth(name, settings.HEALTH_CHECK_ENDPOINTS.get(name, ""), history_size)
+            for name in self.routes
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe_instance(self, instance) -> tuple:
+        """
+        Probe one instance; returns (healthy, status, latency_ms, error).
+        Any 2xx is healthy (as for the container healthchecks); the body's
+        "status" is only reported.
+        """
+        started = time.perf_counter()
+        try:
+            response = await self._client.get(f"{instance.url}/health")
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+
+            if response.is_success:
+                try:
+                    status = str(response.json().get("status", "healthy"))
+                except Exception:
+                    status = "healthy"
+                result = (True, status, latency_ms, None)
+            else:
+                result = (False, "unhealthy", latency_ms, f"HTTP {response.status_code}")
+
+        except httpx.ConnectError:
+            result = (False, "unreachable", None, "Connection refused")
+        except httpx.TimeoutException:
+            result = (False, "unreachable", None, f"Timeout after {self.timeout}s")
+        except Exception as e:
+            result = (False, "error", None, str(e))
+
+        # Unhealthy instances are skipped by the load balancer
+        instance.healthy = result[0]
+        return result
+
+    async def _probe(self, health: ServiceHealth):
+        try:
+            instances = get_pool(self.routes[health.name]).instances
+        except LookupError:
+            instances = []
+        if not instances:
+            health.record(False, "error", None, "No instances configured")
+            return
+
+        results = await asyncio.gather(*(self._probe_instance(instance) for instance in instances))
+        health.url = f"{instances[0].url}/health"
+        health.instances = {
+            instance.url: status for instance, (_, status, _, _) in zip(instances, results)
+        }
+
+        healthy = [(latency, status) for ok, status, latency, _ in results if ok]
+        if healthy:
+            latency, status = min(healthy, key=lambda result: result[0])
+            health.record(True, status, latency)
+        else:
+            health.record(*results[0])
+
+        # Active probes feed the circuit breaker too
+        get_breaker(health.name).record_probe(health.healthy, health.error)
+
+        if not health.healthy:
+            logger.warning(f"⚠️ {health.name}: {health.status} ({health.error})")
+
+    async def check_all(self):
+        """Probe every service concurrently"""
+        await asyncio.gather(*(self._probe(health) for health in self.services.values()))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error(f"❌ Health monitor error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🩺 Health monitor started (every {self.interval}s, timeout {self.timeout}s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def snapshot(self, include_history: bool = False) -> dict:
+        """Current health of all services, served from memory"""
+        services = {
+            name: health.to_dict(include_history) for name, health in self.services.items()
+        }
+        all_healthy = all(service["healthy"] for service in services.values())
+
+        return {
+            "gateway": "healthy",
+            "overall_status": "healthy" if all_healthy else "degraded",
+            "services": services,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
+
+health_monitor = HealthMonitor(
+    settings.SERVICE_NAMES,
+    interval=settings.HEALTH_CHECK_INTERVAL,
+    timeout=settings.HEALTH_CHECK_TIMEOUT,
+    history_size=settings.HEALTH_HISTORY_SIZE
+)
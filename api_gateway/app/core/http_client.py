@@ -0,0 +1,111 @@
+import httpx
+import logging
+from typing import Dict, Optional
+from .config import settings
+from .load_balancer import pools
+
+logger = logging.getLogger(__name__)
+
+# Hop-by-hop headers are never passed through the proxy
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade",
+}
+
+# Pooled HTTP clients, one per upstream service (created on startup)
+clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional 'h2' package (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Create a pooled AsyncClient using the configured limits"""
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(
+        settings.REQUEST_TIMEOUT,
+        connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+        pool=settings.UPSTREAM_POOL_TIMEOUT
+    )
+
+    http2 = settings.UPSTREAM_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("⚠️ UPSTREAM_HTTP2 enabled but 'h2' is not installed - falling back to HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+async def start_clients():
+    """Create one pooled client per upstream in SERVICE_ROUTES"""
+    for service in settings.SERVICE_ROUTES:
+        if service not in clients:
+            clients[service] = _build_client()
+
+    logger.info(
+        f"🔌 Upstream pools ready: {list(clients.keys())} "
+        f"(max_connections={settings.UPSTREAM_MAX_CONNECTIONS}, "
+        f"keepalive={settings.UPSTREAM_MAX_KEEPALIVE}, http2={settings.UPSTREAM_HTTP2})"
+    )
+
+
+async def close_clients():
+    """Close all pooled clients"""
+    for service, client in list(clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing client for {service}: {e}")
+    clients.clear()
+    logger.info("✅ Upstream pools closed")
+
+
+def get_client(service: str) -> httpx.AsyncClient:
+    """Get pooled client for a service (created lazily if startup was skipped)"""
+    client = clients.get(service)
+    if client is None:
+        client = _build_client()
+        clients[service] = client
+    return client
+
+
+def _pool_of(client: httpx.AsyncClient) -> Optional[object]:
+    """Return the underlying httpcore connection pool, if available"""
+    transport = getattr(client, "_transport", None)
+    return getattr(transport, "_pool", None)
+
+
+def get_pool_stats() -> Dict[str, dict]:
+    """Connection pool statistics per upstream (in-use, idle, waiting)"""
+    stats = {}
+
+    for service, client in clients.items():
+        pool = _pool_of(client)
+        connections = list(getattr(pool, "connections", []) or [])
+        requests = list(getattr(pool, "_requests", []) or [])
+
+        idle = sum(1 for conn in connections if conn.is_idle())
+        waiting = sum(1 for req in requests if req.is_queued())
+
+        stats[service] = {
+            "instances": [instance.url for instance in pools[service].instances] if service in pools else [],
+            "connections": len(connections),
+            "in_use": len(connections) - idle,
+            "idle": idle,
+            "waiting": waiting,
+            "max_connections": settings.UPSTREAM_MAX_CONNECTIONS,
+            "max_keepalive": settings.UPSTREAM_MAX_KEEPALIVE,
+            "closed": client.is_closed
+        }
+
+    return stats
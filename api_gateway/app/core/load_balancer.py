@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = "round_robin"
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "p2c"
+POLICIES = (ROUND_ROBIN, LEAST_OUTSTANDING, POWER_OF_TWO)
+
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+
+
+class Instance:
+    """One backend instance of a service"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.healthy = True  # last active probe result
+
+        # Metrics
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def is_available(self) -> bool:
+        return self.healthy and time.monotonic() >= self.ejected_until
+
+    def start(self) -> float:
+        """Mark a request as sent; returns its start time"""
+        self.outstanding += 1
+        self.requests += 1
+        return time.perf_counter()
+
+    def finish(self, started: float, success: bool) -> float:
+        """Record the outcome of a request; returns its latency (time to response headers)"""
+        self.outstanding -= 1
+        latency = time.perf_counter() - started
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+
+        if success:
+            self.consecutive_failures = 0
+            return latency
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.INSTANCE_EJECTION_FAILURES:
+            # Outlier ejection: take the instance out of rotation for a while
+            self.ejected_until = time.monotonic() + settings.INSTANCE_EJECTION_TIME
+            self.consecutive_failures = 0
+            self.ejections += 1
+            logger.warning(f"⏏️ Ejected {self.url} for {settings.INSTANCE_EJECTION_TIME}s")
+        return latency
+
+    def cancel(self):
+        """Forget a request that ended without a verdict (e.g. a losing hedge)"""
+        self.outstanding -= 1
+
+    def score(self) -> float:
+        """Expected wait on this instance: latency x queue depth"""
+        return (self.latency_ewma or 0.0) * (self.outstanding + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "available": self.is_available(),
+            "healthy": self.healthy,
+            "ejected_for_seconds": round(max(0.0, self.ejected_until - time.monotonic()), 1),
+            "outstanding": self.outstanding,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 2) if self.latency_ewma is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections
+        }
+
+
+class ServicePool:
+    """Backend instances of one service and the policy used to pick one"""
+
+    def __init__(self, service: str, urls: List[str], policy: str):
+        self.service = service
+        self.policy = policy
+        self.instances = [Instance(url) for url in urls]
+        self._next = 0
+
+    def update(self, urls: List[str], policy: str):
+        """Replace the instance list, keeping the stats of instances that stay"""
+        current = {instance.url: instance for instance in self.instances}
+        self.instances = [current.get(url.rstrip("/")) or Instance(url) for url in urls]
+        self.policy = policy
+
+    def choose(self, exclude: Optional[Instance] = None) -> Instance:
+        """Pick an instance; when none is available, fall back to all of them"""
+        if not self.instances:
+            raise LookupError(f"No instances configured for '{self.service}'")
+
+        candidates = [instance for instance in self.instances if instance.is_available()]
+        if not candidates:
+            candidates = self.instances
+        if exclude is not None and len(candidates) > 1:
+            candidates = [instance for instance in candidates if instance is not exclude]
+
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if self.policy == LEAST_OUTSTANDING:
+            fewest = min(instance.outstanding for instance in candidates)
+            return random.choice([instance for instance in candidates if instance.outstanding == fewest])
+
+        if self.policy == POWER_OF_TWO:
+            first, second = random.sample(candidates, 2)
+            return first if first.score() <= second.score() else second
+
+        self._next += 1
+        return candidates[self._next % len(candidates)]
+
+    def to_dict(self) -> dict:
+        return {
+            "policy": self.policy,
+            "instances": [instance.to_dict() for instance in self.instances]
+        }
+
+
+# Instance pools, one per service route (e.g. "users")
+pools: Dict[str, ServicePool] = {}
+_instances_file_mtime: Optional[float] = None
+_watch_task: Optional[asyncio.Task] = None
+
+
+def _read_instances() -> Dict[str, dict]:
+    """
+    Instance lists from settings, overridden by SERVICE_INSTANCES_FILE:
+    {"users": {"policy": "p2c", "instances": ["http://a:8001", ...]}}
+    or simply {"users": ["http://a:8001", ...]}
+    """
+    config = {
+        service: {"policy": settings.LB_POLICY, "instances": list(urls)}
+        for service, urls in settings.SERVICE_INSTANCES.items()
+    }
+
+    if settings.SERVICE_INSTANCES_FILE:
+        with open(settings.SERVICE_INSTANCES_FILE) as f:
+            data = json.load(f)
+        for service, entry in data.items():
+            if isinstance(entry, list):
+                entry = {"instances": entry}
+            config[service] = {
+                "policy": entry.get("policy", settings.LB_POLICY),
+                "instances": list(entry.get("instances", []))
+            }
+
+    for service, entry in config.items():
+        if entry["policy"] not in POLICIES:
+            raise ValueError(f"Unknown load balancing policy '{entry['policy']}' for '{service}'")
+        if not entry["instances"]:
+            raise ValueError(f"No instances configured for '{service}'")
+    return config
+
+
+def reload_instances() -> Dict[str, dict]:
+    """(Re)load instance lists without restarting; invalid files keep the old lists"""
+    global _instances_file_mtime
+
+    if settings.SERVICE_INSTANCES_FILE and os.path.exists(settings.SERVICE_INSTANCES_FILE):
+        _instances_file_mtime = os.path.getmtime(settings.SERVICE_INSTANCES_FILE)
+
+    config = _read_instances()
+    for service, entry in config.items():
+        if service in pools:
+            pools[service].update(entry["instances"], entry["policy"])
+        else:
+            pools[service] = ServicePool(service, entry["instances"], entry["policy"])
+    for service in set(pools) - set(config):
+        del pools[service]
+
+    logger.info(
+        "⚖️ Instances loaded: "
+        + ", ".join(f"{service}={len(pool.instances)} ({pool.policy})" for service, pool in pools.items())
+    )
+    return get_balancer_stats()
+
+
+async def _watch_instances_file():
+    """Reload when SERVICE_INSTANCES_FILE changes"""
+    while True:
+        await asyncio.sleep(settings.SERVICE_INSTANCES_RELOAD_INTERVAL)
+        try:
+            mtime = os.path.getmtime(settings.SERVICE_INSTANCES_FILE)
+            if mtime != _instances_file_mtime:
+                logger.info(f"🔄 {settings.SERVICE_INSTANCES_FILE} changed - reloading instances")
+                reload_instances()
+        except Exception as e:
+            logger.error(f"❌ Instance reload failed: {e}")
+
+
+async def start_load_balancer():
+    """Load instance lists and watch the instances file"""
+    global _watch_task
+    reload_instances()
+    if settings.SERVICE_INSTANCES_FILE:
+        _watch_task = asyncio.create_task(_watch_instances_file())
+
+
+async def stop_load_balancer():
+    global _watch_task
+    if _watch_task:
+        _watch_task.cancel()
+        try:
+            await _watch_task
+        except asyncio.CancelledError:
+            pass
+        _watch_task = None
+
+
+def get_pool(service: str) -> ServicePool:
+    """Get the instance pool of a service route (loaded lazily if startup was skipped)"""
+    if not pools:
+        reload_instances()
+    pool = pools.get(service)
+    if pool is None:
+        raise LookupError(f"Service '{service}' not found")
+    return pool
+
+
+def get_balancer_stats() -> Dict[str, dict]:
+    """Policy and per-instance state of every service"""
+    return {service: pool.to_dict() for service, pool in pools.items()}
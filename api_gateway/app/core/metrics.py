@@ -0,0 +1,362 @@
+"""
+Prometheus metrics (text exposition format, served on /metrics)
+
+Updates are plain float additions on a per-thread cell, so the hot path
+takes no lock and never contends; cells are summed when scraped. Gauges
+of state the gateway already tracks (caches, breakers, limiters) are read
+from their stats at scrape time instead of being updated per request.
+
+Label values must be bounded: routes are templates (ids replaced by
+"{id}", see route_table) capped at METRICS_MAX_ROUTES, and every metric
+collapses new label sets beyond METRICS_MAX_SERIES into "other".
+"""
+
+import logging
+from bisect import bisect_left
+from threading import get_ident
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from .config import settings
+from .security import token_cache
+from .response_cache import response_cache
+from .coalescer import coalescer
+from .circuit_breaker import breakers, CLOSED, HALF_OPEN, OPEN
+from .rate_limiter import rate_limiter, concurrency_limiters
+from .retry import retry_budgets, latency_trackers
+from .http_client import get_pool_stats
+from .load_balancer import pools
+from .logging_config import get_logging_stats
+from .tracing import exporter
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OVERFLOW = "other"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry: List["_Metric"] = []
+
+
+# ==================== PRIMITIVES ====================
+
+class _Child:
+    """Values of one label set, one cell per updating thread"""
+
+    __slots__ = ("_cells", "_size")
+
+    def __init__(self, size: int):
+        self._cells: Dict[int, list] = {}
+        self._size = size
+
+    def _cell(self) -> list:
+        ident = get_ident()
+        cell = self._cells.get(ident)
+        if cell is None:
+            cell = self._cells[ident] = [0.0] * self._size
+        return cell
+
+    def _totals(self) -> list:
+        totals = [0.0] * self._size
+        for cell in list(self._cells.values()):
+            for index, value in enumerate(cell):
+                totals[index] += value
+        return totals
+
+
+class CounterChild(_Child):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0):
+        self._cell()[0] += amount
+
+
+class GaugeChild(_Child):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0):
+        self._cell()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._cell()[0] -= amount
+
+
+class HistogramChild(_Child):
+    """Cell layout: one count per bucket (+Inf last), then sum, then count"""
+
+    __slots__ = ("_bounds",)
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        super().__init__(len(bounds) + 3)
+        self._bounds = bounds
+
+    def observe(self, value: float):
+        cell = self._cell()
+        cell[bisect_left(self._bounds, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, object]]) -> str:
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + text + "}" if text else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, _Child] = {}
+        registry.append(self)
+
+    def _new_child(self) -> _Child:
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child of a label set (create it once and keep it when the labels are fixed)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(self._children) >= settings.METRICS_MAX_SERIES:
+                values = (OVERFLOW,) * len(self.labelnames)
+                child = self._children.get(values)
+                if child is not None:
+                    return child
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_labels(zip(self.labelnames, values))} {_number(child._totals()[0])}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.bounds)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            pairs = list(zip(self.labelnames, values))
+            totals = child._totals()
+            cumulative = 0.0
+            for bound, count in zip(self.bounds + (float("inf"),), totals):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(pairs + [('le', _number(bound))])} {_number(cumulative)}"
+            yield f"{self.name}_sum{_labels(pairs)} {_number(totals[-2])}"
+            yield f"{self.name}_count{_labels(pairs)} {_number(totals[-1])}"
+
+
+class Collected(_Metric):
+    """Metric read from existing state at scrape time: fn() yields (label values, value)"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str],
+        fn: Callable[[], Iterable[Tuple[tuple, float]]]
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self) -> Iterable[str]:
+        try:
+            collected = list(self.fn())
+        except Exception as e:
+            logger.warning(f"⚠️ Metric {self.name} not collected: {e}")
+            return
+        for values, value in collected:
+            if value is not None:
+                yield f"{self.name}{_labels(zip(self.labelnames, values))} {_number(value)}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format"""
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+_routes: set = set()
+
+
+def route_label(template: Optional[str]) -> str:
+    """Bounded route label: the first METRICS_MAX_ROUTES templates, then "other" """
+    if template in _routes:
+        return template
+    if template is None:
+        return "unmatched"
+    if len(_routes) < settings.METRICS_MAX_ROUTES:
+        _routes.add(template)
+        return template
+    return OVERFLOW
+
+
+# ==================== GATEWAY METRICS ====================
+
+REQUEST_DURATION = Histogram(
+    "gateway_http_request_duration_seconds",
+    "Time to response headers of requests through the gateway (_count is the request count)",
+    ("route", "method", "status", "upstream")
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "gateway_http_requests_in_flight",
+    "Requests being handled by the gateway",
+    ("upstream",)
+)
+UPSTREAM_ATTEMPT_DURATION = Histogram(
+    "gateway_upstream_attempt_duration_seconds",
+    "Time to response headers (or to the error) of each upstream attempt, retries and hedges included",
+    ("upstream", "outcome")
+)
+UPSTREAM_ERRORS = Counter(
+    "gateway_upstream_errors_total",
+    "Upstream calls that failed without a response (connect, timeout, pool_timeout, circuit_open, error)",
+    ("upstream", "kind")
+)
+
+
+def observe_request(route: str, method: str, status: int, upstream: str, seconds: float):
+    REQUEST_DURATION.labels(route, method, str(status), upstream).observe(seconds)
+
+
+def _register_state_metrics():
+    breaker_states = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    Collected(
+        "gateway_response_cache_requests_total", "Response cache lookups by result", "counter", ("result",),
+        lambda: [(("hit",), response_cache.hits), (("miss",), response_cache.misses)]
+    )
+    Collected(
+        "gateway_response_cache_hit_ratio", "Response cache hits / lookups since start", "gauge", (),
+        lambda: [((), response_cache.stats()["hit_ratio"])]
+    )
+    Collected(
+        "gateway_response_cache_bytes", "Bytes held by the response cache", "gauge", (),
+        lambda: [((), response_cache._bytes)]
+    )
+    Collected(
+        "gateway_response_cache_evictions_total", "Response cache entries evicted by the size limit", "counter", (),
+        lambda: [((), response_cache.evictions)]
+    )
+    Collected(
+        "gateway_token_cache_requests_total", "Verified-token cache lookups by result", "counter", ("result",),
+        lambda: [(("hit",), token_cache.hits), (("miss",), token_cache.misses)]
+    )
+    Collected(
+        "gateway_token_cache_hit_ratio", "Verified-token cache hits / lookups since start", "gauge", (),
+        lambda: [((), token_cache.stats()["hit_ratio"])]
+    )
+    Collected(
+        "gateway_coalesced_requests_total", "GETs answered from another identical in-flight request", "counter", (),
+        lambda: [((), coalescer.coalesced)]
+    )
+    Collected(
+        "gateway_circuit_breaker_state", "Circuit state per service (0 closed, 1 half open, 2 open)", "gauge",
+        ("service",),
+        lambda: [((name,), breaker_states[breaker.state]) for name, breaker in list(breakers.items())]
+    )
+    Collected(
+        "gateway_circuit_breaker_rejected_total", "Requests failed fast by an open circuit", "counter", ("service",),
+        lambda: [((name,), breaker.rejected) for name, breaker in list(breakers.items())]
+    )
+    Collected(
+        "gateway_rate_limited_total", "Requests rejected by a rate limit rule", "counter", ("route",),
+        lambda: [((route,), count) for route, count in list(rate_limiter.limited.items())]
+    )
+    Collected(
+        "gateway_upstream_concurrency_in_flight", "Requests holding an upstream concurrency slot", "gauge",
+        ("upstream",),
+        lambda: [((service,), limiter.in_flight) for service, limiter in list(concurrency_limiters.items())]
+    )
+    Collected(
+        "gateway_upstream_concurrency_waiting", "Requests queued for an upstream concurrency slot", "gauge",
+        ("upstream",),
+        lambda: [((service,), limiter.waiting) for service, limiter in list(concurrency_limiters.items())]
+    )
+    Collected(
+        "gateway_upstream_concurrency_rejected_total", "Requests rejected with 429 by an upstream concurrency limit",
+        "counter", ("upstream",),
+        lambda: [
+            ((service,), limiter.rejected + limiter.timed_out) for service, limiter in list(concurrency_limiters.items())
+        ]
+    )
+    Collected(
+        "gateway_retries_total", "Upstream retries sent within the retry budget", "counter", ("upstream",),
+        lambda: [((service,), budget.retries) for service, budget in list(retry_budgets.items())]
+    )
+    Collected(
+        "gateway_hedged_requests_total", "Hedged copies sent to a second instance", "counter", ("upstream",),
+        lambda: [((service,), tracker.hedges) for service, tracker in list(latency_trackers.items())]
+    )
+    Collected(
+        "gateway_upstream_connections", "Pooled upstream connections by state", "gauge", ("upstream", "state"),
+        lambda: [
+            ((service, state), stats[state])
+            for service, stats in get_pool_stats().items()
+            for state in ("in_use", "idle", "waiting")
+        ]
+    )
+    Collected(
+        "gateway_upstream_instance_available", "1 when an instance is healthy and not ejected", "gauge",
+        ("upstream", "instance"),
+        lambda: [
+            ((service, instance.url), int(instance.is_available()))
+            for service, pool in list(pools.items())
+            for instance in pool.instances
+        ]
+    )
+    Collected(
+        "gateway_log_records_dropped_total", "Log records dropped because the log queue was full", "counter", (),
+        lambda: [((), get_logging_stats()["dropped"])]
+    )
+    Collected(
+        "gateway_trace_spans_total", "Finished spans by outcome (exported, fallback, dropped)", "counter", ("result",),
+        lambda: [
+            (("exported",), exporter.exported), (("fallback",), exporter.fallback), (("dropped",), exporter.dropped)
+        ]
+    )
+
+
+_register_state_metrics()
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== TOKEN BUCKET STORES ====================
+
+class BucketStore:
+    """Interface for token bucket storage"""
+
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryBucketStore(BucketStore):
+    """In-process token buckets (per gateway process), bounded LRU"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [burst, now]
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1 - tokens) / rate
+
+
+# Atomic token bucket; uses the Redis clock so all gateways agree
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local data = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore(BucketStore):
+    """Token buckets shared by all gateway instances through Redis"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        allowed, retry_after = await self._script(keys=[f"ratelimit:{key}"], args=[rate, burst])
+        return bool(allowed), float(retry_after)
+
+    async def close(self):
+        await self._redis.close()
+
+
+# ==================== RATE LIMIT RULES ====================
+
+class RateLimitRule:
+    """`rate` requests/second with bursts of `burst`, per client IP or token subject"""
+
+    def __init__(self, rule_id: int, route: str, by: str, rate: float, burst: float):
+        if by not in ("ip", "sub"):
+            raise ValueError(f"Rate limit 'by' must be 'ip' or 'sub', got '{by}'")
+        if rate <= 0 or burst < 1:
+            # A bucket that never refills would block the route forever
+            raise ValueError(f"Rate limit for '{route}' needs rate > 0 and burst >= 1, got {rate}/{burst}")
+        self.rule_id = rule_id
+        self.route = route
+        self.by = by
+        self.rate = rate
+        self.burst = burst
+
+    def to_dict(self) -> dict:
+        return {"route": self.route, "by": self.by, "rate": self.rate, "burst": self.burst}
+
+
+def load_rules(raw: str) -> List[RateLimitRule]:
+    """Rules from JSON: [{"route": "/api/users/login", "by": "ip", "rate": 1, "burst": 5}, ...]"""
+    return [
+        RateLimitRule(
+            index, rule["route"], rule.get("by", "ip"), float(rule["rate"]), float(rule.get("burst", rule["rate"]))
+        )
+        for index, rule in enumerate(json.loads(raw))
+    ]
+
+
+def client_ip(request: Request) -> str:
+    """Client address (first X-Forwarded-For hop when the gateway sits behind a trusted proxy)"""
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """Applies every matching rule; a request passes only if all its buckets have a token"""
+
+    def __init__(self, rules: List[RateLimitRule], store: BucketStore):
+        self.rules = rules
+        self.store = store
+        self._fallback = MemoryBucketStore(settings.RATE_LIMIT_MAX_KEYS)
+
+        # Metrics
+        self.allowed = 0
+        self.limited: Dict[str, int] = {}
+
+    async def _take(self, key: str, rule: RateLimitRule) -> Tuple[bool, float]:
+        try:
+            return await self.store.take(key, rule.rate, rule.burst)
+        except Exception as e:
+            # Shared store down: keep limiting per process rather than failing open
+            logger.warning(f"⚠️ Rate limit store failed ({e}) - using local buckets")
+            return await self._fallback.take(key, rule.rate, rule.burst)
+
+    async def check(self, request: Request, rules: Tuple[RateLimitRule, ...], subject: Optional[str] = None):
+        """
+        Raise 429 when a bucket of the given rules (resolved by the route table)
+        is empty; "sub" rules are keyed by `subject`, "ip" rules by client IP
+        """
+        if not settings.RATE_LIMIT_ENABLED or not rules:
+            return
+
+        for rule in rules:
+            identity = subject if rule.by == "sub" else client_ip(request)
+            if not identity:
+                continue
+
+            allowed, retry_after = await self._take(f"{rule.rule_id}:{rule.route}:{rule.by}:{identity}", rule)
+            if not allowed:
+                self.limited[rule.route] = self.limited.get(rule.route, 0) + 1
+                logger.warning(f"🚦 Rate limited {rule.by}={identity} on {rule.route}")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+                )
+        self.allowed += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.RATE_LIMIT_ENABLED,
+            "store": type(self.store).__name__,
+            "rules": [rule.to_dict() for rule in self.rules],
+            "allowed_checks": self.allowed,
+            "limited": self.limited
+        }
+
+
+# ==================== UPSTREAM CONCURRENCY LIMITS ====================
+
+class ConcurrencyLimiter:
+    """
+    Max in-flight requests to one upstream with a short wait queue.
+    When the queue is full, or the wait exceeds the timeout, 429 is returned.
+    """
+
+    def __init__(self, service: str, max_concurrency: int, queue_size: int, queue_timeout: float):
+        self.service = service
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+
+        # Metrics
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _reject(self, reason: str):
+        logger.warning(f"🚦 {self.service}: {reason} ({self.in_flight} in flight, {self.waiting} queued)")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Service {self.service} is at capacity, please retry",
+            headers={"Retry-After": "1"}
+        )
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed (429 when it is full or times out)"""
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                self._reject("queue full")
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                self._reject("queue timeout")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def to_dict(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+
+
+# Global rate limiter and per-upstream concurrency limiters
+rate_limiter = RateLimiter(load_rules(settings.RATE_LIMIT_RULES), MemoryBucketStore(settings.RATE_LIMIT_MAX_KEYS))
+concurrency_limiters: Dict[str, ConcurrencyLimiter] = {}
+
+
+async def init_rate_limiter():
+    """Use the shared Redis store when configured (falls back to memory)"""
+    if not settings.RATE_LIMIT_REDIS_URL:
+        logger.info("✅ Rate limiting using in-memory buckets")
+        return
+
+    try:
+        store = RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+        await store._redis.ping()
+        rate_limiter.store = store
+        logger.info(f"✅ Rate limiting using Redis: {settings.RATE_LIMIT_REDIS_URL}")
+    except Exception as e:
+        logger.warning(f"⚠️ Redis rate limit store unavailable ({e}) - using in-memory buckets")
+
+
+async def close_rate_limiter():
+    await rate_limiter.store.close()
+
+
+def get_concurrency_limiter(service: str) -> Optional[ConcurrencyLimiter]:
+    """Concurrency limiter of an upstream (None when unlimited)"""
+    limiter = concurrency_limiters.get(service)
+    if limiter is None:
+        max_concurrency = settings.UPSTREAM_MAX_CONCURRENCY.get(service, settings.UPSTREAM_DEFAULT_MAX_CONCURRENCY)
+        if max_concurrency <= 0:
+            return None
+        limiter = ConcurrencyLimiter(
+            service, max_concurrency, settings.UPSTREAM_QUEUE_SIZE, settings.UPSTREAM_QUEUE_TIMEOUT
+        )
+        concurrency_limiters[service] = limiter
+    return limiter
+
+
+async def acquire_concurrency_slot(service: str) -> Callable[[], None]:
+    """
+    Take one concurrency slot of an upstream; returns the function releasing
+    it (safe to call more than once), so the slot can outlive the handler
+    while a response body is still streaming
+    """
+    limiter = get_concurrency_limiter(service)
+    if limiter is None:
+        return lambda: None
+
+    await limiter.acquire()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            limiter.release()
+
+    return release
+
+
+def get_limit_stats() -> dict:
+    return {
+        "rate_limits": rate_limiter.stats(),
+        "upstream_concurrency": {service: limiter.to_dict() for service, limiter in concurrency_limiters.items()}
+    }
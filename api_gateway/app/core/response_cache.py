@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+import httpx
+from .config import settings
+from .http_client import HOP_BY_HOP_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# Headers never stored with a cached response
+UNCACHED_HEADERS = HOP_BY_HOP_HEADERS | {"set-cookie", "date", "age"}
+
+# Scopes of a cache rule: "user" entries are keyed by the caller's identity,
+# "public" entries are shared (only for routes the upstream does not authorize)
+USER_SCOPE = "user"
+PUBLIC_SCOPE = "public"
+
+
+class CacheRule:
+    """TTL rule for a route pattern ('*' matches one path segment, see route_table)"""
+
+    def __init__(self, pattern: str, ttl: float, scope: str = USER_SCOPE):
+        self.pattern = pattern
+        self.ttl = ttl
+        self.scope = scope
+
+
+class CacheEntry:
+    def __init__(self, status_code: int, headers: list, body: bytes, etag: str, ttl: float, service: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.service = service
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+        self.size = len(body) + sum(len(key) + len(value) for key, value in headers) + 256
+
+
+def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as required for If-None-Match"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == bare:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Gateway cache for GET responses of configured routes.
+    LRU bounded by total bytes; entries of a service are dropped when a
+    write request to that service goes through the gateway.
+    """
+
+    def __init__(self, rules: List[CacheRule], max_bytes: int, max_entry_bytes: int):
+        self.rules = rules
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        # Bumped by every write: responses fetched before it are not stored
+        self._generations: Dict[str, int] = {}
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def key_for(self, request: Request, rule: CacheRule, identity: Optional[dict]) -> str:
+        query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+        parts = [request.url.path, query, request.headers.get("accept-encoding", "")]
+        if rule.scope == USER_SCOPE:
+            parts.append(f"{identity.get('sub')}|{identity.get('role')}" if identity else "anonymous")
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def generation(self, service: str) -> int:
+        return self._generations.get(service, 0)
+
+    # ==================== LOOKUP ====================
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry.expires_at:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def serve(self, entry: CacheEntry, request: Request) -> Response:
+        """Reply from a cache entry (304 when the client's copy is current)"""
+        age = str(int(time.monotonic() - entry.stored_at))
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers={"etag": entry.etag, "age": age, "x-cache": "HIT"})
+
+        response = Response(content=entry.body, status_code=entry.status_code)
+        response.raw_headers = entry.headers + [
+            (b"age", age.encode()),
+            (b"x-cache", b"HIT"),
+        ]
+        return response
+
+    # ==================== STORE ====================
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _store(self, key: str, entry: CacheEntry):
+        self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _ttl_for(self, response: httpx.Response, rule: CacheRule) -> float:
+        """Rule TTL, shortened by the upstream's Cache-Control; 0 means do not store"""
+        directives = _parse_cache_control(response.headers.get("cache-control", ""))
+        if "no-store" in directives or "no-cache" in directives:
+            return 0
+        if "private" in directives and rule.scope == PUBLIC_SCOPE:
+            return 0
+        for name in ("s-maxage", "max-age"):
+            value = directives.get(name)
+            if value and value.isdigit():
+                return min(rule.ttl, int(value))
+        return rule.ttl
+
+    async def store_and_serve(
+        self,
+        response: httpx.Response,
+        request: Request,
+        key: str,
+        rule: CacheRule,
+        service: str,
+        generation: int
+    ) -> Response:
+        """
+        Buffer a streamed upstream response and cache it when allowed.
+        Bodies larger than the entry limit are streamed through uncached.
+        """
+        headers = [
+            (name, value) for name, value in response.headers.raw
+            if name.decode("latin-1").lower() not in UNCACHED_HEADERS
+        ]
+        ttl = self._ttl_for(response, rule) if response.status_code == 200 else 0
+        if "set-cookie" in response.headers:
+            ttl = 0
+
+        length = response.headers.get("content-length")
+        if ttl <= 0 or (length and length.isdigit() and int(length) > self.max_entry_bytes):
+            return self._stream_through(response)
+
+        chunks = []
+        size = 0
+        raw = response.aiter_raw()
+        async for chunk in raw:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > self.max_entry_bytes:
+                return self._stream_through(response, chunks, raw)
+        await response.aclose()
+        body = b"".join(chunks)
+
+        etag = response.headers.get("etag")
+        if not etag:
+            etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+            headers.append((b"etag", etag.encode()))
+
+        # A write to the service while this was in flight makes it stale
+        if generation == self.generation(service):
+            self._store(key, CacheEntry(response.status_code, headers, body, etag, ttl, service))
+
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers={"etag": etag, "x-cache": "MISS"})
+
+        cached = Response(content=body, status_code=response.status_code)
+        cached.raw_headers = headers + [(b"x-cache", b"MISS")]
+        return cached
+
+    def _stream_through(self, response: httpx.Response, buffered: list = (), raw: AsyncIterator = None) -> StreamingResponse:
+        """Pass an uncacheable response through, after any chunks already read"""
+        async def body():
+            for chunk in buffered:
+                yield chunk
+            async for chunk in (raw or response.aiter_raw()):
+                yield chunk
+
+        streaming_response = StreamingResponse(
+            body(),
+            status_code=response.status_code,
+            background=BackgroundTask(response.aclose)
+        )
+        streaming_response.raw_headers = [
+            (name, value) for name, value in response.headers.raw
+            if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+        ] + [(b"x-cache", b"BYPASS")]
+        return streaming_response
+
+    # ==================== INVALIDATION ====================
+
+    def invalidate(self, service: str):
+        """Drop every entry of a service (after a write through the gateway)"""
+        self._generations[service] = self.generation(service) + 1
+        stale = [key for key, entry in self._entries.items() if entry.service == service]
+        for key in stale:
+            self._remove(key)
+        if stale:
+            self.invalidations += len(stale)
+            logger.debug("🧹 Response cache: dropped %s %s entries", len(stale), service)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "rules": {rule.pattern: {"ttl": rule.ttl, "scope": rule.scope} for rule in self.rules}
+        }
+
+
+def load_rules(raw: str) -> List[CacheRule]:
+    """
+    Rules from JSON: {"/api/users/users/*/verify": {"ttl": 30, "scope": "public"},
+    "/api/users/me": 15}
+    """
+    rules = []
+    for pattern, rule in json.loads(raw).items():
+        if isinstance(rule, (int, float)):
+            rule = {"ttl": rule}
+        rules.append(CacheRule(pattern, float(rule["ttl"]), rule.get("scope", USER_SCOPE)))
+    return rules
+
+
+response_cache = ResponseCache(
+    load_rules(settings.RESPONSE_CACHE_RULES),
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    max_entry_bytes=settings.RESPONSE_CACHE_MAX_ENTRY_BYTES
+)
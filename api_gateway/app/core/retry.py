@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries (and hedges) to a fraction of traffic:
+    every request deposits `ratio` tokens, every retry withdraws one.
+    During an outage the bucket drains, so retries cannot multiply load.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float, min_per_second: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.min_per_second = min_per_second
+        self.tokens = max_tokens
+        self._refilled_at = time.monotonic()
+
+        # Metrics
+        self.retries = 0
+        self.exhausted = 0
+
+    def _refill(self):
+        # Small steady refill so low-traffic services can still retry
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+
+    def deposit(self):
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take one token for a retry; False when the budget is spent"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.retries += 1
+            return True
+        self.exhausted += 1
+        return False
+
+    def to_dict(self) -> dict:
+        self._refill()
+        return {
+            "tokens": round(self.tokens, 2),
+            "max_tokens": self.max_tokens,
+            "ratio": self.ratio,
+            "retries": self.retries,
+            "exhausted": self.exhausted
+        }
+
+
+class LatencyTracker:
+    """
+    Rolling window of upstream latencies, used to time hedged requests.
+    The hedge delay is a percentile of the window, recomputed every
+    HEDGE_DELAY_REFRESH seconds instead of sorting the window per request.
+    """
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._delay = settings.HEDGE_DEFAULT_DELAY
+        self._delay_expires = 0.0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self.samples) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def hedge_delay(self) -> float:
+        """Delay before sending a hedge: observed p95, or the default until warmed up"""
+        now = time.monotonic()
+        if now >= self._delay_expires:
+            delay = self.percentile(settings.HEDGE_PERCENTILE)
+            self._delay = settings.HEDGE_DEFAULT_DELAY if delay is None else max(settings.HEDGE_MIN_DELAY, delay)
+            self._delay_expires = now + settings.HEDGE_DELAY_REFRESH
+        return self._delay
+
+    def to_dict(self) -> dict:
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(settings.HEDGE_PERCENTILE)
+        return {
+            "samples": len(self.samples),
+            "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 2),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+
+
+# Retry budgets and latency windows, one per service route
+retry_budgets: Dict[str, RetryBudget] = {}
+latency_trackers: Dict[str, LatencyTracker] = {}
+
+
+def get_retry_budget(service: str) -> RetryBudget:
+    budget = retry_budgets.get(service)
+    if budget is None:
+        budget = RetryBudget(
+            ratio=settings.RETRY_BUDGET_RATIO,
+            max_tokens=settings.RETRY_BUDGET_MAX_TOKENS,
+            min_per_second=settings.RETRY_BUDGET_MIN_PER_SECOND
+        )
+        retry_budgets[service] = budget
+    return budget
+
+
+def get_latency_tracker(service: str) -> LatencyTracker:
+    tracker = latency_trackers.get(service)
+    if tracker is None:
+        tracker = LatencyTracker(settings.HEDGE_LATENCY_WINDOW)
+        latency_trackers[service] = tracker
+    return tracker
+
+
+def get_retry_stats() -> Dict[str, dict]:
+    """Retry budget and latency/hedging statistics per service"""
+    return {
+        service: {
+            "retry_budget": get_retry_budget(service).to_dict(),
+            "latency": get_latency_tracker(service).to_dict()
+        }
+        for service in set(retry_budgets) | set(latency_trackers)
+    }
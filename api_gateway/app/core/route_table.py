@@ -0,0 +1,171 @@
+"""
+Compiled routing table
+
+All per-route policies (public/auth, normalize, hedging, coalescing,
+response cache rule, rate limit rules, access log sampling) are inserted once into a trie of
+path segments. A path is resolved in one walk of the trie and the result
+is memoized, so repeated paths cost a single dict lookup.
+
+Prefix entries match a path and everything below it (on segment
+boundaries); exact entries match the whole path, '*' being one segment.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from .config import settings
+from .response_cache import response_cache, CacheRule
+from .rate_limiter import rate_limiter, RateLimitRule
+from .coalescer import coalescer
+
+
+class RoutePolicy:
+    """Everything the gateway needs to know about one path"""
+
+    __slots__ = (
+        "path", "service", "public", "normalize", "hedge",
+        "coalesce", "cache_rule", "ip_rate_limits", "sub_rate_limits",
+        "log_sample_rate", "template",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self.service: Optional[str] = None
+        self.public = False
+        self.normalize = False
+        self.hedge = False
+        self.coalesce = False
+        self.cache_rule: Optional[CacheRule] = None
+        self.ip_rate_limits: Tuple[RateLimitRule, ...] = ()
+        self.sub_rate_limits: Tuple[RateLimitRule, ...] = ()
+        self.log_sample_rate = settings.LOG_SAMPLE_RATE
+        self.template = path
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "service": self.service,
+            "public": self.public,
+            "normalize": self.normalize,
+            "hedge": self.hedge,
+            "coalesce": self.coalesce,
+            "cache": {"pattern": self.cache_rule.pattern, "ttl": self.cache_rule.ttl, "scope": self.cache_rule.scope}
+            if self.cache_rule else None,
+            "rate_limits": [rule.to_dict() for rule in self.ip_rate_limits + self.sub_rate_limits],
+            "log_sample_rate": self.log_sample_rate,
+            "template": self.template
+        }
+
+
+# Path segments that are identifiers: numbers, ObjectIds, UUIDs and other
+# hex ids (e.g. "<objectid>_<uuid>.png" avatar names)
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F][0-9a-fA-F_-]{15,})(\.\w+)?$")
+
+
+def _segments(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+def path_template(segments: List[str]) -> str:
+    """Path with identifier segments replaced by "{id}" (bounded metric labels)"""
+    return "/" + "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in segments)
+
+
+class _Node:
+    __slots__ = ("children", "prefix_entries", "exact_entries")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # (order, kind, value)
+        self.prefix_entries: List[tuple] = []
+        self.exact_entries: List[tuple] = []
+
+
+class RouteTable:
+    def __init__(self):
+        self._root = _Node()
+        self._order = 0
+        self.resolve = lru_cache(maxsize=settings.ROUTE_CACHE_SIZE)(self._resolve)
+
+    def add(self, pattern: str, kind: str, value=True, prefix: bool = True):
+        node = self._root
+        for segment in _segments(pattern):
+            node = node.children.setdefault(segment, _Node())
+        entries = node.prefix_entries if prefix else node.exact_entries
+        entries.append((self._order, kind, value))
+        self._order += 1
+
+    def _collect(self, node: _Node, segments: List[str], index: int, found: list):
+        found.extend(node.prefix_entries)
+        if index == len(segments):
+            found.extend(node.exact_entries)
+            return
+        child = node.children.get(segments[index])
+        if child is not None:
+            self._collect(child, segments, index + 1, found)
+        wildcard = node.children.get("*")
+        if wildcard is not None:
+            self._collect(wildcard, segments, index + 1, found)
+
+    def _resolve(self, path: str) -> RoutePolicy:
+        """Policy of a path (memoized through self.resolve)"""
+        segments = _segments(path)
+        policy = RoutePolicy(path)
+        policy.template = path_template(segments)
+        if len(segments) >= 2 and segments[0] == "api":
+            policy.service = segments[1]
+
+        found = []
+        self._collect(self._root, segments, 0, found)
+        found.sort(key=lambda entry: entry[0])
+
+        ip_limits, sub_limits = [], []
+        for _, kind, value in found:
+            if kind == "cache":
+                policy.cache_rule = policy.cache_rule or value
+            elif kind == "rate_limit":
+                (ip_limits if value.by == "ip" else sub_limits).append(value)
+            else:
+                setattr(policy, kind, value)
+        policy.ip_rate_limits = tuple(ip_limits)
+        policy.sub_rate_limits = tuple(sub_limits)
+        return policy
+
+    def clear_cache(self):
+        self.resolve.cache_clear()
+
+
+def build_route_table() -> RouteTable:
+    """Compile every route policy from settings into one table"""
+    table = RouteTable()
+
+    for path in settings.PUBLIC_ROUTES:
+        table.add(path, "public", prefix=False)
+    for prefix in settings.PUBLIC_ROUTE_PREFIXES:
+        table.add(prefix, "public")
+    for prefix in settings.NORMALIZE_ROUTES:
+        table.add(prefix, "normalize")
+    if settings.HEDGE_ENABLED:
+        for prefix in settings.HEDGE_ROUTES or ["/"]:
+            table.add(prefix, "hedge")
+    if settings.COALESCE_ENABLED:
+        for pattern in coalescer.routes:
+            table.add(pattern, "coalesce", prefix=False)
+    if settings.RESPONSE_CACHE_ENABLED:
+        for rule in response_cache.rules:
+            table.add(rule.pattern, "cache", rule, prefix=False)
+    for rule in rate_limiter.rules:
+        table.add(rule.route, "rate_limit", rule)
+    # Shortest prefixes first, so the most specific sampling rule is applied last
+    for prefix, rate in sorted(settings.LOG_SAMPLE_RULES.items(), key=lambda item: len(_segments(item[0]))):
+        table.add(prefix, "log_sample_rate", float(rate))
+
+    return table
+
+
+route_table = build_route_table()
+
+
+def resolve_route(path: str) -> RoutePolicy:
+    """Resolve service, auth requirement, cache and rate-limit policy of a path"""
+    return route_table.resolve(path)
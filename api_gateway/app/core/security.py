@@ -0,0 +1,80 @@
+from jose import JWTError, jwt
+from collections import OrderedDict
+from typing import Optional, Tuple
+import hashlib
+import time
+from .config import settings
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified JWT claims, keyed by token hash.
+    Each entry expires at the token's own `exp`.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        claims, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: dict):
+        exp = claims.get("exp")
+        expires_at = float(exp) if exp is not None else time.time() + settings.TOKEN_CACHE_DEFAULT_TTL
+
+        key = self._key(token)
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """Verify JWT signature and expiry (cached until the token expires)"""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+
+    token_cache.set(token, claims)
+    return claims
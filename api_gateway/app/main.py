@@ -1,15 +1,20 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import logging
-import traceback
+import time
 from .core.config import settings
+from .core.logging_config import setup_logging, stop_logging, log_access
+from .core.route_table import resolve_route
+from .core.metrics import REQUESTS_IN_FLIGHT, CONTENT_TYPE, observe_request, route_label, render
+from .core.tracing import trace_span, start_tracing, stop_tracing, SERVER
+from .core.http_client import start_clients, close_clients
+from .core.load_balancer import start_load_balancer, stop_load_balancer
+from .core.health_monitor import health_monitor
+from .core.rate_limiter import init_rate_limiter, close_rate_limiter
 from .routes import gateway_routes, proxy_routes
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging("api_gateway")
 logger = logging.getLogger(__name__)
  
 app = FastAPI(
@@ -27,18 +32,52 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    try:
-        logger.info(f"🔵 Incoming: {request.method} {request.url.path}")
-        response = await call_next(request)
-        logger.info(f"🟢 Response: {response.status_code}")
-        return response
-    except Exception as e:
-        logger.error(f"❌ Middleware error: {e}", exc_info=True)
-        raise
+    policy = resolve_route(request.url.path)
+    upstream = policy.service if policy.service in settings.SERVICE_ROUTES else "gateway"
+    in_flight = REQUESTS_IN_FLIGHT.labels(upstream) if settings.METRICS_ENABLED else None
+    if in_flight:
+        in_flight.inc()
+    started = time.perf_counter()
+    # Root span of the request (continues the client's traceparent, if any)
+    with trace_span(
+        f"{request.method} {policy.template}",
+        SERVER,
+        {"http.method": request.method, "http.target": request.url.path, "upstream": upstream},
+        traceparent=request.headers.get("traceparent")
+    ) as span:
+        try:
+            response = await call_next(request)
+        except Exception as e:
+            logger.error(f"❌ Middleware error: {e}", exc_info=True)
+            if in_flight:
+                observe_request(route_label(policy.template), request.method, 500, upstream, time.perf_counter() - started)
+            raise
+        finally:
+            if in_flight:
+                in_flight.dec()
+
+        # Gateway endpoints use their route template, so unknown paths never become labels
+        template = policy.template if upstream != "gateway" else getattr(request.scope.get("route"), "path", None)
+        if span.sampled:
+            span.name = f"{request.method} {template or request.url.path}"
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.set_error(f"HTTP {response.status_code}")
+
+    elapsed = time.perf_counter() - started
+    if in_flight:
+        observe_request(route_label(template), request.method, response.status_code, upstream, elapsed)
+    # One access log line per request (sampled per route, errors and slow requests always)
+    log_access(
+        request, response.status_code, elapsed * 1000, policy.log_sample_rate,
+        upstream=policy.service, trace_id=span.trace_id
+    )
+    return response
 
 # Include routes
 app.include_router(gateway_routes.router, tags=["Gateway"])
@@ -53,10 +92,24 @@ async def startup_event():
     for service, url in settings.SERVICE_MAP.items():
         logger.info(f"   - {service}: {url}")
     logger.info("🔓 Public routes:")
-    logger.info("   - /api/users/register")
-    logger.info("   - /api/users/login")
-    logger.info("   - /health")
-    logger.info("   - /docs")
+    for route in settings.PUBLIC_ROUTE_PREFIXES + settings.PUBLIC_ROUTES:
+        logger.info(f"   - {route}")
+    start_tracing()
+    await init_rate_limiter()
+    await start_load_balancer()
+    await start_clients()
+    await health_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close upstream connection pools"""
+    logger.info("👋 Shutting down API Gateway...")
+    await health_monitor.stop()
+    await stop_load_balancer()
+    await close_clients()
+    await close_rate_limiter()
+    stop_tracing()
+    stop_logging()
 
 @app.get("/")
 async def root():
@@ -69,6 +122,10 @@ async def root():
             "health": "/health",
             "all_health": "/api/health/all",
             "services": "/api/services",
+            "pools": "/api/gateway/pools",
+            "instances": "/api/gateway/instances",
+            "logging": "/api/gateway/logging",
+            "metrics": "/metrics",
             "docs": "/docs",
             "register": "/api/users/register",
             "login": "/api/users/login"
@@ -84,19 +141,27 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics - Public"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
 # Enhanced exception handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    logger.warning(f"⚠️ HTTP Exception: {exc.status_code} - {exc.detail}")
+    # Status is already in the access log line
+    logger.debug("⚠️ HTTP Exception: %s - %s", exc.status_code, exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
-    logger.error(f"❌ Unhandled exception: {exc}")
-    logger.error(f"📍 Traceback: {traceback.format_exc()}")
+    logger.error(f"❌ Unhandled exception: {exc}", exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={
@@ -1,38 +1,24 @@
 from fastapi import Request, HTTPException
 from typing import Optional
 import logging
+from ..core.security import verify_token
+from ..core.route_table import resolve_route, RoutePolicy
+from ..core.tracing import trace_span
 
 logger = logging.getLogger(__name__)
 
-PUBLIC_ROUTES = [
-    "/",
-    "/health",
-    "/api/health/all",
-    "/api/services",
-    "/docs",
-    "/redoc",
-    "/openapi.json",
-    "/api/users/register",
-    "/api/users/login",
-]
-
-PUBLIC_ROUTE_PATTERNS = [
-    "/api/users/register",
-    "/api/users/login",
-]
-
-async def verify_authentication(request: Request) -> Optional[dict]:
+async def verify_authentication(request: Request, policy: RoutePolicy = None) -> Optional[dict]:
+    """
+    Verify the bearer token of a protected route and return its claims
+    (None for public routes, as resolved by the route table)
+    """
     path = request.url.path
+    if policy is None:
+        policy = resolve_route(path)
     
-    if path in PUBLIC_ROUTES:
-        logger.info(f"Public route accessed: {path}")
+    if policy.public:
         return None
     
-    for pattern in PUBLIC_ROUTE_PATTERNS:
-        if path.startswith(pattern):
-            logger.info(f"Public route accessed: {path}")
-            return None
-    
     auth_header = request.headers.get("authorization") or request.headers.get("Authorization")
     
     if not auth_header:
@@ -49,5 +35,23 @@ async def verify_authentication(request: Request) -> Optional[dict]:
             detail="Invalid authorization header format"
         )
     
-    logger.info(f"Token found for protected route: {path}")
-    return {"authenticated": True}
\ No newline at end of file
+    token = auth_header[len("Bearer "):].strip()
+    with trace_span("auth.verify_token"):
+        claims = verify_token(token)
+    
+    if claims is None:
+        logger.warning(f"Invalid or expired token for: {path}")
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired token"
+        )
+    
+    if not claims.get("sub"):
+        logger.warning(f"Token without subject for: {path}")
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid token payload"
+        )
+    
+    logger.debug("Token verified for protected route: %s", path)
+    return claims
\ No newline at end of file
@@ -1,73 +1,117 @@
-from fastapi import APIRouter, HTTPException
-import httpx
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel
+from typing import Optional
 import logging
 from ..core.config import settings
+from ..core.http_client import get_pool_stats
+from ..core.security import token_cache
+from ..core.health_monitor import health_monitor
+from ..core.circuit_breaker import get_breaker_states
+from ..core.load_balancer import get_balancer_stats, reload_instances
+from ..core.retry import get_retry_stats
+from ..core.response_cache import response_cache
+from ..core.coalescer import coalescer
+from ..core.rate_limiter import get_limit_stats
+from ..core.logging_config import get_logging_stats, set_log_level
+from ..core.tracing import exporter
+from ..middleware.auth_middleware import verify_authentication
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+class LogLevelUpdate(BaseModel):
+    level: str
+    logger: Optional[str] = None  # None = root logger
+
+
+async def require_admin(request: Request) -> dict:
+    identity = await verify_authentication(request)
+    if not identity or identity.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return identity
+
 @router.get("/api/services")
 async def get_services():
     """Lấy danh sách tất cả services - Public"""
     return {
         "services": settings.SERVICE_MAP,
+        "circuit_breakers": get_breaker_states(),
         "gateway_version": "1.0.0"
     }
 
-@router.get("/api/health/all")
-async def check_all_services():
-    """Kiểm tra health của tất cả services - Public"""
-    logger.info("🔍 Checking health of all services...")
-    
-    results = {}
-    
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        for service_name, endpoint in settings.HEALTH_CHECK_ENDPOINTS.items():
-            try:
-                logger.info(f"   Checking {service_name} at {endpoint}")
-                response = await client.get(endpoint)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    results[service_name] = {
-                        "status": data.get("status", "unknown"),
-                        "url": endpoint
-                    }
-                    logger.info(f"   ✅ {service_name}: healthy")
-                else:
-                    results[service_name] = {
-                        "status": "unhealthy",
-                        "url": endpoint,
-                        "error": f"HTTP {response.status_code}"
-                    }
-                    logger.warning(f"   ⚠️ {service_name}: unhealthy (HTTP {response.status_code})")
-                    
-            except httpx.ConnectError:
-                results[service_name] = {
-                    "status": "unreachable",
-                    "url": endpoint,
-                    "error": "Connection refused"
-                }
-                logger.warning(f"   ⚠️ {service_name}: unreachable")
-                
-            except Exception as e:
-                results[service_name] = {
-                    "status": "error",
-                    "url": endpoint,
-                    "error": str(e)
-                }
-                logger.error(f"   ❌ {service_name}: error - {e}")
-    
-    # Determine overall status
-    all_healthy = all(
-        service["status"] == "healthy" 
-        for service in results.values()
-    )
-    
+@router.get("/api/gateway/pools", dependencies=[Depends(require_admin)])
+async def get_upstream_pools():
+    """Thống kê connection pool của từng upstream (in-use, idle, waiting) - Admin"""
     return {
-        "gateway": "healthy",
-        "overall_status": "healthy" if all_healthy else "degraded",
-        "services": results,
-        "timestamp": httpx.get("http://worldtimeapi.org/api/timezone/Etc/UTC").json()["datetime"] if all_healthy else None
-    }
\ No newline at end of file
+        "http2": settings.UPSTREAM_HTTP2,
+        "pools": get_pool_stats()
+    }
+
+@router.get("/api/gateway/token-cache", dependencies=[Depends(require_admin)])
+async def get_token_cache_stats():
+    """Thống kê cache JWT đã xác thực tại gateway - Admin"""
+    return token_cache.stats()
+
+@router.get("/api/gateway/retries", dependencies=[Depends(require_admin)])
+async def get_retries():
+    """Retry budget, độ trễ p50/p95 và số hedged requests của từng service - Admin"""
+    return get_retry_stats()
+
+@router.get("/api/gateway/response-cache", dependencies=[Depends(require_admin)])
+async def get_response_cache_stats():
+    """Thống kê response cache của gateway (hit ratio, bytes, invalidations) - Admin"""
+    return response_cache.stats()
+
+@router.get("/api/gateway/coalescing", dependencies=[Depends(require_admin)])
+async def get_coalescing_stats():
+    """Thống kê gộp request GET giống nhau đang chạy đồng thời - Admin"""
+    return coalescer.stats()
+
+@router.get("/api/gateway/limits", dependencies=[Depends(require_admin)])
+async def get_limits():
+    """Rate limit và giới hạn concurrency của từng upstream - Admin"""
+    return get_limit_stats()
+
+@router.get("/api/gateway/instances", dependencies=[Depends(require_admin)])
+async def get_instances():
+    """Instances của từng service, policy cân bằng tải và trạng thái ejection - Admin"""
+    return get_balancer_stats()
+
+@router.post("/api/gateway/instances/reload")
+async def reload_service_instances(request: Request):
+    """Nạp lại danh sách instances (file/env) không cần restart - Admin"""
+    await require_admin(request)
+
+    try:
+        return reload_instances()
+    except Exception as e:
+        logger.error(f"❌ Instance reload failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid instance configuration: {e}")
+
+@router.get("/api/gateway/logging", dependencies=[Depends(require_admin)])
+async def get_logging():
+    """Log level, sampling và số log bị bỏ khi hàng đợi đầy - Admin"""
+    return get_logging_stats()
+
+@router.get("/api/gateway/tracing", dependencies=[Depends(require_admin)])
+async def get_tracing():
+    """Sampling, nơi export span và số span đã gửi/bị bỏ - Admin"""
+    return exporter.stats()
+
+@router.put("/api/gateway/logging/level")
+async def update_log_level(update: LogLevelUpdate, request: Request):
+    """Đổi log level lúc đang chạy (root hoặc một logger) - Admin"""
+    identity = await require_admin(request)
+    try:
+        stats = set_log_level(update.level, update.logger)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.warning(f"📝 Log level of {update.logger or 'root'} set to {update.level.upper()} by {identity.get('sub')}")
+    return stats
+
+@router.get("/api/health/all")
+async def check_all_services(history: bool = False):
+    """Health của tất cả services - Public (đọc từ health monitor chạy nền)"""
+    return health_monitor.snapshot(include_history=history)
@@ -4,21 +4,16 @@ import logging
 from typing import Optional
 from ..core.config import settings
 from ..core.forwarder import forward_request
+from ..core.route_table import resolve_route
+from ..core.circuit_breaker import get_breaker
+from ..core.load_balancer import get_pool, get_balancer_stats
+from ..core.rate_limiter import rate_limiter
 from ..middleware.auth_middleware import verify_authentication
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-PUBLIC_PATHS = [
-    "/api/users/register",
-    "/api/users/login",
-]
-
-def is_public_route(path: str) -> bool:
-    """Check if route is public"""
-    return any(path.startswith(public) for public in PUBLIC_PATHS)
-
 @router.api_route(
     "/{service}/{path:path}",
     methods=["GET", "POST", "PUT", "DELETE", "PATCH"]
@@ -37,44 +32,41 @@ async def proxy_request(
     # Construct full path
     full_path = f"/api/{service}/{path}" if path else f"/api/{service}"
     
-    logger.info(f"📨 Incoming: {request.method} {full_path}")
-    logger.info(f"📍 Service: '{service}', Path: '{path}'")
+    # One lookup in the compiled route table: auth, cache and rate-limit policy
+    policy = resolve_route(full_path)
+    
+    # Admission control per client IP (before any work is done)
+    await rate_limiter.check(request, policy.ip_rate_limits)
     
-    # Check authentication for protected routes
-    if not is_public_route(full_path):
-        try:
-            await verify_authentication(request)
-            logger.info(f"🔐 Authenticated")
-        except HTTPException as e:
-            logger.warning(f"🚫 Unauthorized")
-            raise e
-    else:
-        logger.info(f"🌐 Public route")
+    # Check authentication for protected routes (JWT verified at the gateway)
+    identity = None
+    if not policy.public:
+        identity = await verify_authentication(request, policy)
+        
+        # Admission control per token subject
+        await rate_limiter.check(request, policy.sub_rate_limits, subject=identity.get("sub"))
     
     # Validate service exists
-    if service not in settings.SERVICE_ROUTES:
+    try:
+        get_pool(service)
+    except LookupError:
         logger.error(f"❌ Unknown service: '{service}'")
-        logger.error(f"📋 Available: {list(settings.SERVICE_ROUTES.keys())}")
+        logger.error(f"📋 Available: {list(get_balancer_stats().keys())}")
         raise HTTPException(
             status_code=404,
             detail=f"Service '{service}' not found"
         )
     
-    # Get target service URL
-    target_base_url = settings.SERVICE_ROUTES[service]
-    
-    # Build full target URL
+    # Forward request (an instance of the service is picked by the load balancer)
     # User service expects routes WITHOUT /api prefix
-    if path:
-        target_url = f"{target_base_url}/{path}"
-    else:
-        target_url = target_base_url
-    
-    logger.info(f"🚀 Forward: {request.method} → {target_url}")
-    
-    # Forward request
-    response = await forward_request(request, target_url, authorization)
-    return response
+    return await forward_request(
+        request,
+        path,
+        authorization,
+        service,
+        identity=identity,
+        policy=policy
+    )
 
 @router.get("/services")
 async def list_services():
@@ -86,7 +78,8 @@ async def list_services():
             {
                 "name": name,
                 "url": url,
-                "health_check": settings.HEALTH_CHECK_ENDPOINTS.get(name, "N/A")
+                "health_check": settings.HEALTH_CHECK_ENDPOINTS.get(name, "N/A"),
+                "circuit_breaker": get_breaker(name).to_dict()
             }
             for name, url in settings.SERVICE_MAP.items()
         ]
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from app.core import circuit_breaker, forwarder
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def make_breaker(**kwargs):
+    options = {"failure_threshold": 3, "recovery_timeout": 10, "half_open_max_calls": 1}
+    options.update(kwargs)
+    return CircuitBreaker("user", **options)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("HTTP 503")
+    assert breaker.state == OPEN
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = make_breaker()
+    breaker.record_failure("timeout")
+    breaker.record_failure("timeout")
+    breaker.record_success()
+    breaker.record_failure("timeout")
+    breaker.record_failure("timeout")
+    assert breaker.state == CLOSED
+
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.rejected == 1
+    assert breaker.retry_after() == 10
+
+
+def test_half_open_after_cool_down(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+
+    clock.now += 10
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()  # single trial slot taken
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 10
+    assert breaker.allow_request()
+
+    breaker.record_failure("connect error")
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_release_gives_back_trial_slot(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 10
+    assert breaker.allow_request()
+
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_probes(clock):
+    breaker = make_breaker()
+    breaker.record_probe(False, "HTTP 500")
+    breaker.record_probe(False, "HTTP 500")
+    breaker.record_probe(True)
+    assert breaker.failures == 0
+
+    open_breaker(breaker)
+    breaker.record_probe(True)
+    assert breaker.state == HALF_OPEN
+    breaker.record_probe(True)
+    assert breaker.state == CLOSED
+
+
+def test_probe_does_not_close_over_a_trial_in_flight(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 10
+    assert breaker.allow_request()
+
+    breaker.record_probe(True)
+    assert breaker.state == HALF_OPEN
+
+    # Slot never given back: a healthy probe after a whole cool-down recovers
+    clock.now += 10
+    breaker.record_probe(True)
+    assert breaker.state == CLOSED
+
+
+def test_cancelled_request_gives_back_trial_slot(clock, monkeypatch):
+    started = asyncio.Event()
+
+    class HangingCall:
+        def __init__(self, *args):
+            pass
+
+        async def send(self, hedged=False):
+            started.set()
+            await asyncio.Event().wait()
+
+    monkeypatch.setattr(forwarder, "UpstreamCall", HangingCall)
+    monkeypatch.setattr(forwarder, "build_upstream_headers", lambda *args: {})
+    breaker = make_breaker()
+    monkeypatch.setitem(circuit_breaker.breakers, "user", breaker)
+    monkeypatch.setattr(forwarder, "get_breaker", lambda name: breaker)
+    open_breaker(breaker)
+    clock.now += 10
+
+    async def scenario():
+        task = asyncio.create_task(forwarder._forward_upstream(
+            request=None, target_path="/me", authorization=None, service="user", normalize=False,
+            identity=None, hedge=False, cache_rule=None, cache_key=None, generation=None
+        ))
+        await started.wait()
+        assert breaker.half_open_calls == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert breaker.state == HALF_OPEN
+    assert breaker.half_open_calls == 0
+    assert breaker.allow_request()
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from starlette.requests import Request
+
+from app.core.coalescer import RequestCoalescer
+
+
+def make_request(path="/api/vehicles", query="", headers=None):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def test_key_depends_on_query_vary_headers_and_identity():
+    coalescer = RequestCoalescer([], max_body_bytes=1024)
+    key = coalescer.key_for(make_request(query="b=2&a=1"), None)
+
+    assert key == coalescer.key_for(make_request(query="a=1&b=2", headers={"x-request-id": "1"}), None)
+    assert key != coalescer.key_for(make_request(query="a=1&b=2", headers={"accept": "text/csv"}), None)
+    assert key != coalescer.key_for(make_request(query="a=1&b=2"), {"sub": "u1", "role": "customer"})
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    coalescer = RequestCoalescer([], max_body_bytes=1024)
+    calls = []
+
+    async def forward():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+        async def body():
+            yield b"hello "
+            yield b"world"
+
+        return StreamingResponse(body(), status_code=200, headers={"x-upstream": "1"})
+
+    async def scenario():
+        responses = await asyncio.gather(*(coalescer.run("k", forward) for _ in range(3)))
+        return [(r.status_code, r.body, r.headers.get("x-coalesced")) for r in responses]
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results[0] == (200, b"hello world", None)
+    assert results[1:] == [(200, b"hello world", "1")] * 2
+    assert (coalescer.leaders, coalescer.coalesced) == (1, 2)
+
+
+def test_large_bodies_are_not_shared():
+    coalescer = RequestCoalescer([], max_body_bytes=4)
+    calls = []
+
+    async def forward():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return StreamingResponse(iter([b"12345", b"678"]))
+
+    async def scenario():
+        leader, waiter = await asyncio.gather(coalescer.run("k", forward), coalescer.run("k", forward))
+        return b"".join([chunk async for chunk in leader.body_iterator])
+
+    assert asyncio.run(scenario()) == b"12345678"
+    assert len(calls) == 2
+    assert coalescer.not_shared == 1
+
+
+def test_waiters_get_the_leader_error():
+    coalescer = RequestCoalescer([], max_body_bytes=1024)
+
+    async def forward():
+        await asyncio.sleep(0.01)
+        raise HTTPException(status_code=503, detail="circuit open")
+
+    async def scenario():
+        return await asyncio.gather(*(coalescer.run("k", forward) for _ in range(2)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert [error.status_code for error in errors] == [503, 503]
+
+
+def test_cancelled_leader_lets_waiters_go_upstream():
+    coalescer = RequestCoalescer([], max_body_bytes=1024)
+    calls = []
+
+    async def forward():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return Response(b"ok")
+
+    async def scenario():
+        leader = asyncio.create_task(coalescer.run("k", forward))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(coalescer.run("k", forward))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        response = await waiter
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return response
+
+    assert asyncio.run(scenario()).body == b"ok"
+    assert len(calls) == 2
+    assert coalescer.stats()["in_flight"] == 0
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from app.core import load_balancer
+from app.core.load_balancer import LEAST_OUTSTANDING, POWER_OF_TWO, ROUND_ROBIN, Instance, ServicePool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(load_balancer.time, "monotonic", clock)
+    monkeypatch.setattr(load_balancer.settings, "INSTANCE_EJECTION_FAILURES", 3)
+    monkeypatch.setattr(load_balancer.settings, "INSTANCE_EJECTION_TIME", 30)
+    return clock
+
+
+def pool(policy, count=3):
+    return ServicePool("users", [f"http://user-{n}:8001/" for n in range(count)], policy)
+
+
+def fail(instance, times):
+    for _ in range(times):
+        instance.finish(instance.start(), success=False)
+
+
+def test_round_robin_cycles_over_available_instances(clock):
+    users = pool(ROUND_ROBIN)
+    picks = [users.choose().url for _ in range(6)]
+    assert sorted(set(picks)) == ["http://user-0:8001", "http://user-1:8001", "http://user-2:8001"]
+    assert picks[:3] == picks[3:]
+
+
+def test_outlier_is_ejected_then_readmitted(clock):
+    users = pool(ROUND_ROBIN, count=2)
+    bad, good = users.instances
+    fail(bad, 2)
+    bad.finish(bad.start(), success=True)  # success resets the streak
+    fail(bad, 2)
+    assert bad.is_available()
+
+    fail(bad, 1)
+    assert not bad.is_available()
+    assert bad.ejections == 1
+    assert {users.choose().url for _ in range(4)} == {good.url}
+
+    clock.now += 30
+    assert bad.is_available()
+
+
+def test_all_ejected_falls_back_to_every_instance(clock):
+    users = pool(ROUND_ROBIN, count=2)
+    for instance in users.instances:
+        fail(instance, 3)
+    assert users.choose() in users.instances
+
+
+def test_exclude_avoids_the_previous_instance(clock):
+    users = pool(ROUND_ROBIN, count=2)
+    first = users.instances[0]
+    assert all(users.choose(exclude=first) is not first for _ in range(4))
+    single = pool(ROUND_ROBIN, count=1)
+    assert single.choose(exclude=single.instances[0]) is single.instances[0]
+
+
+def test_least_outstanding(clock):
+    users = pool(LEAST_OUTSTANDING)
+    users.instances[0].start()
+    users.instances[1].start()
+    assert users.choose() is users.instances[2]
+
+
+def test_p2c_prefers_the_lower_expected_wait(clock, monkeypatch):
+    users = pool(POWER_OF_TWO, count=2)
+    slow, fast = users.instances
+    slow.latency_ewma, fast.latency_ewma = 0.2, 0.05
+    monkeypatch.setattr(random, "sample", lambda candidates, k: list(candidates)[:k])
+    assert users.choose() is fast
+
+    fast.outstanding = 5  # 0.05 x 6 > 0.2 x 1
+    assert users.choose() is slow
+
+
+def test_latency_moving_average():
+    instance = Instance("http://user-0:8001")
+    instance.latency_ewma = 0.1
+    instance.finish(instance.start() - 1.1, success=True)  # ~1.1s
+    assert instance.latency_ewma == pytest.approx(0.1 + 0.3 * 1.0, abs=0.01)
+    assert instance.outstanding == 0
+
+
+def test_update_keeps_stats_of_remaining_instances(clock):
+    users = pool(ROUND_ROBIN, count=2)
+    kept = users.instances[1]
+    fail(kept, 1)
+    users.update(["http://user-1:8001", "http://user-9:8001"], POWER_OF_TWO)
+    assert users.instances[0] is kept
+    assert users.instances[1].url == "http://user-9:8001"
+    assert users.policy == POWER_OF_TWO
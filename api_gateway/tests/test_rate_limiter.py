@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.core import rate_limiter
+from app.core.rate_limiter import (
+    BucketStore, ConcurrencyLimiter, MemoryBucketStore, RateLimiter, RateLimitRule, load_rules
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def take(store, key="k", rate=2.0, burst=3.0):
+    return asyncio.run(store.take(key, rate, burst))
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    store = MemoryBucketStore(max_keys=10)
+    assert [take(store)[0] for _ in range(3)] == [True, True, True]
+
+    allowed, retry_after = take(store)
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert take(store) == (True, 0.0)
+    clock.now += 60  # refill is capped at the burst
+    assert [take(store)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_store_is_bounded(clock):
+    store = MemoryBucketStore(max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        take(store, key)
+    assert list(store._buckets) == ["a", "c"]
+
+
+def test_rules_are_validated():
+    with pytest.raises(ValueError):
+        RateLimitRule(0, "/api", "user", 1, 1)
+    with pytest.raises(ValueError):
+        RateLimitRule(0, "/api", "ip", 0, 5)
+    with pytest.raises(ValueError):
+        RateLimitRule(0, "/api", "ip", 1, 0.5)
+
+    rule, = load_rules('[{"route": "/api/users/login", "rate": 2}]')
+    assert (rule.route, rule.by, rule.rate, rule.burst) == ("/api/users/login", "ip", 2.0, 2.0)
+
+
+def make_request(ip="10.0.0.1"):
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [], "client": (ip, 1234)})
+
+
+def test_check_limits_per_client(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter.settings, "RATE_LIMIT_ENABLED", True)
+    rule = RateLimitRule(0, "/api/users/login", "ip", 0.5, 1)
+    limiter = RateLimiter([rule], MemoryBucketStore(100))
+
+    asyncio.run(limiter.check(make_request(), (rule,)))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(limiter.check(make_request(), (rule,)))
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "2"
+    asyncio.run(limiter.check(make_request("10.0.0.2"), (rule,)))
+    assert limiter.limited == {"/api/users/login": 1}
+
+
+def test_check_falls_back_to_local_buckets(clock, monkeypatch):
+    class DownStore(BucketStore):
+        async def take(self, key, rate, burst):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(rate_limiter.settings, "RATE_LIMIT_ENABLED", True)
+    rule = RateLimitRule(0, "/api", "sub", 1, 1)
+    limiter = RateLimiter([rule], DownStore())
+
+    asyncio.run(limiter.check(make_request(), (rule,), subject="user-1"))
+    with pytest.raises(HTTPException):
+        asyncio.run(limiter.check(make_request(), (rule,), subject="user-1"))
+
+
+def test_concurrency_limiter_queues_then_rejects():
+    async def scenario():
+        limiter = ConcurrencyLimiter("users", max_concurrency=1, queue_size=1, queue_timeout=0.05)
+        await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        with pytest.raises(HTTPException):  # queue full
+            await limiter.acquire()
+
+        limiter.release()
+        await waiter
+        assert limiter.in_flight == 1
+
+        with pytest.raises(HTTPException):  # queue timeout
+            await limiter.acquire()
+        assert (limiter.rejected, limiter.timed_out, limiter.waiting) == (1, 1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_slot_release_is_idempotent(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "concurrency_limiters", {})
+    monkeypatch.setattr(rate_limiter.settings, "UPSTREAM_MAX_CONCURRENCY", {"users": 1})
+
+    async def scenario():
+        release = await rate_limiter.acquire_concurrency_slot("users")
+        release()
+        release()
+        limiter = rate_limiter.concurrency_limiters["users"]
+        assert limiter.in_flight == 0
+        assert not limiter._semaphore.locked()
+
+    asyncio.run(scenario())
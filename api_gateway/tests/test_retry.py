@@ -0,0 +1,72 @@
+import pytest
+
+from app.core import retry
+from app.core.retry import LatencyTracker, RetryBudget
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry.time, "monotonic", clock)
+    return clock
+
+
+def test_budget_limits_retries_to_a_fraction_of_traffic(clock):
+    budget = RetryBudget(ratio=0.2, max_tokens=2, min_per_second=0)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    assert budget.exhausted == 1
+
+    for _ in range(5):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_budget_refills_slowly_and_is_capped(clock):
+    budget = RetryBudget(ratio=0.1, max_tokens=3, min_per_second=0.5)
+    for _ in range(3):
+        budget.withdraw()
+    clock.now += 2
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    clock.now += 3600
+    assert budget.to_dict()["tokens"] == 3
+
+
+@pytest.fixture
+def hedge_settings(monkeypatch):
+    for name, value in {
+        "HEDGE_MIN_SAMPLES": 10, "HEDGE_PERCENTILE": 0.95, "HEDGE_DEFAULT_DELAY": 0.5,
+        "HEDGE_MIN_DELAY": 0.01, "HEDGE_DELAY_REFRESH": 1.0,
+    }.items():
+        monkeypatch.setattr(retry.settings, name, value)
+
+
+def test_hedge_delay_uses_default_until_warmed_up(clock, hedge_settings):
+    tracker = LatencyTracker(window=100)
+    for _ in range(9):
+        tracker.record(0.1)
+    assert tracker.hedge_delay() == 0.5
+
+
+def test_hedge_delay_is_the_percentile_recomputed_periodically(clock, hedge_settings):
+    tracker = LatencyTracker(window=100)
+    for n in range(100):
+        tracker.record((n + 1) / 1000)
+    assert tracker.hedge_delay() == pytest.approx(0.096)
+
+    for _ in range(100):
+        tracker.record(0.001)
+    assert tracker.hedge_delay() == pytest.approx(0.096)  # cached
+    clock.now += 1
+    assert tracker.hedge_delay() == 0.01  # floored at HEDGE_MIN_DELAY
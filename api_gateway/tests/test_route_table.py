@@ -0,0 +1,59 @@
+from app.core.rate_limiter import RateLimitRule
+from app.core.route_table import RouteTable, path_template, _segments
+
+
+def test_prefix_entries_match_on_segment_boundaries():
+    table = RouteTable()
+    table.add("/api/users/avatars", "public")
+
+    assert table.resolve("/api/users/avatars").public
+    assert table.resolve("/api/users/avatars/a.png").public
+    assert not table.resolve("/api/users/avatarsx").public
+    assert not table.resolve("/api/users").public
+
+
+def test_exact_entries_and_wildcards():
+    table = RouteTable()
+    table.add("/api/users/login", "public", prefix=False)
+    table.add("/api/vehicles/*", "coalesce", prefix=False)
+
+    assert table.resolve("/api/users/login").public
+    assert not table.resolve("/api/users/login/extra").public
+    assert table.resolve("/api/vehicles/123").coalesce
+    assert not table.resolve("/api/vehicles").coalesce
+    assert not table.resolve("/api/vehicles/123/bookings").coalesce
+
+
+def test_later_entries_win_and_rate_limits_accumulate():
+    table = RouteTable()
+    table.add("/", "log_sample_rate", 0.5)
+    table.add("/api/users", "log_sample_rate", 0.1)
+    login_ip = RateLimitRule(0, "/api/users/login", "ip", 1, 5)
+    users_sub = RateLimitRule(1, "/api/users", "sub", 10, 20)
+    table.add(login_ip.route, "rate_limit", login_ip)
+    table.add(users_sub.route, "rate_limit", users_sub)
+
+    policy = table.resolve("/api/users/login")
+    assert policy.log_sample_rate == 0.1
+    assert policy.ip_rate_limits == (login_ip,)
+    assert policy.sub_rate_limits == (users_sub,)
+    assert table.resolve("/api/vehicles").log_sample_rate == 0.5
+
+
+def test_service_and_template():
+    policy = RouteTable().resolve("/api/users/65a1b2c3d4e5f6a7b8c9d0e1/verify")
+    assert policy.service == "users"
+    assert policy.template == "/api/users/{id}/verify"
+    assert path_template(_segments("/api/bookings/42")) == "/api/bookings/{id}"
+    assert path_template(_segments("/api/users/avatars/0123456789abcdef0123.png")) == "/api/users/avatars/{id}"
+    assert path_template(_segments("/api/users/me")) == "/api/users/me"
+
+
+def test_resolution_is_memoized_until_cleared():
+    table = RouteTable()
+    first = table.resolve("/api/users/me")
+    assert table.resolve("/api/users/me") is first
+
+    table.add("/api/users", "public")
+    table.clear_cache()
+    assert table.resolve("/api/users/me").public
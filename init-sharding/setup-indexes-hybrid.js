@@ -38,6 +38,22 @@ try {
     print('  ⚠️ Role index error:', e);
 }
 
+try {
+    // Avatar files are content-addressed and shared: checked before deleting one
+    db.users.createIndex({ avatar_url: 1 }, { sparse: true });
+    print('  ✅ Sparse index on avatar_url');
+} catch(e) {
+    print('  ⚠️ Avatar_url index error:', e);
+}
+
+try {
+    // Replaced avatars waiting for deletion (app/core/avatar_gc.py)
+    db.avatar_gc.createIndex({ due_at: 1 });
+    print('  ✅ Index on avatar_gc.due_at');
+} catch(e) {
+    print('  ⚠️ avatar_gc index error:', e);
+}
+
 // ==================== VEHICLES COLLECTION (Vertical Shard 2) ====================
 
 print('');
@@ -73,6 +73,24 @@ try {
     print('    ⚠️ Error:', e);
 }
 
+// Email/username -> _id lookup for users (queried by _id -> single shard)
+print('  📦 Sharding user_lookup collection (Vertical - to shard1)...');
+try {
+    db.adminCommand({
+        shardCollection: 'rental.user_lookup',
+        key: { _id: 'hashed' }
+    });
+    print('    ✅ user_lookup collection sharded');
+    sh.updateZoneKeyRange(
+        'rental.user_lookup',
+        { _id: MinKey },
+        { _id: MaxKey },
+        'ZONE_USERS'
+    );
+} catch(e) {
+    print('    ⚠️ Error:', e);
+}
+
 // Vertical sharding - Vehicles
 print('  📦 Sharding vehicles collection (Vertical - to shard2)...');
 try {
@@ -0,0 +1,38 @@
+"""
+Backfill the user_lookup collection (email/username -> _id) for existing users
+
+Run once after deploying the lookup, then set USER_LOOKUP_FALLBACK=false so
+email/username queries never broadcast to every chunk of users.
+
+Usage (from user_service/):
+    python -m app.commands.backfill_user_lookup --batch-size 1000
+"""
+
+import argparse
+import asyncio
+import logging
+
+from ..database.connection import connect_db, close_db
+from ..database.user_lookup import backfill_lookup
+
+
+async def run(batch_size: int):
+    await connect_db()
+    try:
+        written = await backfill_lookup(batch_size)
+    finally:
+        await close_db()
+    print(f"✅ Done! {written} lookup entries created")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill user_lookup for existing users")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
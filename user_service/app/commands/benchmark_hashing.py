@@ -0,0 +1,93 @@
+"""
+Benchmark password hashing schemes on the current machine
+
+Reports hashes/sec per scheme and cost so we can pick costs that fit the
+login throughput target.
+
+Usage (from user_service/):
+    python -m app.commands.benchmark_hashing
+    python -m app.commands.benchmark_hashing --bcrypt 10 12 --argon2 2:19456:1 3:65536:2 --workers 4 --target 50
+"""
+
+import argparse
+import os
+import time
+from passlib.hash import bcrypt, argon2
+
+from ..core.config import settings
+
+
+def _measure(handler, duration: float) -> dict:
+    """Hash repeatedly for `duration` seconds, then time one verify"""
+    password = "Benchmark123!"
+    count = 0
+    last_hash = None
+    started = time.perf_counter()
+
+    while True:
+        last_hash = handler.hash(password)
+        count += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            break
+
+    verify_started = time.perf_counter()
+    handler.verify(password, last_hash)
+    verify_ms = (time.perf_counter() - verify_started) * 1000
+
+    return {
+        "hashes_per_sec": count / elapsed,
+        "hash_ms": elapsed / count * 1000,
+        "verify_ms": verify_ms
+    }
+
+
+def _parse_argon2(spec: str) -> dict:
+    """time_cost:memory_cost_kib:parallelism"""
+    time_cost, memory_cost, parallelism = (int(part) for part in spec.split(":"))
+    return {"time_cost": time_cost, "memory_cost": memory_cost, "parallelism": parallelism}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark password hashing schemes")
+    parser.add_argument("--bcrypt", nargs="*", type=int, default=[settings.BCRYPT_ROUNDS],
+                        help="bcrypt rounds to test")
+    parser.add_argument("--argon2", nargs="*", default=[
+        f"{settings.ARGON2_TIME_COST}:{settings.ARGON2_MEMORY_COST}:{settings.ARGON2_PARALLELISM}"
+    ], help="argon2id costs as time_cost:memory_cost_kib:parallelism")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per configuration")
+    parser.add_argument("--workers", type=int, default=settings.PASSWORD_HASH_WORKERS or None,
+                        help="process pool size used for the throughput estimate (default: CPU count)")
+    parser.add_argument("--target", type=float, default=None, help="login throughput target (logins/sec)")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+
+    configs = []
+    for rounds in args.bcrypt:
+        configs.append((f"bcrypt rounds={rounds}", bcrypt.using(rounds=rounds, ident="2b")))
+    if args.argon2 and argon2.has_backend():
+        for spec in args.argon2:
+            params = _parse_argon2(spec)
+            label = f"argon2id t={params['time_cost']} m={params['memory_cost']}KiB p={params['parallelism']}"
+            configs.append((label, argon2.using(type="ID", **params)))
+    elif args.argon2:
+        print("⚠️ argon2-cffi is not installed - skipping argon2")
+
+    print(f"🔐 Password hashing benchmark ({args.duration}s per config, estimate for {workers} workers)")
+    print(f"{'scheme':<45} {'hash/s':>8} {'hash ms':>9} {'verify ms':>10} {'pool logins/s':>14}")
+
+    for label, handler in configs:
+        result = _measure(handler, args.duration)
+        pool_rate = result["hashes_per_sec"] * workers
+        mark = ""
+        if args.target is not None:
+            mark = " ✅" if pool_rate >= args.target else " ❌"
+        print(
+            f"{label:<45} {result['hashes_per_sec']:>8.1f} {result['hash_ms']:>9.1f} "
+            f"{result['verify_ms']:>10.1f} {pool_rate:>14.1f}{mark}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Generate load-test data (users, vehicles, bookings) for the sharded cluster
+
+Documents are inserted in unordered insert_many batches with one precomputed
+password hash. Bookings are spread over HANOI/HO_CHI_MINH/DA_NANG so the
+zone sharding from init-sharding/setup-zones.js can be exercised.
+
+Usage (from user_service/):
+    python -m app.commands.generate_load_data --users 1000000 --vehicles 100000 --bookings 3000000 --batch-size 5000 --seed 42
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from ..core.security import get_password_hash
+from ..database.connection import connect_db, close_db, get_database
+from ..database.load_data import generate_load_data
+
+
+async def run(args):
+    await connect_db()
+    try:
+        report = await generate_load_data(
+            get_database(),
+            users=args.users,
+            vehicles=args.vehicles,
+            bookings=args.bookings,
+            password_hash=get_password_hash(args.password),
+            batch_size=args.batch_size,
+            seed=args.seed
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    finally:
+        await close_db()
+
+    print(f"\n📊 Insert throughput (seed={report['seed']}, batch={report['batch_size']})")
+    print(f"{'target':<22} {'inserted':>10} {'dup':>6} {'err':>6} {'seconds':>9} {'docs/s':>10}  shards")
+    for target, stats in report["throughput"].items():
+        print(
+            f"{target:<22} {stats['inserted']:>10} {stats['duplicates']:>6} {stats['errors']:>6} "
+            f"{stats['seconds']:>9} {stats['docs_per_sec']:>10}  {', '.join(stats['shards']) or '-'}"
+        )
+    print(f"\n⏱️ Total: {report['total_seconds']}s")
+    print("📦 Distribution (collStats):")
+    print(json.dumps(report["distribution"], indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load-test data for the sharded cluster")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--bookings", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None, help="seed for unique ids and values (default: random)")
+    parser.add_argument("--password", default="Test123!", help="password of every generated user")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Run data migrations (app/migrations)
+
+    status  list migrations and their recorded state
+    up      run pending migrations in version order; an interrupted run
+            resumes from its last checkpoint (after MIGRATION_LEASE_SECONDS
+            when it was started by another process that died)
+
+Usage (from user_service/):
+    python -m app.commands.migrate status
+    python -m app.commands.migrate up --dry-run
+    python -m app.commands.migrate up --only 0001 --max-docs-per-sec 500
+"""
+
+import argparse
+import asyncio
+import logging
+
+from ..core.config import settings
+from ..database.connection import connect_db, close_db
+from ..database.migrations import MigrationRunner
+from ..migrations import MIGRATIONS
+
+
+async def status():
+    for record in await MigrationRunner().status(MIGRATIONS):
+        counts = f" - {record['matched']} matched, {record['modified']} modified" if "matched" in record else ""
+        print(f"{record['version']}  {record['status']:<8} {record['description']}{counts}")
+        if record.get("error"):
+            print(f"      error: {record['error']}")
+
+
+async def up(args):
+    runner = MigrationRunner(
+        batch_size=args.batch_size,
+        parallel_per_shard=args.parallel_per_shard,
+        max_docs_per_sec=args.max_docs_per_sec,
+        max_batch_ms=args.max_batch_ms,
+        dry_run=args.dry_run
+    )
+    results = await runner.run_pending(MIGRATIONS, only=args.only)
+    if not results:
+        print("✅ Nothing to migrate")
+    for result in results:
+        if result["dry_run"]:
+            print(f"🔎 {result['version']}: {result['matched']} matched, {result['would_modify']} would be modified")
+        else:
+            print(f"✅ {result['version']}: {result['matched']} matched, {result['modified']} modified ({result['seconds']}s)")
+
+
+async def run(args):
+    await connect_db()
+    try:
+        if args.command == "status":
+            await status()
+        else:
+            await up(args)
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run data migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="show migrations and their state")
+    up_parser = subparsers.add_parser("up", help="run pending migrations")
+    up_parser.add_argument("--only", help="run this version only")
+    up_parser.add_argument("--dry-run", action="store_true", help="count only, change nothing")
+    up_parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE)
+    up_parser.add_argument("--parallel-per-shard", type=int, default=settings.MIGRATION_PARALLEL_PER_SHARD)
+    up_parser.add_argument(
+        "--max-docs-per-sec", type=float, default=settings.MIGRATION_MAX_DOCS_PER_SEC, help="0 = unlimited"
+    )
+    up_parser.add_argument(
+        "--max-batch-ms", type=float, default=settings.MIGRATION_MAX_BATCH_MS,
+        help="pause after slower bulk writes (0 = never)"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Move existing avatar files into the configured avatar storage
+
+For every user with an avatar_url under /api/users/avatars/, the file is
+read from --source-dir, stored under its content-addressed name (see
+avatar_upload) in AVATAR_STORAGE, its WebP variants are generated, and
+avatar_url is rewritten to the new name. URLs missing their leading "/"
+(see migration 0001) are fixed on the way. Users are read
+through a cursor and updated with one bulk_write per batch; the command
+can be re-run safely (already migrated users only cost a HEAD/stat).
+
+Usage (from user_service/):
+    AVATAR_STORAGE=s3 S3_ENDPOINT=http://minio:9000 ... \\
+    python -m app.commands.migrate_avatars --source-dir /app/uploads/avatars --dry-run
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Set
+from pymongo import UpdateOne
+
+from ..core.config import settings
+from ..core.avatar_storage import init_avatar_storage, close_avatar_storage, get_storage, run_io
+from ..core.avatar_upload import detect_image_type, SNIFF_BYTES
+from ..core.avatar_variants import init_variant_service, close_variant_service, get_variant_service
+from ..database.connection import connect_db, close_db, get_database
+
+logger = logging.getLogger(__name__)
+
+AVATAR_URL = re.compile(r"^/?api/users/avatars/([^/]+)$")
+URL_PREFIX = "/api/users/avatars/"
+
+
+def _hash_file(path: Path):
+    """(sha256, first bytes) of a file, None when it does not exist"""
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            header = f.read(SNIFF_BYTES)
+            hasher.update(header)
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+    except FileNotFoundError:
+        return None
+    return hasher.hexdigest(), header
+
+
+def _copy_to_scratch(source: Path, scratch: Path) -> Path:
+    target = scratch / f".migrate-{source.name}"
+    shutil.copyfile(source, target)
+    return target
+
+
+class AvatarMigration:
+    def __init__(self, source_dir: Path, dry_run: bool, delete_source: bool, variants: bool):
+        self.source_dir = source_dir
+        self.dry_run = dry_run
+        self.delete_source = delete_source
+        self.variants = variants
+        self.storage = get_storage()
+        # Old file name -> new key (several users may share a file)
+        self._keys: Dict[str, Optional[str]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stored: Set[str] = set()
+        self.counts = {"users": 0, "updated": 0, "stored": 0, "unchanged": 0, "missing": 0, "invalid": 0}
+
+    async def _migrate_file(self, filename: str) -> Optional[str]:
+        """New key of an old avatar file, stored (with variants) unless dry-run"""
+        async with self._locks.setdefault(filename, asyncio.Lock()):
+            if filename in self._keys:
+                return self._keys[filename]
+
+            source = self.source_dir / filename
+            hashed = await run_io(_hash_file, source)
+            if hashed is None:
+                # Already migrated (source deleted) and stored under the same name
+                key = filename if await self.storage.exists(filename) else None
+                if key is None:
+                    self.counts["missing"] += 1
+                    logger.warning(f"⚠️ Avatar file not found: {source}")
+                self._keys[filename] = key
+                return key
+
+            digest, header = hashed
+            detected = detect_image_type(header)
+            if detected is None:
+                self.counts["invalid"] += 1
+                logger.warning(f"⚠️ Not an image, left in place: {source}")
+                self._keys[filename] = None
+                return None
+            extension, media_type = detected
+            key = f"{digest}{extension}"
+
+            if key not in self._stored and not await self.storage.exists(key):
+                self._stored.add(key)
+                self.counts["stored"] += 1
+                if not self.dry_run:
+                    copy = await run_io(_copy_to_scratch, source, settings.UPLOAD_DIR)
+                    await self.storage.put_file(key, copy, media_type, digest)
+                    if self.variants:
+                        await get_variant_service().generate(key)
+            self._keys[filename] = key
+            return key
+
+    async def _migrate_user(self, user: dict) -> Optional[UpdateOne]:
+        self.counts["users"] += 1
+        match = AVATAR_URL.match(user["avatar_url"])
+        key = await self._migrate_file(match.group(1))
+        if key is None:
+            return None
+        avatar_url = f"{URL_PREFIX}{key}"
+        if avatar_url == user["avatar_url"]:
+            self.counts["unchanged"] += 1
+            return None
+        self.counts["updated"] += 1
+        # Only rewrite what was read, in case the user uploaded meanwhile
+        return UpdateOne(
+            {"_id": user["_id"], "avatar_url": user["avatar_url"]},
+            {"$set": {"avatar_url": avatar_url}}
+        )
+
+    async def _flush(self, batch: list, concurrency: int):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def migrate(user):
+            async with semaphore:
+                return await self._migrate_user(user)
+
+        operations = [op for op in await asyncio.gather(*(migrate(user) for user in batch)) if op is not None]
+        if operations and not self.dry_run:
+            await get_database().users.bulk_write(operations, ordered=False)
+
+    async def run(self, batch_size: int, concurrency: int):
+        cursor = get_database().users.find(
+            {"avatar_url": {"$regex": "^/?api/users/avatars/"}}, {"avatar_url": 1}, batch_size=batch_size
+        )
+        batch = []
+        async for user in cursor:
+            batch.append(user)
+            if len(batch) >= batch_size:
+                await self._flush(batch, concurrency)
+                batch = []
+                logger.info(f"📦 {self.counts['users']} users processed")
+        if batch:
+            await self._flush(batch, concurrency)
+
+        if self.delete_source and not self.dry_run:
+            await self._delete_sources()
+
+    async def _delete_sources(self):
+        """Remove migrated source files that are not the stored objects themselves"""
+        deleted = 0
+        for filename, key in self._keys.items():
+            source = self.source_dir / filename
+            if key is None or self.storage.local_path(key) == source:
+                continue
+            try:
+                await run_io(source.unlink)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        logger.info(f"🗑️ Deleted {deleted} source files")
+
+
+async def run(source_dir: Path, batch_size: int, concurrency: int, dry_run: bool, delete_source: bool, variants: bool):
+    await connect_db()
+    await init_avatar_storage()
+    if variants and not dry_run:
+        init_variant_service()
+    try:
+        migration = AvatarMigration(source_dir, dry_run, delete_source, variants)
+        await migration.run(batch_size, concurrency)
+    finally:
+        close_variant_service()
+        await close_avatar_storage()
+        await close_db()
+
+    counts = migration.counts
+    prefix = "🔎 Dry run: would have" if dry_run else "✅ Done!"
+    print(
+        f"{prefix} stored {counts['stored']} files and rewritten {counts['updated']} avatar URLs "
+        f"({counts['users']} users, {counts['unchanged']} already migrated, "
+        f"{counts['missing']} missing files, {counts['invalid']} invalid files)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move avatar files into the configured avatar storage")
+    parser.add_argument("--source-dir", type=Path, default=settings.UPLOAD_DIR)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8, help="files migrated in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="count only, change nothing")
+    parser.add_argument("--delete-source", action="store_true", help="delete source files once migrated")
+    parser.add_argument("--skip-variants", action="store_true", help="do not generate WebP variants")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(
+        args.source_dir, args.batch_size, args.concurrency, args.dry_run, args.delete_source, not args.skip_variants
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Delayed deletion of unreferenced avatar files
+
+Avatar files are shared by content (see avatar_upload), so a replaced
+avatar cannot be deleted inline: another user may reference the same file,
+or an upload of the same content may have just found it stored and be
+about to point a user at it. Replaced files are queued in the `avatar_gc`
+collection instead, and a background pass deletes them after
+AVATAR_GC_DELAY if no user references them by then.
+
+Storing a file again cancels its queued deletion. If a pass is deleting
+that file at the same moment, the upload waits for the pass to finish and
+then stores the file again (see cancel_deletion).
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import logging
+import os
+import socket
+from .config import settings
+from .avatar_storage import get_storage
+from .avatar_variants import variant_filenames
+from ..database.connection import get_database
+
+logger = logging.getLogger(__name__)
+
+GC_COLLECTION = "avatar_gc"
+URL_PREFIX = "/api/users/avatars/"
+
+
+def _collection():
+    return get_database()[GC_COLLECTION]
+
+
+def _valid(filename: str) -> bool:
+    return bool(filename) and "/" not in filename and "\\" not in filename and not filename.startswith(".")
+
+
+async def schedule_deletion(filename: str):
+    """Queue a stored avatar for deletion once it has been unreferenced for AVATAR_GC_DELAY"""
+    if not _valid(filename):
+        return
+    due_at = datetime.utcnow() + timedelta(seconds=settings.AVATAR_GC_DELAY)
+    try:
+        await _collection().update_one(
+            {"_id": filename}, {"$set": {"due_at": due_at, "cancelled": False}}, upsert=True
+        )
+    except Exception as e:
+        # Worst case the file is never deleted
+        logger.warning(f"⚠️ Could not queue avatar {filename} for deletion: {e}")
+
+
+async def cancel_deletion(filename: str) -> bool:
+    """
+    Cancel a queued deletion of a file about to be referenced again.
+    Returns True when a pass was deleting it: the caller must store the file
+    again (this returns only once that pass is done).
+    """
+    now = datetime.utcnow()
+    entry = await _collection().find_one_and_update({"_id": filename}, {"$set": {"cancelled": True}})
+    if entry is None:
+        return False
+
+    claimed_until = entry.get("claimed_until")
+    if claimed_until is None or claimed_until < now:
+        await _collection().delete_one({"_id": filename, "cancelled": True})
+        return False
+
+    # A pass claimed it before the cancel and may be deleting the file now
+    deadline = asyncio.get_running_loop().time() + (claimed_until - now).total_seconds()
+    while asyncio.get_running_loop().time() < deadline:
+        if await _collection().find_one({"_id": filename, "claim": entry.get("claim")}, {"_id": 1}) is None:
+            break
+        await asyncio.sleep(0.1)
+    await _collection().delete_one({"_id": filename, "cancelled": True})
+    return True
+
+
+class AvatarGarbageCollector:
+    """Background pass deleting due, unreferenced avatars (safe to run on every instance)"""
+
+    def __init__(self, interval: float, claim_seconds: float):
+        self.interval = interval
+        self.claim_seconds = claim_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self._claims = 0
+
+        # Metrics
+        self.deleted = 0
+        self.kept = 0
+
+    async def _claim(self) -> Optional[dict]:
+        """Take one due entry that no other pass is working on"""
+        now = datetime.utcnow()
+        self._claims += 1
+        return await _collection().find_one_and_update(
+            {
+                "due_at": {"$lte": now},
+                "cancelled": {"$ne": True},
+                "$or": [{"claimed_until": None}, {"claimed_until": {"$lt": now}}],
+            },
+            {"$set": {
+                "claim": f"{self.owner}:{self._claims}",
+                "claimed_until": now + timedelta(seconds=self.claim_seconds),
+            }},
+            return_document=True
+        )
+
+    async def _collect(self, entry: dict):
+        filename = entry["_id"]
+        claimed = {"_id": filename, "claim": entry["claim"]}
+
+        referenced = await get_database().users.find_one({"avatar_url": f"{URL_PREFIX}{filename}"}, {"_id": 1})
+        # Last check before deleting: an upload cancels by setting `cancelled`
+        if referenced is None and await _collection().find_one({**claimed, "cancelled": {"$ne": True}}, {"_id": 1}):
+            await get_storage().delete([filename, *variant_filenames(filename)])
+            self.deleted += 1
+            logger.info(f"🗑️ Deleted unreferenced avatar: {filename}")
+        else:
+            self.kept += 1
+
+        # Kept if it was queued again meanwhile (new due_at)
+        await _collection().delete_one({**claimed, "due_at": entry["due_at"]})
+
+    async def collect_due(self, limit: int = 1000) -> int:
+        """One pass over due entries; returns how many were processed"""
+        processed = 0
+        while processed < limit:
+            entry = await self._claim()
+            if entry is None:
+                break
+            try:
+                await self._collect(entry)
+            except Exception as e:
+                # Claim expires, the entry is retried by a later pass
+                logger.warning(f"⚠️ Avatar garbage collection failed for {entry['_id']}: {e}")
+            processed += 1
+        return processed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.collect_due()
+            except Exception as e:
+                logger.error(f"❌ Avatar garbage collector error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "delay_seconds": settings.AVATAR_GC_DELAY,
+            "deleted": self.deleted,
+            "kept": self.kept
+        }
+
+
+# Global avatar garbage collector
+avatar_gc: Optional[AvatarGarbageCollector] = None
+
+
+def start_avatar_gc():
+    """Start the background deletion of unreferenced avatars"""
+    global avatar_gc
+    avatar_gc = AvatarGarbageCollector(settings.AVATAR_GC_INTERVAL, settings.AVATAR_GC_CLAIM_SECONDS)
+    avatar_gc.start()
+    logger.info(
+        f"✅ Avatar garbage collector started (every {settings.AVATAR_GC_INTERVAL}s, "
+        f"delay {settings.AVATAR_GC_DELAY}s)"
+    )
+
+
+async def stop_avatar_gc():
+    """Stop the background deletion of unreferenced avatars"""
+    global avatar_gc
+    if avatar_gc:
+        await avatar_gc.stop()
+        avatar_gc = None
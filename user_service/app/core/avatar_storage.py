@@ -0,0 +1,460 @@
+"""
+Avatar storage backends
+
+- local: files in UPLOAD_DIR, served by this process (ETag/304/Range)
+- s3: any S3-compatible object store (AWS S3, MinIO, ...) over httpx with
+  AWS Signature V4. Reads are answered with a redirect to a presigned URL
+  (AVATAR_PRESIGNED_REDIRECT), so image bytes never pass through Python,
+  or proxied when the store is not reachable by clients.
+
+Keys are the avatar file names (content hashes, see avatar_upload), so
+stored objects never change. Uploads and resizing always work on local
+files in UPLOAD_DIR first; the backend then takes the finished file.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from fastapi import HTTPException, Request, status
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from pathlib import Path
+from starlette.background import BackgroundTask
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote, urlsplit
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import time
+import anyio
+import httpx
+from .config import settings
+from .file_responses import serve_file, etag_matches
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== FILE I/O THREAD POOL ====================
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_IO_WORKERS, thread_name_prefix="upload-io")
+    return _executor
+
+
+async def run_io(fn, *args):
+    """Run blocking file I/O in the avatar I/O pool"""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+def _unlink(path: Path) -> bool:
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _move(source: Path, target: Path):
+    os.chmod(source, 0o644)
+    os.replace(source, target)
+
+
+def _write_chunk(f, data: bytes):
+    f.write(data)
+
+
+# ==================== BACKENDS ====================
+
+class AvatarStorage:
+    name = ""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path of the stored file when it is on this host's disk"""
+        return None
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def put_file(self, key: str, path: Path, media_type: str, sha256: Optional[str] = None):
+        """Store a finished local file under `key` (the local file is consumed)"""
+        raise NotImplementedError
+
+    async def download(self, key: str, path: Path):
+        raise NotImplementedError
+
+    async def delete(self, keys: Iterable[str]) -> bool:
+        """Delete objects (missing ones are ignored); True if any existed"""
+        raise NotImplementedError
+
+    async def serve(self, request: Request, key: str, media_type: str, etag: str, cache_control: str) -> Response:
+        """Response for a GET of `key`; HTTPException 404 when it is missing"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    async def close(self):
+        pass
+
+
+class LocalStorage(AvatarStorage):
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.root / key
+
+    async def exists(self, key: str) -> bool:
+        return await run_io((self.root / key).is_file)
+
+    async def put_file(self, key: str, path: Path, media_type: str, sha256: Optional[str] = None):
+        target = self.root / key
+        if Path(path) != target:
+            await run_io(_move, Path(path), target)
+
+    async def download(self, key: str, path: Path):
+        raise RuntimeError("Local avatars are read in place")
+
+    async def delete(self, keys: Iterable[str]) -> bool:
+        deleted = False
+        for key in keys:
+            deleted = await run_io(_unlink, self.root / key) or deleted
+        return deleted
+
+    async def serve(self, request: Request, key: str, media_type: str, etag: str, cache_control: str) -> Response:
+        return await serve_file(request, self.root / key, media_type, etag, cache_control)
+
+
+# Response headers of the object store passed on to clients when proxying
+_PROXIED_HEADERS = ("content-length", "content-range", "last-modified", "accept-ranges")
+
+
+class S3Storage(AvatarStorage):
+    """Path-style S3 API (bucket in the path), which MinIO and AWS both accept"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        endpoint: str,
+        public_endpoint: str,
+        bucket: str,
+        region: str,
+        access_key: str,
+        secret_key: str,
+        presign_expires: int
+    ):
+        self.endpoint = endpoint.rstrip("/")
+        self.public_endpoint = (public_endpoint or endpoint).rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.presign_expires = presign_expires
+        self.client = httpx.AsyncClient(timeout=settings.S3_TIMEOUT)
+        self._signing_keys: Dict[str, bytes] = {}
+        # Keys seen to exist recently -> expiry (monotonic). Only serve() uses
+        # it, to skip a HEAD per read: another instance may have deleted the
+        # object since, so exists() (deciding whether to upload) always asks.
+        self._known: "OrderedDict[str, float]" = OrderedDict()
+
+        # Metrics
+        self.redirects = 0
+        self.proxied = 0
+        self.uploads = 0
+
+    # ---------- AWS Signature V4 ----------
+
+    def _signing_key(self, date: str) -> bytes:
+        key = self._signing_keys.get(date)
+        if key is None:
+            key = f"AWS4{self.secret_key}".encode()
+            for part in (date, self.region, "s3", "aws4_request"):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            self._signing_keys = {date: key}
+        return key
+
+    def _signature(self, canonical_request: str, amz_date: str) -> str:
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        return hmac.new(self._signing_key(amz_date[:8]), string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    def _path(self, key: str = "") -> str:
+        return quote(f"/{self.bucket}/{key}" if key else f"/{self.bucket}", safe="/-_.~")
+
+    def _signed_headers(
+        self, method: str, path: str, payload_hash: str = "UNSIGNED-PAYLOAD", extra: Optional[dict] = None
+    ) -> dict:
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        headers = {
+            "host": urlsplit(self.endpoint).netloc,
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": amz_date,
+            **{name.lower(): value for name, value in (extra or {}).items()},
+        }
+        names = sorted(headers)
+        canonical_request = "\n".join([
+            method, path, "",
+            "".join(f"{name}:{str(headers[name]).strip()}\n" for name in names),
+            ";".join(names),
+            payload_hash
+        ])
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request, "
+            f"SignedHeaders={';'.join(names)}, Signature={self._signature(canonical_request, amz_date)}"
+        )
+        return headers
+
+    def presigned_url(self, key: str, signed_at: Optional[int] = None) -> str:
+        """
+        Presigned GET URL on the public endpoint. The signing time is
+        rounded down to half the expiry, so a client gets the same URL (and
+        can cache the image) for a while; it stays valid >= half the expiry.
+        """
+        if signed_at is None:
+            window = max(1, self.presign_expires // 2)
+            signed_at = int(time.time()) // window * window
+        amz_date = datetime.fromtimestamp(signed_at, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = self._path(key)
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(self.presign_expires),
+            "X-Amz-SignedHeaders": "host",
+        }
+        canonical_query = "&".join(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}" for name, value in sorted(query.items())
+        )
+        canonical_request = "\n".join([
+            "GET", path, canonical_query, f"host:{urlsplit(self.public_endpoint).netloc}\n", "host", "UNSIGNED-PAYLOAD"
+        ])
+        return f"{self.public_endpoint}{path}?{canonical_query}&X-Amz-Signature={self._signature(canonical_request, amz_date)}"
+
+    async def _request(self, method: str, key: str = "", payload_hash: str = "UNSIGNED-PAYLOAD", headers=None, **kwargs):
+        path = self._path(key)
+        return await self.client.request(
+            method,
+            f"{self.endpoint}{path}",
+            headers=self._signed_headers(method, path, payload_hash, headers),
+            **kwargs
+        )
+
+    # ---------- operations ----------
+
+    async def ensure_bucket(self):
+        response = await self._request("HEAD")
+        if response.status_code == 404:
+            response = await self._request("PUT")
+            if response.status_code not in (200, 409):
+                response.raise_for_status()
+            logger.info(f"🪣 Created avatar bucket: {self.bucket}")
+        elif response.status_code >= 400:
+            response.raise_for_status()
+
+    def _remember(self, key: str):
+        self._known[key] = time.monotonic() + settings.S3_EXISTS_HINT_TTL
+        self._known.move_to_end(key)
+        if len(self._known) > 100_000:
+            self._known.popitem(last=False)
+
+    def _recently_seen(self, key: str) -> bool:
+        expires = self._known.get(key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._known[key]
+            return False
+        return True
+
+    async def exists(self, key: str) -> bool:
+        response = await self._request("HEAD", key)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        self._remember(key)
+        return True
+
+    async def put_file(self, key: str, path: Path, media_type: str, sha256: Optional[str] = None):
+        size = (await run_io(os.stat, path)).st_size
+
+        async def body():
+            async with await anyio.open_file(path, "rb") as f:
+                while chunk := await f.read(256 * 1024):
+                    yield chunk
+
+        response = await self._request(
+            "PUT",
+            key,
+            payload_hash=sha256 or "UNSIGNED-PAYLOAD",
+            headers={
+                "content-length": str(size),
+                "content-type": media_type,
+                "cache-control": f"public, max-age={settings.AVATAR_CACHE_MAX_AGE}, immutable",
+            },
+            content=body()
+        )
+        response.raise_for_status()
+        self.uploads += 1
+        self._remember(key)
+        await run_io(_unlink, Path(path))
+
+    async def download(self, key: str, path: Path):
+        async with self.client.stream(
+            "GET", f"{self.endpoint}{self._path(key)}", headers=self._signed_headers("GET", self._path(key))
+        ) as response:
+            if response.status_code == 404:
+                raise FileNotFoundError(key)
+            response.raise_for_status()
+            f = await run_io(open, path, "wb")
+            try:
+                async for chunk in response.aiter_bytes(256 * 1024):
+                    await run_io(_write_chunk, f, chunk)
+            finally:
+                await run_io(f.close)
+
+    async def delete(self, keys: Iterable[str]) -> bool:
+        deleted = False
+        for key in keys:
+            self._known.pop(key, None)
+            response = await self._request("DELETE", key)
+            if response.status_code not in (204, 404):
+                response.raise_for_status()
+            deleted = deleted or response.status_code == 204
+        return deleted
+
+    async def serve(self, request: Request, key: str, media_type: str, etag: str, cache_control: str) -> Response:
+        # Objects never change: a client holding any copy of this key has the right one
+        if_none_match = request.headers.get("if-none-match")
+        not_modified = (if_none_match and etag_matches(if_none_match, etag)) or (
+            if_none_match is None and request.headers.get("if-modified-since")
+        )
+        # ... as long as the object still exists (the proxy gets the store's 404)
+        if (not_modified or settings.AVATAR_PRESIGNED_REDIRECT) and not (
+            self._recently_seen(key) or await self.exists(key)
+        ):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        if not_modified:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
+        if settings.AVATAR_PRESIGNED_REDIRECT:
+            self.redirects += 1
+            window = max(1, self.presign_expires // 2)
+            remaining = window - int(time.time()) % window
+            return RedirectResponse(
+                self.presigned_url(key),
+                status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                headers={"Cache-Control": f"public, max-age={remaining}"}
+            )
+        return await self._proxy(request, key, media_type, etag, cache_control)
+
+    async def _proxy(self, request: Request, key: str, media_type: str, etag: str, cache_control: str) -> Response:
+        forwarded = {}
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            forwarded["range"] = range_header
+
+        path = self._path(key)
+        upstream = await self.client.send(
+            self.client.build_request("GET", f"{self.endpoint}{path}", headers=self._signed_headers("GET", path, extra=forwarded)),
+            stream=True
+        )
+        if upstream.status_code == 404:
+            await upstream.aclose()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        if upstream.status_code not in (200, 206, 416):
+            await upstream.aclose()
+            logger.warning(f"⚠️ Object store returned {upstream.status_code} for {key}")
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Avatar storage unavailable")
+
+        self.proxied += 1
+        headers = {name: upstream.headers[name] for name in _PROXIED_HEADERS if name in upstream.headers}
+        headers.update({"ETag": etag, "Cache-Control": cache_control})
+        return StreamingResponse(
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            media_type=media_type,
+            headers=headers,
+            background=BackgroundTask(upstream.aclose)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "endpoint": self.endpoint,
+            "bucket": self.bucket,
+            "presigned_redirect": settings.AVATAR_PRESIGNED_REDIRECT,
+            "redirects": self.redirects,
+            "proxied": self.proxied,
+            "uploads": self.uploads,
+            "known_keys": len(self._known)
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# ==================== GLOBAL STORAGE ====================
+
+storage: Optional[AvatarStorage] = None
+
+
+def create_storage(backend: str) -> AvatarStorage:
+    if backend == "s3":
+        return S3Storage(
+            endpoint=settings.S3_ENDPOINT,
+            public_endpoint=settings.S3_PUBLIC_ENDPOINT,
+            bucket=settings.S3_BUCKET,
+            region=settings.S3_REGION,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            presign_expires=settings.S3_PRESIGN_EXPIRES
+        )
+    if backend == "local":
+        return LocalStorage(settings.UPLOAD_DIR)
+    raise ValueError(f"Unknown avatar storage backend '{backend}', expected local or s3")
+
+
+async def init_avatar_storage():
+    """Create the configured avatar storage (and the S3 bucket if missing)"""
+    global storage
+    storage = create_storage(settings.AVATAR_STORAGE)
+    await run_io(lambda: settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True))
+    if isinstance(storage, S3Storage):
+        try:
+            await storage.ensure_bucket()
+        except Exception as e:
+            logger.warning(f"⚠️ Avatar bucket check failed: {e}")
+        logger.info(f"✅ Avatar storage: s3 {settings.S3_ENDPOINT}/{settings.S3_BUCKET}")
+    else:
+        logger.info(f"✅ Avatar storage: local {settings.UPLOAD_DIR}")
+
+
+async def close_avatar_storage():
+    """Close the storage client and the file I/O pool"""
+    global storage, _executor
+    if storage is not None:
+        await storage.close()
+        storage = None
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def get_storage() -> AvatarStorage:
+    """Get avatar storage (created lazily if needed)"""
+    global storage
+    if storage is None:
+        storage = create_storage(settings.AVATAR_STORAGE)
+    return storage
@@ -0,0 +1,269 @@
+"""
+Streaming avatar uploads
+
+The multipart body is parsed while it arrives (instead of being spooled
+whole by UploadFile first): the size limit is enforced per network chunk,
+the image type is sniffed from the first bytes, and the data is written
+(and hashed) to a temp file in UPLOAD_DIR through a small thread pool,
+then handed to the avatar storage (an atomic rename for local storage).
+The event loop never touches the disk.
+
+Files are content-addressed: `<sha256><ext>`, so identical uploads share
+one file (and one set of resized variants, see avatar_variants).
+"""
+
+from fastapi import HTTPException, Request, status
+from pathlib import Path
+from typing import Optional, Tuple
+import hashlib
+import logging
+import os
+import tempfile
+from .config import settings
+from .avatar_storage import get_storage, run_io
+from .avatar_gc import cancel_deletion
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the accepted image formats -> (extension, media type)
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"GIF87a", ".gif", "image/gif"),
+    (b"GIF89a", ".gif", "image/gif"),
+)
+SNIFF_BYTES = 12
+
+MEDIA_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".webp": "image/webp"}
+
+# Room for the multipart boundaries and part headers around the file
+_MULTIPART_OVERHEAD = 16 * 1024
+
+
+def detect_image_type(header: bytes) -> Optional[Tuple[str, str]]:
+    """(extension, media type) from the magic bytes of an image, None if unknown"""
+    for signature, extension, media_type in _SIGNATURES:
+        if header.startswith(signature):
+            return extension, media_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    return None
+
+
+def media_type_for(filename: str) -> str:
+    return MEDIA_TYPES.get(Path(filename).suffix.lower(), "application/octet-stream")
+
+
+# ==================== FILE I/O (runs in the avatar I/O pool) ====================
+
+def _open_temp(directory: Path) -> Tuple[int, str]:
+    directory.mkdir(parents=True, exist_ok=True)
+    return tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+
+
+def _write(fd: int, data: bytes, hasher):
+    hasher.update(data)
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _finish(fd: int, data: bytes, hasher) -> str:
+    """Write the last bytes and fsync; returns the content hash"""
+    try:
+        _write(fd, data, hasher)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return hasher.hexdigest()
+
+
+def _discard(fd: Optional[int], temp_path: Optional[str]):
+    if fd is not None:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    if temp_path:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+
+
+# ==================== STREAMING PARSER ====================
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
+    )
+
+
+def _invalid_type() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid file type. Allowed: {', '.join(sorted(settings.ALLOWED_EXTENSIONS))}"
+    )
+
+
+class AvatarUpload:
+    """
+    Receives the `field` part of a multipart request into a temp file.
+    Multipart callbacks only buffer bytes; the coroutine in `receive`
+    checks the limits and hands full buffers to the I/O pool.
+    """
+
+    def __init__(self, field: str = "file"):
+        self.field = field
+        self.size = 0
+        self.extension: Optional[str] = None
+        self.media_type: Optional[str] = None
+        self.found = False
+        self.created = False
+        self._hasher = hashlib.sha256()
+        self._in_field = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._buffer = bytearray()
+        self._fd: Optional[int] = None
+        self._temp_path: Optional[str] = None
+
+    # ---------- multipart callbacks ----------
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        self._in_field = name == self.field and b"filename" in options and not self.found
+        if self._in_field:
+            self.found = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_field:
+            self._buffer += data[start:end]
+            self.size += end - start
+
+    def _on_part_end(self):
+        self._in_field = False
+
+    # ---------- receiving ----------
+
+    async def receive(self, request: Request):
+        """Stream the request body into the temp file, enforcing size and type"""
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected multipart/form-data")
+
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > settings.MAX_FILE_SIZE + _MULTIPART_OVERHEAD:
+            raise _too_large()
+
+        parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                await self._check_and_flush()
+            parser.finalize()
+            await self._check_and_flush()
+
+            if not self.found or self.size == 0:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded")
+            if self.extension is None:
+                raise _invalid_type()
+        except FormParserError:
+            await self.discard()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body")
+        except BaseException:
+            await self.discard()
+            raise
+
+    async def _check_and_flush(self):
+        if self.size > settings.MAX_FILE_SIZE:
+            raise _too_large()
+
+        if self.extension is None and self.size:
+            if self.size < SNIFF_BYTES and self._in_field:
+                return  # wait for more of the header
+            detected = detect_image_type(bytes(self._buffer[:SNIFF_BYTES]))
+            if detected is None or detected[0] not in settings.ALLOWED_EXTENSIONS:
+                raise _invalid_type()
+            self.extension, self.media_type = detected
+
+        if len(self._buffer) >= settings.UPLOAD_WRITE_BUFFER:
+            if self._fd is None:
+                self._fd, self._temp_path = await run_io(_open_temp, settings.UPLOAD_DIR)
+            data, self._buffer = bytes(self._buffer), bytearray()
+            await run_io(_write, self._fd, data, self._hasher)
+
+    async def commit(self) -> str:
+        """
+        Store the received file as `<sha256><ext>` (ext from the magic
+        bytes); `created` is False when that content was already stored
+        """
+        if self._fd is None:
+            self._fd, self._temp_path = await run_io(_open_temp, settings.UPLOAD_DIR)
+        data, self._buffer = bytes(self._buffer), bytearray()
+        fd, self._fd = self._fd, None
+        storage = get_storage()
+        try:
+            digest = await run_io(_finish, fd, data, self._hasher)
+            filename = f"{digest}{self.extension}"
+            # Referenced again: a queued deletion must not remove it
+            if await cancel_deletion(filename):
+                self.created = True  # it may have just been deleted
+            else:
+                self.created = not await storage.exists(filename)
+            if self.created:
+                await storage.put_file(filename, Path(self._temp_path), self.media_type, digest)
+            else:
+                await run_io(_discard, None, self._temp_path)
+        except Exception:
+            await run_io(_discard, None, self._temp_path)
+            raise
+        finally:
+            self._temp_path = None
+        return filename
+
+    async def discard(self):
+        """Drop the partial temp file, if any"""
+        self._buffer = bytearray()
+        if self._fd is not None or self._temp_path:
+            fd, temp_path = self._fd, self._temp_path
+            self._fd = self._temp_path = None
+            await run_io(_discard, fd, temp_path)
+
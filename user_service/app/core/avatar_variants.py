@@ -0,0 +1,215 @@
+"""
+Resized avatar variants (WebP)
+
+After an upload the original is scaled down to each of
+AVATAR_VARIANT_SIZES in a process pool (decoding and resampling are CPU
+bound), off the request path. Variants are stored next to the original
+as `<stem>_<size>.webp`; until they exist the original is served.
+
+With remote storage the original is downloaded to UPLOAD_DIR, resized
+there and the variants uploaded (see avatar_storage).
+"""
+
+from pathlib import Path
+from typing import List, Optional, Set
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+import httpx
+from .config import settings
+from .process_pool import make_process_pool
+from .avatar_storage import get_storage, run_io
+
+logger = logging.getLogger(__name__)
+
+VARIANT_EXTENSION = ".webp"
+VARIANT_MEDIA_TYPE = "image/webp"
+
+
+def variant_filename(filename: str, size: int) -> str:
+    return f"{Path(filename).stem}_{size}{VARIANT_EXTENSION}"
+
+
+def variant_filenames(filename: str) -> List[str]:
+    return [variant_filename(filename, size) for size in settings.AVATAR_VARIANT_SIZES]
+
+
+def pick_variant_size(requested: int) -> Optional[int]:
+    """Smallest variant at least `requested` px wide; None when only the original will do"""
+    for size in sorted(settings.AVATAR_VARIANT_SIZES):
+        if size >= requested:
+            return size
+    return None
+
+
+# ==================== WORKER FUNCTION (runs in child processes) ====================
+
+def _resize_job(source: str, directory: str, stem: str, sizes: tuple, quality: int, max_pixels: int):
+    # Pillow is only needed (and loaded) in the workers
+    from PIL import Image, ImageOps
+
+    started = time.time()
+    Image.MAX_IMAGE_PIXELS = max_pixels  # larger images raise DecompressionBombError
+    created = []
+    with Image.open(source) as image:
+        largest = max(sizes)
+        image.draft("RGB", (largest, largest))  # JPEG: decode at a reduced scale
+        image = ImageOps.exif_transpose(image)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        # Largest first: each size is scaled down from the previous one
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size), Image.LANCZOS)
+            name = f"{stem}_{size}{VARIANT_EXTENSION}"
+            temp_path = os.path.join(directory, f".{name}.part")
+            image.save(temp_path, "WEBP", quality=quality, method=4)
+            os.replace(temp_path, os.path.join(directory, name))
+            created.append(name)
+    return created, time.time() - started
+
+
+class AvatarVariantService:
+    """
+    Generates variants in a bounded process pool. Jobs are fire-and-forget
+    from the caller's side; beyond `max_pending` files in progress new
+    ones are skipped (and generated on a later request for a size).
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = make_process_pool(workers)
+        self._in_progress: Set[str] = set()
+        # Files that could not be decoded are not retried on every request
+        self._unreadable: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.generated = 0
+        self.failed = 0
+        self.skipped = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+
+    def schedule(self, filename: str) -> bool:
+        """Generate the variants of a stored avatar in the background (once at a time per file)"""
+        if filename in self._in_progress:
+            return True
+        if filename in self._unreadable:
+            return False
+        if len(self._in_progress) >= self.max_pending:
+            self.skipped += 1
+            logger.warning(f"⚠️ Avatar variant pool saturated ({len(self._in_progress)} pending) - skipping {filename}")
+            return False
+
+        self._in_progress.add(filename)
+        task = asyncio.get_running_loop().create_task(self._run(filename))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, filename: str):
+        try:
+            await self.generate(filename)
+        finally:
+            self._in_progress.discard(filename)
+
+    async def generate(self, filename: str) -> bool:
+        """Create (or recreate) the variants of a stored avatar now; False if that failed"""
+        storage = get_storage()
+        source = storage.local_path(filename)
+        scratch = None
+        resized = False
+        try:
+            if source is None:
+                # Remote storage: work on a local copy, then upload the variants
+                scratch = Path(await run_io(tempfile.mkdtemp, None, ".variants-", settings.UPLOAD_DIR))
+                source = scratch / filename
+                await storage.download(filename, source)
+            output = scratch or settings.UPLOAD_DIR
+
+            loop = asyncio.get_running_loop()
+            created, elapsed = await loop.run_in_executor(
+                self.executor,
+                _resize_job,
+                str(source),
+                str(output),
+                Path(filename).stem,
+                tuple(settings.AVATAR_VARIANT_SIZES),
+                settings.AVATAR_WEBP_QUALITY,
+                settings.AVATAR_MAX_PIXELS
+            )
+            resized = True
+            for name in created:
+                await storage.put_file(name, output / name, VARIANT_MEDIA_TYPE)
+            self.generated += 1
+            self.time_total += elapsed
+            self.time_max = max(self.time_max, elapsed)
+            logger.debug("🖼️ Avatar variants for %s: %s (%.0f ms)", filename, ", ".join(created), elapsed * 1000)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            self.failed += 1
+            if not resized and not isinstance(e, httpx.HTTPError):
+                if len(self._unreadable) >= 10000:
+                    self._unreadable.clear()
+                self._unreadable.add(filename)
+            logger.warning(f"⚠️ Could not generate avatar variants for {filename}: {type(e).__name__}: {e}")
+            return False
+        finally:
+            if scratch is not None:
+                await run_io(shutil.rmtree, scratch, True)
+
+    def stats(self) -> dict:
+        generated = self.generated or 1
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": len(self._in_progress),
+            "sizes": list(settings.AVATAR_VARIANT_SIZES),
+            "generated": self.generated,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "time_avg_ms": round(self.time_total / generated * 1000, 2),
+            "time_max_ms": round(self.time_max * 1000, 2)
+        }
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global avatar variant service
+variant_service: Optional[AvatarVariantService] = None
+
+
+def init_variant_service():
+    """Start the avatar resizing process pool"""
+    global variant_service
+    workers = settings.AVATAR_VARIANT_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+    variant_service = AvatarVariantService(workers, settings.AVATAR_VARIANT_MAX_PENDING)
+    logger.info(
+        f"✅ Avatar variant pool started: {workers} workers, "
+        f"sizes {', '.join(map(str, settings.AVATAR_VARIANT_SIZES))} px"
+    )
+
+
+def close_variant_service():
+    """Stop the avatar resizing process pool"""
+    global variant_service
+    if variant_service:
+        variant_service.shutdown()
+        variant_service = None
+
+
+def get_variant_service() -> AvatarVariantService:
+    """Get avatar variant service (started lazily if needed)"""
+    if variant_service is None:
+        init_variant_service()
+    return variant_service
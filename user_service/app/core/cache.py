@@ -0,0 +1,265 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import time
+import bson
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Interface for user cache storage backends"""
+
+    async def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: dict, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU with per-entry TTL (one copy per worker process)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        # Callers mutate the returned document (e.g. _id -> str)
+        return dict(value)
+
+    async def set(self, key: str, value: dict, ttl: float):
+        self._entries[key] = (dict(value), time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis backed cache shared by all worker processes (documents stored as BSON)"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[dict]:
+        data = await self._redis.get(key)
+        if data is None:
+            return None
+        return bson.decode(data)
+
+    async def set(self, key: str, value: dict, ttl: float):
+        await self._redis.set(key, bson.encode(value), px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._redis.delete(*keys)
+
+    async def close(self):
+        await self._redis.close()
+
+
+class UserCache:
+    """
+    Cache of user documents, keyed by email and by _id
+
+    Readers take generation() before loading a user from the database and
+    pass it to set(): a document read before an invalidation is not written
+    back after it.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_skipped = 0
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return f"user:email:{email}"
+
+    @staticmethod
+    def _id_key(user_id) -> str:
+        return f"user:id:{user_id}"
+
+    async def _get(self, key: str) -> Optional[dict]:
+        try:
+            user = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ User cache read failed: {e}")
+            user = None
+
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self._get(self._email_key(email))
+
+    async def get_by_id(self, user_id) -> Optional[dict]:
+        return await self._get(self._id_key(user_id))
+
+    def generation(self) -> int:
+        """Token to take before reading a user that will be passed to set()"""
+        return self._generation
+
+    async def set(self, user: dict, generation: int):
+        if generation != self._generation:
+            # An invalidation happened while the document was being read
+            self.stale_skipped += 1
+            return
+        try:
+            await self.backend.set(self._email_key(user["email"]), user, self.ttl)
+            await self.backend.set(self._id_key(user["_id"]), user, self.ttl)
+            if generation != self._generation:
+                # ... or while it was being written (remote backend)
+                await self.backend.delete(self._email_key(user["email"]), self._id_key(user["_id"]))
+        except Exception as e:
+            logger.warning(f"⚠️ User cache write failed: {e}")
+
+    async def invalidate(self, user: dict):
+        """Drop cached copies of a user (call after every write to the user)"""
+        self._generation += 1
+        keys = [self._id_key(user["_id"])]
+        if user.get("email"):
+            keys.append(self._email_key(user["email"]))
+
+        try:
+            await self.backend.delete(*keys)
+        except Exception as e:
+            logger.warning(f"⚠️ User cache invalidation failed: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl_seconds": self.ttl,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_skipped": self.stale_skipped,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class SingleFlightCache:
+    """
+    Short-TTL result cache. Concurrent misses for the same key share one
+    computation instead of each hitting the database.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._results: Dict[str, tuple] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _on_done(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._results[key] = (task.result(), time.monotonic() + self.ttl)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable]):
+        entry = self._results.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            self.hits += 1
+            return entry[0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        else:
+            self.coalesced += 1
+
+        # shield: one cancelled caller must not cancel the shared computation
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "entries": len(self._results),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced
+        }
+
+
+# Global user cache
+user_cache: UserCache = None
+
+
+async def init_user_cache():
+    """Create the user cache with the configured backend"""
+    global user_cache
+
+    backend: CacheBackend = None
+    if settings.USER_CACHE_BACKEND == "redis":
+        try:
+            backend = RedisCacheBackend(settings.REDIS_URL)
+            await backend._redis.ping()
+            logger.info(f"✅ User cache using Redis: {settings.REDIS_URL}")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis user cache unavailable ({e}) - falling back to memory")
+            backend = None
+
+    if backend is None:
+        backend = MemoryCacheBackend(settings.USER_CACHE_MAX_SIZE)
+        logger.info(f"✅ User cache using memory (max {settings.USER_CACHE_MAX_SIZE} entries)")
+
+    user_cache = UserCache(backend, settings.USER_CACHE_TTL)
+
+
+async def close_user_cache():
+    """Close the user cache backend"""
+    if user_cache:
+        await user_cache.backend.close()
+
+
+def get_user_cache() -> UserCache:
+    """Get user cache instance (memory backend if init_user_cache() was not called)"""
+    global user_cache
+    if user_cache is None:
+        user_cache = UserCache(MemoryCacheBackend(settings.USER_CACHE_MAX_SIZE), settings.USER_CACHE_TTL)
+    return user_cache
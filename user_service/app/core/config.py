@@ -1,3 +1,4 @@
+import json
 import os
 from typing import Optional
 from pathlib import Path
@@ -12,6 +13,91 @@ class Settings:
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     
+    # Identity headers from the API Gateway are trusted only when they carry
+    # this shared secret (empty = always re-verify the JWT)
+    GATEWAY_SHARED_SECRET: str = os.getenv("GATEWAY_SHARED_SECRET", "")
+    
+    # Password hashing (runs in a process pool, off the event loop)
+    # First scheme is used for new hashes, the others are rehashed on login
+    PASSWORD_SCHEMES: list = [
+        scheme.strip() for scheme in os.getenv("PASSWORD_SCHEMES", "argon2,bcrypt").split(",") if scheme.strip()
+    ]
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # use 4-6 for load tests
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", "2"))
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", "1"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))  # 0 = CPU count
+    # Jobs allowed to wait behind the busy workers before requests get 503
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+    
+    # User document cache (used by get_current_user). Invalidations only reach
+    # the local process with the memory backend, so with several instances
+    # other instances may accept a changed user for up to USER_CACHE_TTL:
+    # keep it short, or use redis (shared) and raise it.
+    USER_CACHE_BACKEND: str = os.getenv("USER_CACHE_BACKEND", "memory")  # memory | redis
+    USER_CACHE_TTL: float = float(os.getenv("USER_CACHE_TTL", "5"))
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    
+    # Email/username -> _id lookup (user_lookup collection). Keep the broadcast
+    # fallback on until `python -m app.commands.backfill_user_lookup` has run.
+    USER_LOOKUP_FALLBACK: bool = os.getenv("USER_LOOKUP_FALLBACK", "true").lower() == "true"
+    # Pending email/username claims of registrations that never inserted their
+    # user can be taken over after this many seconds
+    USER_LOOKUP_CLAIM_TIMEOUT: int = int(os.getenv("USER_LOOKUP_CLAIM_TIMEOUT", "60"))
+    
+    # Data migrations (python -m app.commands.migrate). Runs are recorded in
+    # MIGRATIONS_COLLECTION; MIGRATION_MAX_DOCS_PER_SEC = 0 disables the rate
+    # limit, and batches whose bulk_write takes longer than MIGRATION_MAX_BATCH_MS
+    # are followed by an equally long pause.
+    MIGRATIONS_COLLECTION: str = os.getenv("MIGRATIONS_COLLECTION", "schema_migrations")
+    MIGRATION_BATCH_SIZE: int = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+    MIGRATION_PARALLEL_PER_SHARD: int = int(os.getenv("MIGRATION_PARALLEL_PER_SHARD", "2"))
+    MIGRATION_MAX_DOCS_PER_SEC: float = float(os.getenv("MIGRATION_MAX_DOCS_PER_SEC", "2000"))
+    MIGRATION_MAX_BATCH_MS: float = float(os.getenv("MIGRATION_MAX_BATCH_MS", "200"))
+    MIGRATION_LEASE_SECONDS: int = int(os.getenv("MIGRATION_LEASE_SECONDS", "300"))
+    
+    # Admin /stats endpoint
+    STATS_WINDOWS_DAYS: tuple = (7, 30, 90)
+    STATS_CACHE_TTL: float = float(os.getenv("STATS_CACHE_TTL", "30"))
+    
+    # Admin user export (documents per cursor batch)
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+    
+    # Logging: JSON lines (or "text") written by a background thread.
+    # Records beyond LOG_QUEUE_SIZE pending are dropped rather than blocking.
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    
+    # Access log sampling for successful requests (errors and requests slower
+    # than LOG_SLOW_REQUEST_MS are always logged). Rules map route templates
+    # to a rate: {"/health": 0, "/me": 0.05, "/users/{user_id}/verify": 0.01}
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    LOG_SAMPLE_RULES: dict = json.loads(os.getenv("LOG_SAMPLE_RULES", "{}"))
+    LOG_SLOW_REQUEST_MS: float = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+    
+    # Prometheus metrics on /metrics. Route labels are route templates;
+    # templates beyond METRICS_MAX_ROUTES and label sets beyond
+    # METRICS_MAX_SERIES per metric are reported as "other".
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_MAX_ROUTES: int = int(os.getenv("METRICS_MAX_ROUTES", "200"))
+    METRICS_MAX_SERIES: int = int(os.getenv("METRICS_MAX_SERIES", "2000"))
+    
+    # Tracing (continues the gateway's traceparent). New traces are sampled
+    # with TRACE_SAMPLE_RATE; incoming traceparents keep their decision.
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+    # OTLP/HTTP JSON endpoint, e.g. http://otel-collector:4318/v1/traces
+    OTLP_TRACES_ENDPOINT: str = os.getenv("OTLP_TRACES_ENDPOINT", "")
+    OTLP_TIMEOUT: float = float(os.getenv("OTLP_TIMEOUT", "5"))
+    # Where spans go without a reachable endpoint: console | file | none
+    TRACE_FALLBACK: str = os.getenv("TRACE_FALLBACK", "console")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    TRACE_QUEUE_SIZE: int = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+    TRACE_EXPORT_BATCH_SIZE: int = int(os.getenv("TRACE_EXPORT_BATCH_SIZE", "512"))
+    TRACE_EXPORT_INTERVAL: float = float(os.getenv("TRACE_EXPORT_INTERVAL", "2"))
+    
     # Email verification
     EMAIL_VERIFICATION_EXPIRE_HOURS: int = 24
     PASSWORD_RESET_EXPIRE_HOURS: int = 1
@@ -20,5 +106,44 @@ class Settings:
     UPLOAD_DIR: Path = Path("/app/uploads/avatars")
     MAX_FILE_SIZE: int = 5 * 1024 * 1024  # 5MB
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+    # Uploads are streamed to a temp file by a small thread pool; data is
+    # handed to it in writes of UPLOAD_WRITE_BUFFER bytes
+    UPLOAD_IO_WORKERS: int = int(os.getenv("UPLOAD_IO_WORKERS", "4"))
+    UPLOAD_WRITE_BUFFER: int = int(os.getenv("UPLOAD_WRITE_BUFFER", str(256 * 1024)))
+    
+    # Avatar variants: WebP copies no wider/taller than each size (px),
+    # generated after upload by a process pool (0 workers = half the CPUs)
+    AVATAR_VARIANT_SIZES: tuple = tuple(
+        int(size) for size in os.getenv("AVATAR_VARIANT_SIZES", "64,128,512").split(",") if size.strip()
+    )
+    AVATAR_WEBP_QUALITY: int = int(os.getenv("AVATAR_WEBP_QUALITY", "80"))
+    AVATAR_MAX_PIXELS: int = int(os.getenv("AVATAR_MAX_PIXELS", str(40_000_000)))  # decompression bomb guard
+    AVATAR_VARIANT_WORKERS: int = int(os.getenv("AVATAR_VARIANT_WORKERS", "0"))
+    AVATAR_VARIANT_MAX_PENDING: int = int(os.getenv("AVATAR_VARIANT_MAX_PENDING", "64"))
+    # Avatar files never change (names are content hashes)
+    AVATAR_CACHE_MAX_AGE: int = int(os.getenv("AVATAR_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+    # Replaced avatars are deleted by a background pass (every AVATAR_GC_INTERVAL)
+    # once unreferenced for AVATAR_GC_DELAY; a pass holds an entry for
+    # AVATAR_GC_CLAIM_SECONDS at most
+    AVATAR_GC_DELAY: int = int(os.getenv("AVATAR_GC_DELAY", "3600"))
+    AVATAR_GC_INTERVAL: float = float(os.getenv("AVATAR_GC_INTERVAL", "300"))
+    AVATAR_GC_CLAIM_SECONDS: int = int(os.getenv("AVATAR_GC_CLAIM_SECONDS", "60"))
+    
+    # Avatar storage: local (UPLOAD_DIR on this host) | s3 (any S3-compatible
+    # store, e.g. MinIO). UPLOAD_DIR is still used as scratch space with s3.
+    AVATAR_STORAGE: str = os.getenv("AVATAR_STORAGE", "local")
+    S3_ENDPOINT: str = os.getenv("S3_ENDPOINT", "http://localhost:9000")
+    # Endpoint clients reach for presigned URLs (defaults to S3_ENDPOINT)
+    S3_PUBLIC_ENDPOINT: str = os.getenv("S3_PUBLIC_ENDPOINT", "")
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "avatars")
+    S3_REGION: str = os.getenv("S3_REGION", "us-east-1")
+    S3_ACCESS_KEY: str = os.getenv("S3_ACCESS_KEY", "")
+    S3_SECRET_KEY: str = os.getenv("S3_SECRET_KEY", "")
+    S3_TIMEOUT: float = float(os.getenv("S3_TIMEOUT", "10"))
+    S3_PRESIGN_EXPIRES: int = int(os.getenv("S3_PRESIGN_EXPIRES", "3600"))
+    # Seconds a HEAD seen object is redirected to without asking the store again
+    S3_EXISTS_HINT_TTL: float = float(os.getenv("S3_EXISTS_HINT_TTL", "10"))
+    # Answer avatar GETs with a redirect to a presigned URL (else proxy the bytes)
+    AVATAR_PRESIGNED_REDIRECT: bool = os.getenv("AVATAR_PRESIGNED_REDIRECT", "true").lower() == "true"
     
 settings = Settings()
\ No newline at end of file
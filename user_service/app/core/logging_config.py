@@ -0,0 +1,186 @@
+"""
+Structured, non-blocking logging
+
+Log calls only interpolate the message and put the record on a bounded
+queue; a QueueListener thread formats it (JSON lines by default) and
+writes it out. When the queue is full the record is dropped and counted
+instead of blocking the event loop.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import traceback
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import Request
+from .config import settings
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# LogRecord attributes that are not "extra" fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+access_logger = logging.getLogger("access")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields become top-level keys"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Interpolate now (args may change later); formatting happens in the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(service: str):
+    """Route all logging through the queue (replaces logging.basicConfig)"""
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter(service))
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    # uvicorn logs go through the queue too; its access log is replaced by ours
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush pending records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_log_level(level: str, logger_name: Optional[str] = None) -> dict:
+    """Change the level of the root logger (or of one logger) at runtime, in this process"""
+    level = level.upper()
+    if level not in LEVELS:
+        raise ValueError(f"Unknown log level '{level}', expected one of {', '.join(LEVELS)}")
+    logging.getLogger(logger_name).setLevel(level)
+    return get_logging_stats()
+
+
+def get_logging_stats() -> dict:
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "loggers": {
+            name: logging.getLevelName(logger.level)
+            for name, logger in logging.root.manager.loggerDict.items()
+            if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET
+        },
+        "format": settings.LOG_FORMAT,
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "queue_size": settings.LOG_QUEUE_SIZE,
+        "dropped": _handler.dropped if _handler else 0,
+        "sample_rate": settings.LOG_SAMPLE_RATE,
+        "sample_rules": settings.LOG_SAMPLE_RULES,
+        "slow_request_ms": settings.LOG_SLOW_REQUEST_MS
+    }
+
+
+def sample_rate_for(route: Optional[str]) -> float:
+    """Sampling rate of a route template (e.g. "/users/{user_id}")"""
+    return float(settings.LOG_SAMPLE_RULES.get(route, settings.LOG_SAMPLE_RATE))
+
+
+def log_access(request: Request, status_code: int, duration_ms: float, sample_rate: float, **fields):
+    """
+    One access log line per request: errors and slow requests always,
+    successful ones with probability `sample_rate`
+    """
+    slow = duration_ms >= settings.LOG_SLOW_REQUEST_MS
+    if status_code >= 500:
+        level, icon = logging.ERROR, "❌"
+    elif status_code >= 400:
+        level, icon = logging.WARNING, "⚠️"
+    elif slow:
+        level, icon = logging.WARNING, "🐢"
+    elif sample_rate >= 1 or random.random() < sample_rate:
+        level, icon = logging.INFO, "🟢"
+    else:
+        return
+
+    if not access_logger.isEnabledFor(level):
+        return
+    access_logger.log(
+        level,
+        "%s %s %s → %s (%.1f ms)",
+        icon, request.method, request.url.path, status_code, duration_ms,
+        extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": status_code,
+            "duration_ms": round(duration_ms, 1),
+            "slow": slow,
+            "sample_rate": sample_rate,
+            **fields
+        }
+    )
@@ -0,0 +1,345 @@
+"""
+Prometheus metrics (text exposition format, served on /metrics)
+
+Updates are plain float additions on a per-thread cell, so the hot path
+(event loop, Motor's executor threads) takes no lock and never contends;
+cells are summed when scraped. State the service already tracks (user
+cache, hashing pool) is read from its stats at scrape time.
+
+Label values must be bounded: routes are FastAPI route templates (e.g.
+/users/{user_id}) capped at METRICS_MAX_ROUTES, and every metric
+collapses new label sets beyond METRICS_MAX_SERIES into "other".
+"""
+
+import logging
+from bisect import bisect_left
+from threading import get_ident
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from .config import settings
+from pymongo import monitoring
+from . import cache
+from .logging_config import get_logging_stats
+from .tracing import exporter
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OVERFLOW = "other"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry: List["_Metric"] = []
+
+
+# ==================== PRIMITIVES ====================
+
+class _Child:
+    """Values of one label set, one cell per updating thread"""
+
+    __slots__ = ("_cells", "_size")
+
+    def __init__(self, size: int):
+        self._cells: Dict[int, list] = {}
+        self._size = size
+
+    def _cell(self) -> list:
+        ident = get_ident()
+        cell = self._cells.get(ident)
+        if cell is None:
+            cell = self._cells[ident] = [0.0] * self._size
+        return cell
+
+    def _totals(self) -> list:
+        totals = [0.0] * self._size
+        for cell in list(self._cells.values()):
+            for index, value in enumerate(cell):
+                totals[index] += value
+        return totals
+
+
+class CounterChild(_Child):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0):
+        self._cell()[0] += amount
+
+
+class GaugeChild(_Child):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0):
+        self._cell()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._cell()[0] -= amount
+
+
+class HistogramChild(_Child):
+    """Cell layout: one count per bucket (+Inf last), then sum, then count"""
+
+    __slots__ = ("_bounds",)
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        super().__init__(len(bounds) + 3)
+        self._bounds = bounds
+
+    def observe(self, value: float):
+        cell = self._cell()
+        cell[bisect_left(self._bounds, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, object]]) -> str:
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + text + "}" if text else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, _Child] = {}
+        registry.append(self)
+
+    def _new_child(self) -> _Child:
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child of a label set (create it once and keep it when the labels are fixed)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(self._children) >= settings.METRICS_MAX_SERIES:
+                values = (OVERFLOW,) * len(self.labelnames)
+                child = self._children.get(values)
+                if child is not None:
+                    return child
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_labels(zip(self.labelnames, values))} {_number(child._totals()[0])}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.bounds)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            pairs = list(zip(self.labelnames, values))
+            totals = child._totals()
+            cumulative = 0.0
+            for bound, count in zip(self.bounds + (float("inf"),), totals):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(pairs + [('le', _number(bound))])} {_number(cumulative)}"
+            yield f"{self.name}_sum{_labels(pairs)} {_number(totals[-2])}"
+            yield f"{self.name}_count{_labels(pairs)} {_number(totals[-1])}"
+
+
+class Collected(_Metric):
+    """Metric read from existing state at scrape time: fn() yields (label values, value)"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str],
+        fn: Callable[[], Iterable[Tuple[tuple, float]]]
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self) -> Iterable[str]:
+        try:
+            collected = list(self.fn())
+        except Exception as e:
+            logger.warning(f"⚠️ Metric {self.name} not collected: {e}")
+            return
+        for values, value in collected:
+            if value is not None:
+                yield f"{self.name}{_labels(zip(self.labelnames, values))} {_number(value)}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format"""
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+_routes: set = set()
+
+
+def route_label(template: Optional[str]) -> str:
+    """Bounded route label: the first METRICS_MAX_ROUTES templates, then "other" """
+    if template in _routes:
+        return template
+    if template is None:
+        return "unmatched"
+    if len(_routes) < settings.METRICS_MAX_ROUTES:
+        _routes.add(template)
+        return template
+    return OVERFLOW
+
+
+# ==================== USER SERVICE METRICS ====================
+
+REQUEST_DURATION = Histogram(
+    "user_service_http_request_duration_seconds",
+    "Time to response headers of user service requests (_count is the request count)",
+    ("route", "method", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "user_service_http_requests_in_flight",
+    "Requests being handled by the user service"
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "user_service_mongo_command_duration_seconds",
+    "MongoDB command latency as seen by the driver",
+    ("command", "collection"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "user_service_mongo_command_failures_total",
+    "MongoDB commands that returned an error",
+    ("command", "collection")
+)
+PASSWORD_QUEUE_WAIT = Histogram(
+    "user_service_password_hash_queue_wait_seconds",
+    "Time a hashing job waited for a free worker process",
+    ("operation",)
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "user_service_password_hash_duration_seconds",
+    "Time spent hashing/verifying in the worker process",
+    ("operation",)
+)
+
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    REQUEST_DURATION.labels(route, method, str(status)).observe(seconds)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Per command/collection latency from the driver's command events.
+    Events fire on Motor's executor threads; only per-thread cells are touched.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, Tuple[str, str]] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._pending[event.request_id] = (event.command_name, target if isinstance(target, str) else "")
+
+    def succeeded(self, event):
+        labels = self._pending.pop(event.request_id, None)
+        if labels is not None:
+            MONGO_COMMAND_DURATION.labels(*labels).observe(event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        labels = self._pending.pop(event.request_id, None)
+        if labels is not None:
+            MONGO_COMMAND_DURATION.labels(*labels).observe(event.duration_micros / 1_000_000)
+            MONGO_COMMAND_FAILURES.labels(*labels).inc()
+
+
+mongo_command_listener = MongoCommandMetrics()
+
+
+def _register_state_metrics():
+    def user_cache():
+        return cache.get_user_cache()
+
+    def password_stats() -> dict:
+        # password_service imports this module for its histograms
+        from .password_service import password_service
+        return password_service.stats() if password_service else {}
+
+    def variant_stats() -> dict:
+        from .avatar_variants import variant_service
+        return variant_service.stats() if variant_service else {}
+
+    Collected(
+        "user_service_user_cache_requests_total", "User document cache lookups by result", "counter", ("result",),
+        lambda: [(("hit",), user_cache().hits), (("miss",), user_cache().misses)]
+    )
+    Collected(
+        "user_service_user_cache_hit_ratio", "User cache hits / lookups since start", "gauge", (),
+        lambda: [((), user_cache().stats()["hit_ratio"])]
+    )
+    Collected(
+        "user_service_password_hash_pending", "Hashing jobs submitted and not finished", "gauge", (),
+        lambda: [((), password_stats().get("pending"))]
+    )
+    Collected(
+        "user_service_password_hash_rejected_total", "Hashing jobs rejected with 503 (pool saturated)", "counter", (),
+        lambda: [((), password_stats().get("rejected"))]
+    )
+    Collected(
+        "user_service_avatar_variant_jobs_total", "Avatar resizing jobs by result (generated, failed, skipped)",
+        "counter", ("result",),
+        lambda: [((result,), variant_stats().get(result)) for result in ("generated", "failed", "skipped")]
+    )
+    Collected(
+        "user_service_log_records_dropped_total", "Log records dropped because the log queue was full", "counter", (),
+        lambda: [((), get_logging_stats()["dropped"])]
+    )
+    Collected(
+        "user_service_trace_spans_total", "Finished spans by outcome (exported, fallback, dropped)", "counter",
+        ("result",),
+        lambda: [
+            (("exported",), exporter.exported), (("fallback",), exporter.fallback), (("dropped",), exporter.dropped)
+        ]
+    )
+
+
+_register_state_metrics()
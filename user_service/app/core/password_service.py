@@ -0,0 +1,170 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException, status
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+from .config import settings
+from .process_pool import make_process_pool
+from . import security
+from .metrics import PASSWORD_QUEUE_WAIT, PASSWORD_HASH_DURATION
+from .tracing import trace_span
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== WORKER FUNCTIONS (run in child processes) ====================
+
+def _hash_job(password: str):
+    started_at = time.time()
+    result = security.get_password_hash(password)
+    return result, started_at, time.time() - started_at
+
+
+def _verify_job(password: str, hashed_password: str):
+    started_at = time.time()
+    result = security.verify_password(password, hashed_password)
+    return result, started_at, time.time() - started_at
+
+
+def _verify_and_update_job(password: str, hashed_password: str):
+    started_at = time.time()
+    result = security.verify_and_update_password(password, hashed_password)
+    return result, started_at, time.time() - started_at
+
+
+class PasswordHashService:
+    """
+    Runs password hashing/verification in a bounded process pool so the event
+    loop is never blocked. When `max_pending` jobs are already queued behind
+    the busy workers, new requests are rejected immediately with 503.
+    A pool broken by a dead worker (e.g. OOM-killed) is replaced.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = self._new_executor()
+        self.pending = 0
+
+        # Metrics
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+        self.pool_restarts = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return make_process_pool(self.workers)
+
+    def _busy(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    async def _run(self, operation: str, fn, *args):
+        # Up to `workers` jobs run, the rest wait in the pool's queue
+        queued = self.pending - self.workers
+        if queued >= self.max_pending:
+            self.rejected += 1
+            logger.warning(f"⚠️ Password hashing saturated ({queued} queued) - rejecting")
+            raise self._busy()
+
+        self.pending += 1
+        submitted_at = time.time()
+        executor = self.executor
+        with trace_span(f"password.{operation}") as span:
+            try:
+                loop = asyncio.get_running_loop()
+                result, started_at, elapsed = await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # Every job of a broken pool fails: replace it once, the client retries
+                if self.executor is executor:
+                    self.pool_restarts += 1
+                    logger.error("❌ Password hashing pool broken (worker died) - restarting it")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = self._new_executor()
+                raise self._busy()
+            finally:
+                self.pending -= 1
+
+            queue_wait = max(0.0, started_at - submitted_at)
+            span.set_attribute("queue_wait_ms", round(queue_wait * 1000, 2))
+        self.completed += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_total += elapsed
+        self.hash_time_max = max(self.hash_time_max, elapsed)
+        if settings.METRICS_ENABLED:
+            PASSWORD_QUEUE_WAIT.labels(operation).observe(queue_wait)
+            PASSWORD_HASH_DURATION.labels(operation).observe(elapsed)
+
+        return result
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run("hash", _hash_job, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password off the event loop"""
+        return await self._run("verify", _verify_job, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        """Verify a password; also returns a new hash if the stored one is outdated"""
+        return await self._run("verify_and_update", _verify_and_update_job, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "pool_restarts": self.pool_restarts,
+            "default_scheme": security.pwd_context.default_scheme(),
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "queue_wait_avg_ms": round(self.queue_wait_total / completed * 1000, 2),
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 2),
+            "hash_time_avg_ms": round(self.hash_time_total / completed * 1000, 2),
+            "hash_time_max_ms": round(self.hash_time_max * 1000, 2)
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global password hashing service
+password_service: Optional[PasswordHashService] = None
+
+
+def init_password_service():
+    """Start the password hashing process pool"""
+    global password_service
+    workers = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+    password_service = PasswordHashService(workers, settings.PASSWORD_HASH_MAX_PENDING)
+    logger.info(
+        f"✅ Password hashing pool started: {workers} workers, "
+        f"max {settings.PASSWORD_HASH_MAX_PENDING} pending, scheme={security.pwd_context.default_scheme()}"
+    )
+
+
+def close_password_service():
+    """Stop the password hashing process pool"""
+    global password_service
+    if password_service:
+        password_service.shutdown()
+        password_service = None
+
+
+def get_password_service() -> PasswordHashService:
+    """Get password hashing service (started lazily if needed)"""
+    if password_service is None:
+        init_password_service()
+    return password_service
@@ -0,0 +1,15 @@
+"""
+Process pools for CPU-bound work (password hashing, avatar resizing)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+
+def make_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool whose workers are started by a forkserver. Forking this
+    process directly (event loop, Motor, logging and I/O threads running)
+    can leave a lock held in the child and deadlock it.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
@@ -1,29 +1,66 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import logging
 import secrets
+import hmac
+import time
 from .config import settings
 
-# Configure bcrypt to handle truncation automatically
+def _available_schemes() -> list:
+    """Configured schemes whose backend is installed (argon2 needs argon2-cffi)"""
+    from passlib.registry import get_crypt_handler
+    
+    schemes = []
+    for scheme in settings.PASSWORD_SCHEMES:
+        try:
+            if get_crypt_handler(scheme).has_backend():
+                schemes.append(scheme)
+                continue
+        except (KeyError, AttributeError):
+            pass
+        logging.getLogger(__name__).warning(f"⚠️ Password scheme '{scheme}' unavailable - skipped")
+    
+    # bcrypt is always kept so existing hashes can be verified
+    if "bcrypt" not in schemes:
+        schemes.append("bcrypt")
+    return schemes
+
+# First scheme hashes new passwords; the others are deprecated and only
+# verified (then rehashed on login). min_rounds marks under-cost bcrypt hashes.
 pwd_context = CryptContext(
-    schemes=["bcrypt"],
+    schemes=_available_schemes(),
     deprecated="auto",
     bcrypt__ident="2b",
-    bcrypt__truncate_error=False  
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__truncate_error=False,
+    argon2__type="ID",
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM
 )
 
+def _truncate(password: str) -> str:
+    """bcrypt only uses the first 72 bytes; applied to every scheme for consistency"""
+    password_bytes = password.encode('utf-8')[:72]
+    return password_bytes.decode('utf-8', errors='ignore')
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
-    password_bytes = plain_password.encode('utf-8')[:72]
-    truncated_password = password_bytes.decode('utf-8', errors='ignore')
-    return pwd_context.verify(truncated_password, hashed_password)
+    return pwd_context.verify(_truncate(plain_password), hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and return a new hash when the stored one uses a
+    deprecated scheme or a lower cost than configured
+    """
+    return pwd_context.verify_and_update(_truncate(plain_password), hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    password_bytes = password.encode('utf-8')[:72]
-    truncated_password = password_bytes.decode('utf-8', errors='ignore')
-    return pwd_context.hash(truncated_password)
+    return pwd_context.hash(_truncate(password))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
@@ -46,6 +83,33 @@ def verify_token(token: str) -> Optional[dict]:
     except JWTError:
         return None
 
+def get_trusted_identity(headers) -> Optional[dict]:
+    """
+    Read identity headers set by the API Gateway after it verified the JWT.
+    Returns a payload like verify_token(), or None when the headers are
+    missing or not signed with the shared gateway secret.
+    """
+    if not settings.GATEWAY_SHARED_SECRET:
+        return None
+    
+    secret = headers.get("x-gateway-secret")
+    email = headers.get("x-user-email")
+    if not secret or not email:
+        return None
+    
+    if not hmac.compare_digest(secret, settings.GATEWAY_SHARED_SECRET):
+        return None
+    
+    exp = headers.get("x-user-token-exp")
+    if exp is not None:
+        try:
+            if int(exp) <= time.time():
+                return None
+        except ValueError:
+            return None
+    
+    return {"sub": email, "role": headers.get("x-user-role"), "exp": exp}
+
 def generate_verification_token() -> str:
     """Generate a secure random token for email verification or password reset"""
     return secrets.token_urlsafe(32)
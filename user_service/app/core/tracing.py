@@ -0,0 +1,367 @@
+"""
+Distributed tracing (W3C traceparent, OTLP/HTTP JSON export)
+
+Spans live in a context variable, so child spans follow the request
+through awaits, tasks and Motor's executor threads (Motor runs pymongo
+calls in a copy of the caller's context), which is how MongoDB command
+spans find the route span they belong to. Sampling is
+decided once at the root from TRACE_SAMPLE_RATE and then follows the
+sampled flag of the incoming traceparent; unsampled spans are never
+recorded or exported.
+
+Finished spans are put on a bounded queue and a background thread sends
+them in batches to OTLP_TRACES_ENDPOINT. When no endpoint is set, or the
+collector cannot be reached, batches go to the TRACE_FALLBACK instead
+(console or a JSON lines file).
+"""
+
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+import httpx
+from pymongo import monitoring
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span_id, sampled) of a W3C traceparent header"""
+    if not value:
+        return None
+    match = _TRACEPARENT.match(value.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class Span:
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+        "start_ns", "end_ns", "attributes", "status", "status_message",
+    )
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str], sampled: bool, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes) if attributes and sampled else {}
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    def traceparent(self) -> Optional[str]:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.sampled:
+            exporter.submit(self)
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled: records nothing, propagates nothing"""
+
+    name = ""
+    trace_id = None
+    sampled = False
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+    def traceparent(self) -> Optional[str]:
+        return None
+
+    def end(self, end_ns: Optional[int] = None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    """Active span of the current request (a no-op span outside of one)"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def start_span(
+    name: str,
+    kind: int = INTERNAL,
+    attributes: Optional[dict] = None,
+    traceparent: Optional[str] = None,
+    parent: Optional[Span] = None
+):
+    """
+    Create a span without activating it. The parent is the incoming
+    `traceparent`, else `parent`, else the active span; without any of
+    them a new trace starts and is sampled with TRACE_SAMPLE_RATE.
+    """
+    if not settings.TRACING_ENABLED:
+        return NOOP_SPAN
+
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    else:
+        parent = parent or _current_span.get()
+        if parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id = _new_id(128), None
+            sampled = random.random() < settings.TRACE_SAMPLE_RATE
+    return Span(name, kind, trace_id, parent_id, sampled, attributes)
+
+
+@contextmanager
+def trace_span(
+    name: str,
+    kind: int = INTERNAL,
+    attributes: Optional[dict] = None,
+    traceparent: Optional[str] = None
+) -> Iterator[Span]:
+    """Run a block inside a new active span; exceptions mark it as failed"""
+    span = start_span(name, kind, attributes, traceparent)
+    if span is NOOP_SPAN:
+        yield span
+        return
+
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+# ==================== EXPORT ====================
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _encode_span(span: Span) -> dict:
+    encoded = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+        "status": {"code": span.status, "message": span.status_message} if span.status else {}
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+
+_STOP = object()
+
+
+class SpanExporter:
+    """Batches finished spans on a background thread (the event loop only enqueues)"""
+
+    def __init__(self, service: str):
+        self.service = service
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.TRACE_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._collector_down = False
+
+        # Metrics
+        self.exported = 0
+        self.dropped = 0
+        self.fallback = 0
+
+    def submit(self, span: Span):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Flush pending spans and stop the thread"""
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join(timeout=settings.OTLP_TIMEOUT + 1)
+            self._thread = None
+
+    def _run(self):
+        client = httpx.Client(timeout=settings.OTLP_TIMEOUT) if settings.OTLP_TRACES_ENDPOINT else None
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + settings.TRACE_EXPORT_INTERVAL
+            while len(batch) < settings.TRACE_EXPORT_BATCH_SIZE:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._export(client, batch)
+        if client is not None:
+            client.close()
+
+    def _export(self, client: Optional[httpx.Client], batch: List[Span]):
+        spans = [_encode_span(span) for span in batch]
+        if client is not None:
+            try:
+                response = client.post(settings.OTLP_TRACES_ENDPOINT, json=self._payload(spans))
+                response.raise_for_status()
+                self.exported += len(spans)
+                if self._collector_down:
+                    self._collector_down = False
+                    logger.info("✅ Trace collector reachable again")
+                return
+            except Exception as e:
+                if not self._collector_down:
+                    self._collector_down = True
+                    logger.warning(f"⚠️ Trace export failed ({e}) - using {settings.TRACE_FALLBACK} fallback")
+        self._write_fallback(spans)
+
+    def _payload(self, spans: List[dict]) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", self.service)]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}]
+            }]
+        }
+
+    def _write_fallback(self, spans: List[dict]):
+        if settings.TRACE_FALLBACK == "none":
+            return
+        lines = "".join(
+            json.dumps({"service": self.service, **span}, ensure_ascii=False) + "\n" for span in spans
+        )
+        try:
+            if settings.TRACE_FALLBACK == "file":
+                with open(settings.TRACE_FILE, "a") as f:
+                    f.write(lines)
+            else:
+                sys.stdout.write(lines)
+                sys.stdout.flush()
+            self.fallback += len(spans)
+        except Exception as e:
+            logger.warning(f"⚠️ Trace fallback write failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.TRACING_ENABLED,
+            "sample_rate": settings.TRACE_SAMPLE_RATE,
+            "endpoint": settings.OTLP_TRACES_ENDPOINT or None,
+            "fallback": settings.TRACE_FALLBACK,
+            "queued": self.queue.qsize(),
+            "exported": self.exported,
+            "written_to_fallback": self.fallback,
+            "dropped": self.dropped
+        }
+
+
+exporter = SpanExporter("user_service")
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """A client span per MongoDB command, child of the active span (sampled requests only)"""
+
+    def __init__(self):
+        self._pending: Dict[int, Span] = {}
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        attributes = {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "net.peer.name": f"{event.connection_id[0]}:{event.connection_id[1]}",
+        }
+        if isinstance(target, str):
+            attributes["db.mongodb.collection"] = target
+        self._pending[event.request_id] = start_span(f"mongo.{event.command_name}", CLIENT, attributes, parent=parent)
+
+    def succeeded(self, event):
+        span = self._pending.pop(event.request_id, None)
+        if span is not None:
+            span.end(span.start_ns + event.duration_micros * 1000)
+
+    def failed(self, event):
+        span = self._pending.pop(event.request_id, None)
+        if span is not None:
+            span.set_error(str(event.failure.get("errmsg", event.failure)))
+            span.end(span.start_ns + event.duration_micros * 1000)
+
+
+mongo_command_tracer = MongoCommandTracer()
+
+
+def start_tracing():
+    if settings.TRACING_ENABLED:
+        exporter.start()
+        logger.info(
+            f"🔭 Tracing enabled (sample rate {settings.TRACE_SAMPLE_RATE}, "
+            f"export to {settings.OTLP_TRACES_ENDPOINT or settings.TRACE_FALLBACK})"
+        )
+
+
+def stop_tracing():
+    exporter.stop()
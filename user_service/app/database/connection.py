@@ -1,5 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from ..core.config import settings
+from ..core.metrics import mongo_command_listener
+from ..core.tracing import mongo_command_tracer
 import logging
 from pymongo.errors import ConnectionFailure
 
@@ -9,6 +11,15 @@ logger = logging.getLogger(__name__)
 client: AsyncIOMotorClient = None
 database = None
 
+def _event_listeners() -> list:
+    """Command listeners for metrics and tracing (each costs a callback per command)"""
+    listeners = []
+    if settings.METRICS_ENABLED:
+        listeners.append(mongo_command_listener)
+    if settings.TRACING_ENABLED:
+        listeners.append(mongo_command_tracer)
+    return listeners
+
 async def connect_db():
     """Connect to MongoDB"""
     global client, database
@@ -20,7 +31,8 @@ async def connect_db():
             settings.MONGO_URL,
             serverSelectionTimeoutMS=5000,
             connectTimeoutMS=5000,
-            socketTimeoutMS=5000
+            socketTimeoutMS=5000,
+            event_listeners=_event_listeners()
         )
         
         await client.admin.command('ping')
@@ -0,0 +1,303 @@
+"""
+Load-data generator for shard load testing
+
+Generates users, vehicles and bookings in unordered insert_many batches.
+Bookings are spread over the geographic zones from init-sharding/setup-zones.js
+and every batch targets a single zone, so insert throughput is reported per
+collection and per booking zone. The shards behind each of them are looked up
+in config.tags/config.shards (not assumed from the zone layout).
+"""
+
+from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo.errors import BulkWriteError, PyMongoError
+from typing import Dict, List, Set
+import logging
+import random
+import time
+from .user_lookup import LOOKUP_COLLECTION, email_key, username_key
+
+logger = logging.getLogger(__name__)
+
+# Booking zone key (pickup_location) -> vehicle-service location
+LOCATIONS = {
+    "HANOI": {"vehicle_location": "HANOI"},
+    "HO_CHI_MINH": {"vehicle_location": "HOCHIMINH"},
+    "DA_NANG": {"vehicle_location": "DANANG"},
+}
+
+CAR_MODELS = [
+    ("Toyota", "Vios", 600000), ("Toyota", "Camry", 1200000), ("Honda", "City", 650000),
+    ("Honda", "CR-V", 1100000), ("Mazda", "CX-5", 1000000), ("Hyundai", "Accent", 550000),
+    ("Kia", "Morning", 400000), ("VinFast", "VF8", 1300000), ("Ford", "Ranger", 1000000),
+]
+BOOKING_STATUSES = ["pending", "confirmed", "completed", "cancelled"]
+
+# Max references kept in memory for bookings -> users/vehicles
+REFERENCE_SAMPLE_SIZE = 10000
+
+
+class LoadDataGenerator:
+    """
+    Generate realistic documents with a seeded, unique ID scheme:
+    usernames/emails are lt<seed>_<n>, so runs with different seeds never collide.
+    The sharded users collection has no unique email/username index, so
+    users are only inserted once their user_lookup keys are (see generate_users).
+    """
+
+    def __init__(self, db, seed: int, batch_size: int, password_hash: str):
+        self.db = db
+        self.seed = seed
+        self.batch_size = batch_size
+        self.password_hash = password_hash
+        self.rng = random.Random(seed)
+        self.now = datetime.utcnow()
+
+        self.user_ids = []
+        self.vehicle_ids = {location: [] for location in LOCATIONS}
+        self.throughput = {}
+        self.inserted: Dict[str, int] = {}
+
+    def _random_past(self, days: int = 90) -> datetime:
+        return self.now - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+    def _remember(self, sample: list, value):
+        """Keep a bounded random sample of ids used as booking references"""
+        if len(sample) < REFERENCE_SAMPLE_SIZE:
+            sample.append(value)
+        elif self.rng.random() < 0.1:
+            sample[self.rng.randrange(REFERENCE_SAMPLE_SIZE)] = value
+
+    # ==================== DOCUMENT BUILDERS ====================
+
+    def _user(self, n: int) -> dict:
+        created_at = self._random_past()
+        return {
+            "_id": ObjectId(),
+            "username": f"lt{self.seed}_{n}",
+            "email": f"lt{self.seed}_{n}@loadtest.local",
+            "password_hash": self.password_hash,
+            "role": "customer",
+            "full_name": f"Load Test User {n}",
+            "phone": f"09{self.rng.randint(0, 99999999):08d}",
+            "address": self.rng.choice(list(LOCATIONS)),
+            "avatar_url": None,
+            "is_email_verified": self.rng.random() < 0.7,
+            "email_verification_token": None,
+            "email_verification_expires": None,
+            "reset_password_token": None,
+            "reset_password_expires": None,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "last_login": None,
+            "is_active": True,
+            "is_deleted": False,
+            "load_test_seed": self.seed
+        }
+
+    def _vehicle(self, n: int, location: str) -> dict:
+        make, model, daily_rate = self.rng.choice(CAR_MODELS)
+        created_at = self._random_past()
+        return {
+            "_id": ObjectId(),
+            "make": make,
+            "model": model,
+            "year": self.rng.randint(2018, 2025),
+            "licensePlate": f"LT{self.seed}-{n:07d}",
+            "dailyRate": daily_rate,
+            "location": LOCATIONS[location]["vehicle_location"],
+            "status": "available",
+            "isDeleted": False,
+            "bookingRecords": [],
+            "createdAt": created_at,
+            "updatedAt": created_at,
+            "load_test_seed": self.seed
+        }
+
+    def _booking(self, location: str) -> dict:
+        vehicles = self.vehicle_ids[location]
+        total_days = self.rng.randint(1, 14)
+        daily_rate = self.rng.choice(CAR_MODELS)[2]
+        start_date = self._random_past(180)
+        return {
+            "_id": ObjectId(),
+            "user_id": str(self.rng.choice(self.user_ids)) if self.user_ids else str(ObjectId()),
+            "vehicle_id": str(self.rng.choice(vehicles)) if vehicles else str(ObjectId()),
+            "pickup_location": location,
+            "start_date": start_date,
+            "end_date": start_date + timedelta(days=total_days),
+            "total_days": total_days,
+            "daily_rate": daily_rate,
+            "book_price": daily_rate * total_days,
+            "status": self.rng.choice(BOOKING_STATUSES),
+            "created_at": start_date - timedelta(days=self.rng.randint(0, 30)),
+            "load_test_seed": self.seed
+        }
+
+    # ==================== INSERTS ====================
+
+    def _stats(self, collection: str, zone: str = None) -> dict:
+        target = f"{collection}:{zone}" if zone else collection
+        return self.throughput.setdefault(target, {
+            "collection": collection, "zone": zone, "inserted": 0, "duplicates": 0, "errors": 0, "seconds": 0.0
+        })
+
+    async def _insert_batch(self, collection: str, docs: list, zone: str = None) -> Set[int]:
+        """
+        Unordered insert_many; duplicates from a re-run are counted, not fatal.
+        Returns the indexes of the documents that were duplicates.
+        """
+        stats = self._stats(collection, zone)
+        duplicate_indexes: Set[int] = set()
+
+        started = time.perf_counter()
+        try:
+            result = await self.db[collection].insert_many(docs, ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as e:
+            details = e.details
+            inserted = details.get("nInserted", 0)
+            write_errors = details.get("writeErrors", [])
+            duplicate_indexes = {error["index"] for error in write_errors if error.get("code") == 11000}
+            stats["duplicates"] += len(duplicate_indexes)
+            stats["errors"] += len(write_errors) - len(duplicate_indexes)
+        stats["seconds"] += time.perf_counter() - started
+        stats["inserted"] += inserted
+        self.inserted[collection] = self.inserted.get(collection, 0) + inserted
+        return duplicate_indexes
+
+    async def generate_users(self, count: int):
+        for start in range(0, count, self.batch_size):
+            batch = [self._user(n) for n in range(start, min(start + self.batch_size, count))]
+
+            # Claim email/username in user_lookup first: a user whose keys
+            # already exist (same seed loaded before) is skipped, not duplicated
+            keys = [
+                {"_id": key(doc[field]), "user_id": doc["_id"]}
+                for doc in batch
+                for key, field in ((email_key, "email"), (username_key, "username"))
+            ]
+            taken = {keys[index]["user_id"] for index in await self._insert_batch(LOOKUP_COLLECTION, keys)}
+            if taken:
+                # Release the keys these skipped users did get
+                await self.db[LOOKUP_COLLECTION].delete_many({"user_id": {"$in": list(taken)}})
+                self._stats("users")["duplicates"] += len(taken)
+
+            fresh = [doc for doc in batch if doc["_id"] not in taken]
+            for doc in fresh:
+                self._remember(self.user_ids, doc["_id"])
+            if fresh:
+                await self._insert_batch("users", fresh)
+
+    async def generate_vehicles(self, count: int):
+        locations = list(LOCATIONS)
+        for batch_index, start in enumerate(range(0, count, self.batch_size)):
+            location = locations[batch_index % len(locations)]
+            batch = [self._vehicle(n, location) for n in range(start, min(start + self.batch_size, count))]
+            for doc in batch:
+                self._remember(self.vehicle_ids[location], doc["_id"])
+            await self._insert_batch("vehicles", batch)
+
+    async def generate_bookings(self, count: int):
+        # One zone per batch -> each insert_many targets a single shard
+        locations = list(LOCATIONS)
+        for batch_index, start in enumerate(range(0, count, self.batch_size)):
+            location = locations[batch_index % len(locations)]
+            size = min(self.batch_size, count - start)
+            batch = [self._booking(location) for _ in range(size)]
+            await self._insert_batch("bookings", batch, zone=location)
+
+    async def shard_distribution(self) -> dict:
+        """Actual document count per shard, as reported by collStats"""
+        distribution = {}
+        for collection in ("users", "vehicles", "bookings"):
+            try:
+                stats = await self.db.command("collStats", collection)
+                distribution[collection] = {
+                    shard_name: shard_data.get("count", 0)
+                    for shard_name, shard_data in stats.get("shards", {}).items()
+                }
+            except Exception as e:
+                distribution[collection] = {"error": str(e)}
+        return distribution
+
+    async def zone_shards(self) -> Dict[str, List[str]]:
+        """
+        Shards owning each throughput target according to the zone ranges in
+        config.tags (empty when the collection has no zone or config is unreadable)
+        """
+        config = self.db.client["config"]
+        try:
+            tags = await config.tags.find(
+                {"ns": {"$in": [f"{self.db.name}.{stats['collection']}" for stats in self.throughput.values()]}}
+            ).to_list(length=None)
+            shards = await config.shards.find({}, {"tags": 1}).to_list(length=None)
+        except PyMongoError as e:
+            logger.warning(f"⚠️ Cannot read zone configuration: {e}")
+            return {}
+
+        result = {}
+        for target, stats in self.throughput.items():
+            ns = f"{self.db.name}.{stats['collection']}"
+            zones = {
+                tag["tag"] for tag in tags
+                if tag["ns"] == ns and (stats["zone"] is None or stats["zone"] in tag["min"].values())
+            }
+            result[target] = sorted(shard["_id"] for shard in shards if zones & set(shard.get("tags", [])))
+        return result
+
+    async def report(self) -> dict:
+        zone_shards = await self.zone_shards()
+        throughput = {}
+        for target, stats in self.throughput.items():
+            seconds = stats["seconds"]
+            throughput[target] = {
+                **stats,
+                "shards": zone_shards.get(target, []),
+                "seconds": round(seconds, 3),
+                "docs_per_sec": round(stats["inserted"] / seconds, 1) if seconds else 0.0
+            }
+        return {
+            "seed": self.seed,
+            "batch_size": self.batch_size,
+            "inserted": dict(self.inserted),
+            "throughput": throughput
+        }
+
+
+async def seed_in_use(db, seed: int) -> bool:
+    """Whether users of this seed were loaded before (targeted user_lookup read)"""
+    return await db[LOOKUP_COLLECTION].find_one({"_id": email_key(f"lt{seed}_0@loadtest.local")}) is not None
+
+
+async def generate_load_data(
+    db,
+    users: int,
+    vehicles: int,
+    bookings: int,
+    password_hash: str,
+    batch_size: int = 1000,
+    seed: int = None
+) -> dict:
+    """
+    Generate users, vehicles and bookings; returns a throughput report per collection/zone.
+    Raises ValueError for a seed that was already loaded.
+    """
+    if seed is None:
+        seed = random.SystemRandom().randint(1, 10 ** 9)
+    if await seed_in_use(db, seed):
+        raise ValueError(f"Seed {seed} was already loaded: use another seed")
+
+    generator = LoadDataGenerator(db, seed, batch_size, password_hash)
+    started = time.perf_counter()
+
+    logger.info(f"🧪 Load data (seed={seed}): {users} users, {vehicles} vehicles, {bookings} bookings")
+    await generator.generate_users(users)
+    await generator.generate_vehicles(vehicles)
+    await generator.generate_bookings(bookings)
+
+    report = await generator.report()
+    report["total_seconds"] = round(time.perf_counter() - started, 3)
+    report["distribution"] = await generator.shard_distribution()
+    logger.info(f"✅ Load data done in {report['total_seconds']}s (seed={seed})")
+    return report
@@ -0,0 +1,350 @@
+"""
+Versioned, resumable data migrations
+
+A migration scans one collection through cursors and returns an
+UpdateOne (or None) per document; updates are sent with one unordered
+bulk_write per batch. Each run is recorded in the `schema_migrations`
+collection (version, status, counts), so a migration runs once per
+database and a crashed run resumes where it stopped.
+
+Work is split into partitions. On a collection sharded on a hashed key
+(users: {_id: "hashed"}) there is one partition per chunk, scanned as a
+min/max range of the hashed index. Partitions are grouped by the shard
+that owned the chunk when the run was planned, and up to
+`parallel_per_shard` partitions of each group run at the same time, which
+spreads the load across shards (mongos still decides which shards a
+cursor goes to). Elsewhere a single partition is scanned in _id order.
+Progress is checkpointed after every batch (the last _id for _id-ordered
+partitions, completion for chunk partitions), and the plan itself is
+stored with the record so a resumed run uses the same partitions.
+
+Every write to the run record is conditioned on this runner's owner. The
+lease is renewed on a timer (a partition may scan for a long time without
+a batch to write), and a runner whose lease was taken over stops.
+
+Updates must be idempotent: documents of an unfinished partition are
+seen again after a resume (filter on the old value, as the migrations in
+app/migrations do).
+"""
+
+from bson import MaxKey, MinKey
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+from ..core.config import settings
+from .connection import get_client, get_database
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class LeaseLost(RuntimeError):
+    """Another runner took over the run record (our lease expired)"""
+
+
+class Migration:
+    """Base class: set version/description/collection/filter and implement update()"""
+
+    version: str = ""
+    description: str = ""
+    collection: str = "users"
+    filter: dict = {}
+    projection: Optional[dict] = None
+
+    async def update(self, document: dict) -> Optional[UpdateOne]:
+        """Write for one matching document (None to leave it unchanged)"""
+        raise NotImplementedError
+
+
+class Throttle:
+    """
+    Keeps a run under `max_docs_per_sec` (shared by all partitions) and
+    backs off when bulk writes get slower than `max_batch_ms`, so the
+    migration yields to production traffic instead of queueing behind it.
+    """
+
+    def __init__(self, max_docs_per_sec: float, max_batch_ms: float):
+        self.max_docs_per_sec = max_docs_per_sec
+        self.max_batch_ms = max_batch_ms
+        self._next_slot = time.monotonic()
+        self.waited = 0.0
+
+    async def wait(self, documents: int, write_seconds: float):
+        delay = 0.0
+        if self.max_docs_per_sec > 0:
+            now = time.monotonic()
+            self._next_slot = max(self._next_slot, now) + documents / self.max_docs_per_sec
+            delay = self._next_slot - now - documents / self.max_docs_per_sec
+        if self.max_batch_ms > 0 and write_seconds * 1000 > self.max_batch_ms:
+            # The cluster is busy: stay idle as long as the write took
+            delay = max(delay, write_seconds)
+        if delay > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+
+# ==================== PLANNING ====================
+
+async def plan_partitions(collection_name: str) -> List[dict]:
+    """
+    Partitions of a collection: one per chunk when it is sharded on a
+    single hashed field, else one partition for the whole collection
+    """
+    namespace = f"{settings.MONGO_DB}.{collection_name}"
+    config = get_client()["config"]
+    try:
+        sharded = await config.collections.find_one({"_id": namespace})
+    except OperationFailure:
+        sharded = None  # no access to the config database
+
+    key = (sharded or {}).get("key", {})
+    if sharded and len(key) == 1 and list(key.values())[0] == "hashed":
+        field = next(iter(key))
+        chunks = config.chunks.find(
+            {"$or": [{"ns": namespace}, {"uuid": sharded.get("uuid")}]},
+            {"min": 1, "max": 1, "shard": 1}
+        ).sort("min", 1)
+        partitions = []
+        async for chunk in chunks:
+            partitions.append({
+                "name": f"chunk-{len(partitions):05d}",
+                "shard": chunk["shard"],
+                "field": field,
+                "min": chunk["min"][field],
+                "max": chunk["max"][field],
+            })
+        if partitions:
+            return partitions
+
+    return [{"name": "all", "shard": "all", "field": "_id", "min": MinKey(), "max": MaxKey()}]
+
+
+# ==================== RUNNER ====================
+
+class MigrationRunner:
+    """Runs migrations and records them in settings.MIGRATIONS_COLLECTION"""
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        parallel_per_shard: int = None,
+        max_docs_per_sec: float = None,
+        max_batch_ms: float = None,
+        dry_run: bool = False
+    ):
+        self.batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+        self.parallel_per_shard = parallel_per_shard or settings.MIGRATION_PARALLEL_PER_SHARD
+        self.throttle = Throttle(
+            settings.MIGRATION_MAX_DOCS_PER_SEC if max_docs_per_sec is None else max_docs_per_sec,
+            settings.MIGRATION_MAX_BATCH_MS if max_batch_ms is None else max_batch_ms
+        )
+        self.dry_run = dry_run
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.records = get_database()[settings.MIGRATIONS_COLLECTION]
+
+    async def status(self, migrations: List[Migration]) -> List[dict]:
+        recorded = {record["_id"]: record async for record in self.records.find({}, {"plan": 0})}
+        return [
+            {"version": m.version, "description": m.description, **recorded.get(m.version, {"status": PENDING})}
+            for m in migrations
+        ]
+
+    async def run_pending(self, migrations: List[Migration], only: Optional[str] = None) -> List[dict]:
+        results = []
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if only and migration.version != only:
+                continue
+            record = await self.records.find_one({"_id": migration.version}, {"status": 1})
+            if record and record["status"] == DONE:
+                continue
+            results.append(await self.run(migration))
+        return results
+
+    # ---------- one migration ----------
+
+    async def _claim(self, migration: Migration) -> dict:
+        """Create or take over the run record; the lease stops two runners working at once"""
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=settings.MIGRATION_LEASE_SECONDS)
+        await self.records.update_one(
+            {"_id": migration.version},
+            {"$setOnInsert": {
+                "description": migration.description,
+                "status": PENDING,
+                "created_at": now,
+                "partitions": {},
+            }},
+            upsert=True
+        )
+        record = await self.records.find_one_and_update(
+            {
+                "_id": migration.version,
+                "status": {"$ne": DONE},
+                "$or": [{"status": {"$ne": RUNNING}}, {"lease_until": {"$lt": now}}, {"owner": self.owner}],
+            },
+            {"$set": {"status": RUNNING, "owner": self.owner, "lease_until": lease_until, "started_at": now}},
+            return_document=True
+        )
+        if record is None:
+            raise RuntimeError(f"Migration {migration.version} is done or being run by another process")
+        return record
+
+    async def _update_record(self, migration: Migration, update: dict):
+        """Write to the run record we own; raises LeaseLost once it is someone else's"""
+        result = await self.records.update_one({"_id": migration.version, "owner": self.owner}, update)
+        if result.matched_count == 0:
+            raise LeaseLost(f"Migration {migration.version} was taken over by another process")
+
+    async def run(self, migration: Migration) -> dict:
+        counts = {"matched": 0, "modified": 0, "would_modify": 0}
+        started = time.perf_counter()
+
+        if self.dry_run:
+            record = await self.records.find_one({"_id": migration.version}) or {"partitions": {}}
+            plan = record.get("plan") or await plan_partitions(migration.collection)
+        else:
+            record = await self._claim(migration)
+            plan = record.get("plan")
+            if not plan:
+                plan = await plan_partitions(migration.collection)
+                await self._update_record(migration, {"$set": {"plan": plan}})
+
+        progress: Dict[str, dict] = record.get("partitions", {})
+        todo = [partition for partition in plan if not progress.get(partition["name"], {}).get("done")]
+        logger.info(
+            f"🚚 Migration {migration.version} ({migration.description}): "
+            f"{len(todo)}/{len(plan)} partitions to scan{' [dry run]' if self.dry_run else ''}"
+        )
+
+        semaphores: Dict[str, asyncio.Semaphore] = {}
+        for partition in todo:
+            semaphores.setdefault(partition["shard"], asyncio.Semaphore(self.parallel_per_shard))
+
+        async def run_partition(partition):
+            async with semaphores[partition["shard"]]:
+                await self._run_partition(migration, partition, progress.get(partition["name"], {}), counts)
+
+        tasks = [asyncio.create_task(run_partition(partition)) for partition in todo]
+        # The lease renewal fails (LeaseLost) like a partition would
+        watched = set(tasks) if self.dry_run else {*tasks, asyncio.create_task(self._renew_lease(migration))}
+        try:
+            while not all(task.done() for task in tasks):
+                done, watched = await asyncio.wait(watched, return_when=asyncio.FIRST_COMPLETED)
+                failed = next((task for task in done if task.exception()), None)
+                if failed:
+                    raise failed.exception()
+        except Exception as e:
+            # Stop the other partitions before recording the failure.
+            # Cancelled/killed runs stay "running" and are resumable once the lease expires.
+            await self._cancel([*tasks, *watched])
+            if not self.dry_run and not isinstance(e, LeaseLost):
+                await self._update_record(
+                    migration, {"$set": {"status": FAILED, "error": f"{type(e).__name__}: {e}", "lease_until": None}}
+                )
+            raise
+        finally:
+            await self._cancel([*tasks, *watched])
+
+        elapsed = time.perf_counter() - started
+        if not self.dry_run:
+            await self._update_record(
+                migration,
+                {"$set": {"status": DONE, "finished_at": datetime.utcnow(), "lease_until": None, "error": None}}
+            )
+        logger.info(
+            f"✅ Migration {migration.version}: {counts['matched']} matched, "
+            f"{counts['would_modify'] if self.dry_run else counts['modified']} "
+            f"{'would be modified' if self.dry_run else 'modified'} in {elapsed:.1f}s "
+            f"(throttled {self.throttle.waited:.1f}s)"
+        )
+        return {"version": migration.version, "dry_run": self.dry_run, "seconds": round(elapsed, 1), **counts}
+
+    async def _renew_lease(self, migration: Migration):
+        """Extend the lease every third of its length until cancelled"""
+        interval = max(1.0, settings.MIGRATION_LEASE_SECONDS / 3)
+        while True:
+            await asyncio.sleep(interval)
+            await self._update_record(migration, {"$set": {
+                "lease_until": datetime.utcnow() + timedelta(seconds=settings.MIGRATION_LEASE_SECONDS)
+            }})
+
+    @staticmethod
+    async def _cancel(tasks: List[asyncio.Task]):
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    # ---------- one partition ----------
+
+    def _cursor(self, migration: Migration, partition: dict, last_id):
+        collection = get_database()[migration.collection]
+        if partition["name"] == "all":
+            query = dict(migration.filter)
+            if last_id is not None:
+                query = {"$and": [query, {"_id": {"$gt": last_id}}]} if query else {"_id": {"$gt": last_id}}
+            return collection.find(query, migration.projection).sort("_id", 1).batch_size(self.batch_size)
+
+        # Chunk range on the hashed index (min/max bound the index scan)
+        field = partition["field"]
+        return (
+            collection.find(migration.filter, migration.projection)
+            .hint([(field, "hashed")])
+            .min([(field, partition["min"])])
+            .max([(field, partition["max"])])
+            .batch_size(self.batch_size)
+        )
+
+    async def _run_partition(self, migration: Migration, partition: dict, checkpoint: dict, counts: dict):
+        collection = get_database()[migration.collection]
+        name = partition["name"]
+        ordered = name == "all"
+        last_id = checkpoint.get("last_id") if ordered else None
+        batch: List[dict] = []
+
+        async for document in self._cursor(migration, partition, last_id):
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                await self._apply(migration, collection, name, batch, counts, ordered)
+                batch = []
+        if batch:
+            await self._apply(migration, collection, name, batch, counts, ordered)
+
+        if not self.dry_run:
+            await self._update_record(migration, {"$set": {f"partitions.{name}.done": True}})
+
+    async def _apply(self, migration: Migration, collection, name: str, batch: List[dict], counts: dict, ordered: bool):
+        operations = [op for op in [await migration.update(document) for document in batch] if op is not None]
+        counts["matched"] += len(batch)
+
+        write_started = time.perf_counter()
+        if self.dry_run:
+            counts["would_modify"] += len(operations)
+        else:
+            modified = 0
+            if operations:
+                result = await collection.bulk_write(operations, ordered=False)
+                modified = result.modified_count
+            counts["modified"] += modified
+
+            checkpoint = {
+                "$inc": {
+                    "matched": len(batch),
+                    "modified": modified,
+                    f"partitions.{name}.processed": len(batch),
+                    f"partitions.{name}.modified": modified,
+                },
+                "$set": {"lease_until": datetime.utcnow() + timedelta(seconds=settings.MIGRATION_LEASE_SECONDS)},
+            }
+            if ordered:
+                checkpoint["$set"][f"partitions.{name}.last_id"] = batch[-1]["_id"]
+            await self._update_record(migration, checkpoint)
+
+        await self.throttle.wait(len(batch), time.perf_counter() - write_started)
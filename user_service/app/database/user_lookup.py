@@ -0,0 +1,192 @@
+"""
+Email/username -> _id lookup for the users collection
+
+users is sharded on {_id: hashed}, so a query by email or username is
+broadcast to every chunk by mongos. The compact `user_lookup` collection
+(also sharded on hashed _id) maps "email:<email>" and "username:<name>" to
+the user's _id. Both steps of a lookup are then single-shard queries by _id.
+Because the keys are _ids, the lookup also enforces unique email/username.
+
+Registration claims its keys as "pending" before inserting the user and
+confirms them afterwards. A claim left behind by a crashed registration is
+taken over by the next registration once the user it points to does not
+exist and USER_LOOKUP_CLAIM_TIMEOUT has passed.
+"""
+
+from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional
+import logging
+from ..core.config import settings
+from .connection import get_database
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_COLLECTION = "user_lookup"
+
+
+def get_lookup_collection():
+    return get_database()[LOOKUP_COLLECTION]
+
+
+def email_key(email: str) -> str:
+    return f"email:{email}"
+
+
+def username_key(username: str) -> str:
+    return f"username:{username}"
+
+
+async def resolve_user_id(key: str) -> Optional[ObjectId]:
+    """Resolve a lookup key to a user _id (single-shard query)"""
+    entry = await get_lookup_collection().find_one({"_id": key}, {"user_id": 1})
+    return entry["user_id"] if entry else None
+
+
+async def find_user_by_email(email: str, projection: dict = None) -> Optional[dict]:
+    """
+    Find a non-deleted user by email through the lookup.
+    Falls back to the broadcast query (and repairs the lookup) while
+    USER_LOOKUP_FALLBACK is on, i.e. until the lookup has been backfilled.
+    """
+    users_collection = get_database().users
+
+    user_id = await resolve_user_id(email_key(email))
+    if user_id is not None:
+        return await users_collection.find_one(
+            {"_id": user_id, "email": email, "is_deleted": False}, projection
+        )
+
+    if not settings.USER_LOOKUP_FALLBACK:
+        return None
+
+    user = await users_collection.find_one({"email": email, "is_deleted": False}, projection)
+    if user is not None:
+        await _repair(email_key(email), user["_id"])
+    return user
+
+
+async def _repair(key: str, user_id: ObjectId):
+    try:
+        await get_lookup_collection().insert_one({"_id": key, "user_id": user_id})
+    except DuplicateKeyError:
+        pass
+
+
+async def username_exists(username: str) -> bool:
+    """Check if a username is taken (lookup first, broadcast only in fallback mode)"""
+    if await resolve_user_id(username_key(username)) is not None:
+        return True
+
+    if not settings.USER_LOOKUP_FALLBACK:
+        return False
+
+    user = await get_database().users.find_one(
+        {"username": username, "is_deleted": False}, {"_id": 1}
+    )
+    if user is not None:
+        await _repair(username_key(username), user["_id"])
+        return True
+    return False
+
+
+async def _claim(key: str, user_id: ObjectId) -> bool:
+    """Insert a pending lookup entry, or take over an orphaned one"""
+    lookup = get_lookup_collection()
+    now = datetime.utcnow()
+    try:
+        await lookup.insert_one({"_id": key, "user_id": user_id, "pending": True, "claimed_at": now})
+        return True
+    except DuplicateKeyError:
+        pass
+
+    entry = await lookup.find_one({"_id": key})
+    if entry is None:
+        return False  # released meanwhile: let the client retry
+    if entry.get("pending") and entry.get("claimed_at", now) > now - timedelta(seconds=settings.USER_LOOKUP_CLAIM_TIMEOUT):
+        return False  # registration in progress
+    if await get_database().users.find_one({"_id": entry["user_id"], "is_deleted": False}, {"_id": 1}):
+        return False
+
+    # Orphaned entry (registration died before inserting the user)
+    taken_over = await lookup.update_one(
+        {"_id": key, "user_id": entry["user_id"]},
+        {"$set": {"user_id": user_id, "pending": True, "claimed_at": now}}
+    )
+    if taken_over.modified_count:
+        logger.warning(f"⚠️ Took over orphaned lookup entry {key} (user {entry['user_id']} does not exist)")
+    return taken_over.modified_count == 1
+
+
+async def claim_user_keys(email: str, username: str, user_id: ObjectId) -> Optional[str]:
+    """
+    Reserve email and username for a new user (pending until confirm_user_keys).
+    Returns None on success, or "email"/"username" for the key already taken.
+    """
+    if not await _claim(email_key(email), user_id):
+        return "email"
+
+    if not await _claim(username_key(username), user_id):
+        await get_lookup_collection().delete_one({"_id": email_key(email), "user_id": user_id})
+        return "username"
+
+    return None
+
+
+async def confirm_user_keys(email: str, username: str, user_id: ObjectId) -> bool:
+    """
+    Mark claimed keys as belonging to an inserted user.
+    False when a claim was taken over meanwhile (the caller must undo the insert).
+    """
+    keys: List[str] = [email_key(email), username_key(username)]
+    result = await get_lookup_collection().update_many(
+        {"_id": {"$in": keys}, "user_id": user_id},
+        {"$unset": {"pending": "", "claimed_at": ""}}
+    )
+    return result.matched_count == len(keys)
+
+
+async def release_user_keys(user: dict):
+    """Remove lookup entries of a user (on delete or failed registration)"""
+    keys = []
+    if user.get("email"):
+        keys.append(email_key(user["email"]))
+    if user.get("username"):
+        keys.append(username_key(user["username"]))
+
+    if keys:
+        await get_lookup_collection().delete_many(
+            {"_id": {"$in": keys}, "user_id": ObjectId(str(user["_id"]))}
+        )
+
+
+async def backfill_lookup(batch_size: int = 1000) -> int:
+    """Create lookup entries for existing users; returns number of entries written"""
+    from pymongo import UpdateOne
+
+    users_collection = get_database().users
+    lookup = get_lookup_collection()
+    written = 0
+    operations = []
+
+    cursor = users_collection.find(
+        {"is_deleted": False}, {"email": 1, "username": 1}, batch_size=batch_size
+    )
+    async for user in cursor:
+        for key in (email_key(user["email"]), username_key(user["username"])):
+            operations.append(UpdateOne(
+                {"_id": key}, {"$setOnInsert": {"user_id": user["_id"]}}, upsert=True
+            ))
+
+        if len(operations) >= batch_size:
+            result = await lookup.bulk_write(operations, ordered=False)
+            written += result.upserted_count
+            operations = []
+
+    if operations:
+        result = await lookup.bulk_write(operations, ordered=False)
+        written += result.upserted_count
+
+    logger.info(f"✅ user_lookup backfill: {written} entries created")
+    return written
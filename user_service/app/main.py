@@ -1,27 +1,49 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
+import time
 from datetime import datetime
 
 from .core.config import settings
 from .database.connection import connect_db, close_db, get_database, get_client
+from .core.cache import init_user_cache, close_user_cache
+from .core.password_service import init_password_service, close_password_service
+from .core.avatar_storage import init_avatar_storage, close_avatar_storage
+from .core.avatar_variants import init_variant_service, close_variant_service
+from .core.avatar_gc import start_avatar_gc, stop_avatar_gc
+from .core.logging_config import setup_logging, stop_logging, log_access, sample_rate_for
+from .core.metrics import REQUESTS_IN_FLIGHT, CONTENT_TYPE, observe_request, route_label, render
+from .core.tracing import trace_span, start_tracing, stop_tracing, SERVER
 from .routes import user_routes
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON lines through a background writer thread)
+setup_logging("user_service")
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events"""
     logger.info("🚀 Starting User Service...")
+    start_tracing()
     await connect_db()
     logger.info("✅ Connected to MongoDB")
+    await init_user_cache()
+    init_password_service()
+    await init_avatar_storage()
+    init_variant_service()
+    start_avatar_gc()
     yield
     logger.info("👋 Shutting down User Service...")
+    await stop_avatar_gc()
+    close_password_service()
+    close_variant_service()
+    await close_avatar_storage()
+    await close_user_cache()
     await close_db()
     logger.info("✅ Closed MongoDB connection")
+    stop_tracing()
+    stop_logging()
 
 app = FastAPI(
     title="User Service",
@@ -39,6 +61,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    in_flight = REQUESTS_IN_FLIGHT.labels() if settings.METRICS_ENABLED else None
+    if in_flight:
+        in_flight.inc()
+    started = time.perf_counter()
+    # Route span, continuing the gateway's trace
+    with trace_span(
+        f"{request.method} {request.url.path}",
+        SERVER,
+        {"http.method": request.method, "http.target": request.url.path},
+        traceparent=request.headers.get("traceparent")
+    ) as span:
+        try:
+            response = await call_next(request)
+        finally:
+            if in_flight:
+                in_flight.dec()
+
+        # Route template (e.g. /users/{user_id}) is known once routing has run
+        route = request.scope.get("route")
+        template = getattr(route, "path", None)
+        if span.sampled:
+            span.name = f"{request.method} {template or request.url.path}"
+            span.set_attribute("http.route", template or "")
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.set_error(f"HTTP {response.status_code}")
+
+    elapsed = time.perf_counter() - started
+    if in_flight:
+        observe_request(route_label(template), request.method, response.status_code, elapsed)
+    log_access(
+        request, response.status_code, elapsed * 1000, sample_rate_for(template),
+        route=template, trace_id=span.trace_id
+    )
+    return response
+
 # Include routes
 app.include_router(user_routes.router, prefix="", tags=["users"])
 
@@ -52,6 +112,13 @@ async def root():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint with sharding info"""
@@ -0,0 +1,13 @@
+"""
+Data migrations, applied in version order by `python -m app.commands.migrate up`
+
+To add one: create mNNNN_<name>.py with a Migration subclass (see
+app/database/migrations.py) and append it below. Never change the version of
+a migration that has already run.
+"""
+
+from .m0001_avatar_url_leading_slash import AvatarUrlLeadingSlash
+
+MIGRATIONS = [
+    AvatarUrlLeadingSlash(),
+]
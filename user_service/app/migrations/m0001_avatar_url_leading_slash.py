@@ -0,0 +1,23 @@
+"""
+0001: add the leading "/" missing from old avatar URLs
+
+Replaces fix_avatar_urls.py / fix_avatar_urls.js.
+"""
+
+from pymongo import UpdateOne
+from ..database.migrations import Migration
+
+
+class AvatarUrlLeadingSlash(Migration):
+    version = "0001"
+    description = "Add the leading '/' to avatar_url"
+    collection = "users"
+    filter = {"avatar_url": {"$regex": "^api/users/avatars/"}}
+    projection = {"avatar_url": 1}
+
+    async def update(self, document: dict):
+        # Guarded by the old value: a newer upload is never overwritten
+        return UpdateOne(
+            {"_id": document["_id"], "avatar_url": document["avatar_url"]},
+            {"$set": {"avatar_url": f"/{document['avatar_url']}"}}
+        )
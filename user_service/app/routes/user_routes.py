@@ -1,27 +1,44 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Header, Form, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, status, Header, Form, Request, Response, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordRequestForm
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta
+from typing import Optional
+import base64
 import logging
 import secrets
 from bson import ObjectId
 import os
-import uuid
 from pathlib import Path
 
 from ..schemas.user_schema import (
     UserRegister, UserLogin, UserResponse, TokenResponse, 
     MessageResponse, UserUpdate, ChangePassword, 
     ForgotPassword, ResetPassword, VerifyEmail,
-    UserStatsResponse, DailySignup
+    UserStatsResponse, DailySignup, LogLevelUpdate
 )
 from ..core.security import (
-    verify_password, get_password_hash, create_access_token,
+    create_access_token,
     verify_token, generate_verification_token, 
-    create_verification_token_expiry, is_token_expired
+    create_verification_token_expiry, is_token_expired,
+    get_trusted_identity
 )
 from ..core.config import settings
+from ..core.cache import get_user_cache, SingleFlightCache
+from ..core.password_service import get_password_service
+from ..core.logging_config import get_logging_stats, set_log_level
+from ..core.tracing import trace_span
+from ..core.avatar_upload import AvatarUpload, media_type_for
+from ..core import avatar_gc
+from ..core.avatar_gc import schedule_deletion
+from ..core.avatar_variants import (
+    get_variant_service, pick_variant_size, variant_filename, VARIANT_MEDIA_TYPE
+)
+from ..core.avatar_storage import get_storage
 from ..database.connection import get_database, client
+from ..database.user_lookup import (
+    find_user_by_email, username_exists, claim_user_keys, confirm_user_keys,
+    release_user_keys, resolve_user_id, email_key, LOOKUP_COLLECTION
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -34,10 +51,16 @@ def get_users_collection():
     return db.users
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """Get current authenticated user"""
-    token = credentials.credentials
-    payload = verify_token(token)
+    # Token already verified by the API Gateway -> skip re-decoding
+    payload = get_trusted_identity(request.headers)
+    if payload is None:
+        with trace_span("auth.verify_token"):
+            payload = verify_token(credentials.credentials)
     
     if payload is None:
         raise HTTPException(
@@ -52,14 +75,22 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid token payload"
         )
     
-    users_collection = get_users_collection()
-    user = await users_collection.find_one({"email": email, "is_deleted": False})
+    # Cached user document (invalidated on every write to the user)
+    user_cache = get_user_cache()
+    generation = user_cache.generation()
+    user = await user_cache.get_by_email(email)
     
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+        # email -> _id lookup, then a single-shard query by _id
+        user = await find_user_by_email(email)
+        
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        
+        await user_cache.set(user, generation)
     
     if not user.get("is_active", True):
         raise HTTPException(
@@ -86,15 +117,12 @@ async def register_user(user_data: UserRegister):
     - Customers can self-register
     - Admin accounts can be created via this endpoint
     """
-    logger.info(f"📝 Registration attempt for: {user_data.email}")
+    logger.debug("📝 Registration attempt for: %s", user_data.email)
     
     users_collection = get_users_collection()
     
-    # Check email exists
-    existing_user = await users_collection.find_one({
-        "email": user_data.email,
-        "is_deleted": False
-    })
+    # Check email exists (via user_lookup, no broadcast to every chunk)
+    existing_user = await find_user_by_email(user_data.email, {"_id": 1})
     
     if existing_user:
         logger.warning(f"⚠️ Email already exists: {user_data.email}")
@@ -104,12 +132,7 @@ async def register_user(user_data: UserRegister):
         )
     
     # Check username exists
-    existing_username = await users_collection.find_one({
-        "username": user_data.username,
-        "is_deleted": False
-    })
-    
-    if existing_username:
+    if await username_exists(user_data.username):
         logger.warning(f"⚠️ Username already exists: {user_data.username}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -120,10 +143,12 @@ async def register_user(user_data: UserRegister):
     verification_token = generate_verification_token()
     
     # Create user document
+    user_id = ObjectId()
     user_doc = {
+        "_id": user_id,
         "username": user_data.username,
         "email": user_data.email,
-        "password_hash": get_password_hash(user_data.password),
+        "password_hash": await get_password_service().hash(user_data.password),
         "role": user_data.role,  # ✅ Allow admin role
         "full_name": user_data.full_name,
         "phone": user_data.phone,
@@ -143,8 +168,34 @@ async def register_user(user_data: UserRegister):
         "is_deleted": False
     }
     
-    # Insert user
-    result = await users_collection.insert_one(user_doc)
+    # Reserve email/username in the lookup (atomic, guards concurrent registrations)
+    taken = await claim_user_keys(user_data.email, user_data.username, user_id)
+    if taken == "email":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    if taken == "username":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already taken"
+        )
+    
+    # Insert user (release the reserved lookup keys if it fails)
+    try:
+        result = await users_collection.insert_one(user_doc)
+    except Exception:
+        await release_user_keys(user_doc)
+        raise
+    
+    if not await confirm_user_keys(user_data.email, user_data.username, user_id):
+        # A claim timed out and was taken over by another registration
+        await users_collection.delete_one({"_id": user_id})
+        await release_user_keys(user_doc)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Registration took too long, please retry"
+        )
     
     logger.info(f"✅ User registered successfully: {user_data.email} (role: {user_data.role})")
     
@@ -169,15 +220,18 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
     email = form_data.username
     password = form_data.password
     
-    logger.info(f"🔐 Login attempt for: {email}")
+    logger.debug("🔐 Login attempt for: %s", email)
     
     users_collection = get_users_collection()
-    user = await users_collection.find_one({
-        "email": email,
-        "is_deleted": False
-    })
+    user = await find_user_by_email(email)
+    
+    password_valid, new_hash = False, None
+    if user:
+        password_valid, new_hash = await get_password_service().verify_and_update(
+            password, user["password_hash"]
+        )
     
-    if not user or not verify_password(password, user["password_hash"]):
+    if not password_valid:
         logger.warning(f"⚠️ Invalid credentials for: {email}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -192,11 +246,17 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
             detail="Account is inactive. Please contact support."
         )
     
-    # Update last login
+    # Update last login (and transparently upgrade an outdated password hash)
+    login_update = {"last_login": datetime.utcnow()}
+    if new_hash:
+        login_update["password_hash"] = new_hash
+        logger.info(f"🔁 Password hash upgraded for: {email}")
+    
     await users_collection.update_one(
         {"_id": user["_id"]},
-        {"$set": {"last_login": datetime.utcnow()}}
+        {"$set": login_update}
     )
+    await get_user_cache().invalidate(user)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -216,7 +276,7 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
 @router.post("/verify-email", response_model=MessageResponse)
 async def verify_email(data: VerifyEmail):
     """Verify user email with token"""
-    logger.info(f"📧 Email verification attempt")
+    logger.debug("📧 Email verification attempt")
     
     users_collection = get_users_collection()
     user = await users_collection.find_one({
@@ -250,6 +310,7 @@ async def verify_email(data: VerifyEmail):
             }
         }
     )
+    await get_user_cache().invalidate(user)
     
     logger.info(f"✅ Email verified for: {user['email']}")
     
@@ -258,7 +319,7 @@ async def verify_email(data: VerifyEmail):
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user profile"""
-    logger.info(f"👤 Profile request from: {current_user['email']}")
+    logger.debug("👤 Profile request from: %s", current_user["email"])
     
     current_user["_id"] = str(current_user["_id"])
     return current_user
@@ -269,7 +330,7 @@ async def update_current_user(
     current_user: dict = Depends(get_current_user)
 ):
     """Update current user profile"""
-    logger.info(f"✏️ Profile update request from: {current_user['email']}")
+    logger.debug("✏️ Profile update request from: %s", current_user["email"])
     
     users_collection = get_users_collection()
     
@@ -288,6 +349,7 @@ async def update_current_user(
         {"_id": current_user["_id"]},
         {"$set": update_data}
     )
+    await get_user_cache().invalidate(current_user)
     
     updated_user = await users_collection.find_one({"_id": current_user["_id"]})
     updated_user["_id"] = str(updated_user["_id"])
@@ -302,9 +364,10 @@ async def change_password(
     current_user: dict = Depends(get_current_user)
 ):
     """Change user password"""
-    logger.info(f"🔑 Password change request from: {current_user['email']}")
+    logger.debug("🔑 Password change request from: %s", current_user["email"])
     
-    if not verify_password(data.old_password, current_user["password_hash"]):
+    password_service = get_password_service()
+    if not await password_service.verify(data.old_password, current_user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect old password"
@@ -315,83 +378,86 @@ async def change_password(
         {"_id": current_user["_id"]},
         {
             "$set": {
-                "password_hash": get_password_hash(data.new_password),
+                "password_hash": await password_service.hash(data.new_password),
                 "updated_at": datetime.utcnow()
             }
         }
     )
+    await get_user_cache().invalidate(current_user)
     
     logger.info(f"✅ Password changed for: {current_user['email']}")
     
     return {"message": "Password changed successfully"}
 
 
-@router.post("/upload-avatar", response_model=dict)
+@router.post(
+    "/upload-avatar",
+    response_model=dict,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file"],
+                        "properties": {"file": {"type": "string", "format": "binary"}}
+                    }
+                }
+            }
+        }
+    }
+)
 async def upload_avatar(
-    file: UploadFile = File(...),
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload user avatar image"""
-    logger.info(f"📸 Avatar upload request from: {current_user['email']}")
-    
-    # Validate file extension
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid file type. Allowed: {', '.join(settings.ALLOWED_EXTENSIONS)}"
-        )
-    
-    # Validate file size
-    file_content = await file.read()
-    if len(file_content) > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / 1024 / 1024}MB"
-        )
+    """Upload user avatar image (streamed; type checked from the file's magic bytes)"""
+    logger.debug("📸 Avatar upload request from: %s", current_user["email"])
     
-    # Create upload directory if not exists
-    settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # Generate unique filename
-    unique_filename = f"{current_user['_id']}_{uuid.uuid4().hex}{file_ext}"
-    file_path = settings.UPLOAD_DIR / unique_filename
-    
-    # Delete old avatar if exists
-    if current_user.get("avatar_url"):
-        old_filename = current_user["avatar_url"].split("/")[-1]
-        old_file_path = settings.UPLOAD_DIR / old_filename
-        if old_file_path.exists():
-            try:
-                old_file_path.unlink()
-                logger.info(f"🗑️ Deleted old avatar: {old_filename}")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not delete old avatar: {e}")
+    upload = AvatarUpload("file")
+    await upload.receive(request)
     
-    # Save new file
+    # Save new file (temp file renamed to its content hash)
     try:
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-        logger.info(f"💾 Saved avatar: {unique_filename}")
+        unique_filename = await upload.commit()
     except Exception as e:
         logger.error(f"❌ Error saving file: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to save file"
         )
+    if upload.created:
+        logger.info(f"💾 Saved avatar: {unique_filename} ({upload.size} bytes)")
+        # Resized WebP variants are generated in the background
+        get_variant_service().schedule(unique_filename)
+    else:
+        logger.info(f"♻️ Avatar already stored: {unique_filename}")
     
     # Update user avatar_url in database
     avatar_url = f"/api/users/avatars/{unique_filename}"
     users_collection = get_users_collection()
-    await users_collection.update_one(
-        {"_id": current_user["_id"]},
-        {
-            "$set": {
-                "avatar_url": avatar_url,
-                "updated_at": datetime.utcnow()
+    try:
+        await users_collection.update_one(
+            {"_id": current_user["_id"]},
+            {
+                "$set": {
+                    "avatar_url": avatar_url,
+                    "updated_at": datetime.utcnow()
+                }
             }
-        }
-    )
+        )
+    except Exception:
+        if upload.created:
+            await schedule_deletion(unique_filename)
+        raise
+    await get_user_cache().invalidate(current_user)
+    
+    # Files are shared by content: the old one is deleted later, by the
+    # garbage collector, if nobody references it by then
+    old_avatar_url = current_user.get("avatar_url")
+    if old_avatar_url and old_avatar_url != avatar_url:
+        await schedule_deletion(old_avatar_url.split("/")[-1])
     
     logger.info(f"✅ Avatar uploaded successfully for: {current_user['email']}")
     
@@ -402,28 +468,58 @@ async def upload_avatar(
 
 
 @router.get("/avatars/{filename}")
-async def get_avatar(filename: str):
-    """Serve avatar image file"""
-    file_path = settings.UPLOAD_DIR / filename
-    
-    if not file_path.exists() or not file_path.is_file():
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Avatar not found"
-        )
-    
+async def get_avatar(
+    request: Request,
+    filename: str,
+    size: Optional[int] = Query(None, ge=1, le=4096, description="Display size in px (picks the nearest larger variant)")
+):
+    """
+    Serve avatar image file (or a resized WebP variant), with ETag/304 and
+    Range support; with S3 storage, a redirect to a presigned URL
+    """
     # Validate filename to prevent directory traversal
-    if ".." in filename or "/" in filename or "\\" in filename:
+    if ".." in filename or "/" in filename or "\\" in filename or filename.startswith("."):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid filename"
         )
     
-    return FileResponse(
-        path=file_path,
-        media_type="image/jpeg",  # Will be auto-detected by browser
-        filename=filename
-    )
+    # Names are content hashes (or unique legacy names): the bytes never change
+    stem = Path(filename).stem
+    storage = get_storage()
+    cache_control = f"public, max-age={settings.AVATAR_CACHE_MAX_AGE}, immutable"
+    variant_missing = False
+    
+    variant_size = pick_variant_size(size) if size else None
+    if variant_size is not None:
+        try:
+            return await storage.serve(
+                request,
+                variant_filename(filename, variant_size),
+                VARIANT_MEDIA_TYPE,
+                f'"{stem}-{variant_size}"',
+                cache_control
+            )
+        except HTTPException as e:
+            if e.status_code != status.HTTP_404_NOT_FOUND:
+                raise
+        # Not generated yet: send the original meanwhile, cached briefly
+        variant_missing = True
+        cache_control = "public, max-age=60"
+    
+    try:
+        response = await storage.serve(request, filename, media_type_for(filename), f'"{stem}"', cache_control)
+    except HTTPException as e:
+        if e.status_code == status.HTTP_404_NOT_FOUND:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Avatar not found"
+            )
+        raise
+    
+    if variant_missing:
+        get_variant_service().schedule(filename)
+    return response
 
 @router.post("/forgot-password", response_model=MessageResponse)
 async def forgot_password(data: ForgotPassword):
@@ -431,10 +527,7 @@ async def forgot_password(data: ForgotPassword):
     logger.info(f"🔐 Password reset request for: {data.email}")
     
     users_collection = get_users_collection()
-    user = await users_collection.find_one({
-        "email": data.email,
-        "is_deleted": False
-    })
+    user = await find_user_by_email(data.email, {"email": 1})
     
     if not user:
         return {"message": "If email exists, password reset link has been sent"}
@@ -452,6 +545,7 @@ async def forgot_password(data: ForgotPassword):
             }
         }
     )
+    await get_user_cache().invalidate(user)
     
     logger.info(f"✅ Password reset token generated for: {data.email}")
     
@@ -463,7 +557,7 @@ async def forgot_password(data: ForgotPassword):
 @router.post("/reset-password", response_model=MessageResponse)
 async def reset_password(data: ResetPassword):
     """Reset password using token"""
-    logger.info(f"🔄 Password reset attempt")
+    logger.debug("🔄 Password reset attempt")
     
     users_collection = get_users_collection()
     user = await users_collection.find_one({
@@ -487,72 +581,97 @@ async def reset_password(data: ResetPassword):
         {"_id": user["_id"]},
         {
             "$set": {
-                "password_hash": get_password_hash(data.new_password),
+                "password_hash": await get_password_service().hash(data.new_password),
                 "reset_password_token": None,
                 "reset_password_expires": None,
                 "updated_at": datetime.utcnow()
             }
         }
     )
+    await get_user_cache().invalidate(user)
     
     logger.info(f"✅ Password reset successful for: {user['email']}")
     
     return {"message": "Password reset successfully"}
 
 
-@router.get("/stats", response_model=UserStatsResponse)
-async def get_user_stats(admin_user: dict = Depends(get_current_admin)):
-    """Get user statistics (Admin only)"""
-    logger.info(f"📊 Stats request from admin: {admin_user['email']}")
-    
+async def compute_user_stats(days: int) -> dict:
+    """
+    Compute user statistics with a single aggregation:
+    totals, verified, per-role counts and a daily signup histogram.
+    The $group runs on each shard (only partial counts reach the merging
+    node, unlike $facet); the few resulting rows are summed here.
+    """
     users_collection = get_users_collection()
     
-    total_users = await users_collection.count_documents({"is_deleted": False})
-    verified_users = await users_collection.count_documents({
-        "is_email_verified": True,
-        "is_deleted": False
-    })
-    customers = await users_collection.count_documents({
-        "role": "customer",
-        "is_deleted": False
-    })
-    admins = await users_collection.count_documents({
-        "role": "admin",
-        "is_deleted": False
-    })
-    
-    # Get daily signups for last 7 days
-    from datetime import timedelta
-    daily_signups = []
     today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    for i in range(6, -1, -1):  # Last 7 days
-        day_start = today - timedelta(days=i)
-        day_end = day_start + timedelta(days=1)
-        
-        count = await users_collection.count_documents({
-            "created_at": {
-                "$gte": day_start,
-                "$lt": day_end
+    window_start = today - timedelta(days=days - 1)
+    
+    pipeline = [
+        {"$match": {"is_deleted": False}},
+        {"$group": {
+            "_id": {
+                "role": "$role",
+                "verified": {"$eq": ["$is_email_verified", True]},
+                "day": {"$cond": [
+                    {"$gte": ["$created_at", window_start]},
+                    {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                    None
+                ]}
             },
-            "is_deleted": False
-        })
-        
-        daily_signups.append({
-            "date": day_start.strftime("%Y-%m-%d"),
-            "count": count
-        })
+            "count": {"$sum": 1}
+        }}
+    ]
     
-    logger.info(f"✅ Stats retrieved: total={total_users}, customers={customers}, admins={admins}")
+    summary = {"total_users": 0, "verified_users": 0, "customers": 0, "admins": 0}
+    daily_counts = {}
+    async for row in users_collection.aggregate(pipeline):
+        key, count = row["_id"], row["count"]
+        summary["total_users"] += count
+        if key.get("verified"):
+            summary["verified_users"] += count
+        if key.get("role") == "customer":
+            summary["customers"] += count
+        elif key.get("role") == "admin":
+            summary["admins"] += count
+        if key.get("day"):
+            daily_counts[key["day"]] = daily_counts.get(key["day"], 0) + count
+    
+    # Fill days without signups with 0
+    daily_signups = []
+    for i in range(days - 1, -1, -1):
+        day = (today - timedelta(days=i)).strftime("%Y-%m-%d")
+        daily_signups.append({"date": day, "count": daily_counts.get(day, 0)})
     
     return {
-        "total_users": total_users,
-        "verified_users": verified_users,
-        "customers": customers,
-        "admins": admins,
+        **summary,
+        "window_days": days,
         "daily_signups": daily_signups
     }
 
+# Short-TTL cache: concurrent dashboard loads share one aggregation
+stats_cache = SingleFlightCache(settings.STATS_CACHE_TTL)
+
+@router.get("/stats", response_model=UserStatsResponse)
+async def get_user_stats(
+    days: int = 7,
+    admin_user: dict = Depends(get_current_admin)
+):
+    """Get user statistics (Admin only) - days: 7, 30 or 90"""
+    logger.info(f"📊 Stats request from admin: {admin_user['email']}")
+    
+    if days not in settings.STATS_WINDOWS_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"days must be one of {list(settings.STATS_WINDOWS_DAYS)}"
+        )
+    
+    stats = await stats_cache.get_or_compute(f"stats:{days}", lambda: compute_user_stats(days))
+    
+    logger.info(f"✅ Stats retrieved: total={stats['total_users']}, customers={stats['customers']}, admins={stats['admins']}")
+    
+    return stats
+
 
 @router.delete("/me")
 async def delete_account(current_user: dict = Depends(get_current_user)):
@@ -568,6 +687,8 @@ async def delete_account(current_user: dict = Depends(get_current_user)):
             }
         }
     )
+    await get_user_cache().invalidate(current_user)
+    await release_user_keys(current_user)
     
     logger.info(f"✅ Account deleted for: {current_user['email']}")
     
@@ -575,12 +696,64 @@ async def delete_account(current_user: dict = Depends(get_current_user)):
 
 # ==================== ADMIN USER MANAGEMENT ====================
 
+# Only the fields of UserResponse are read from MongoDB (no hashes or tokens)
+USER_RESPONSE_PROJECTION = {
+    (field.alias or name): 1 for name, field in UserResponse.model_fields.items()
+}
+
+def encode_user_cursor(last_id: ObjectId) -> str:
+    """Opaque pagination cursor (position after the last returned _id)"""
+    return base64.urlsafe_b64encode(last_id.binary).decode("ascii").rstrip("=")
+
+def decode_user_cursor(cursor: str) -> ObjectId:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return ObjectId(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_user_filter(
+    role: Optional[str],
+    is_email_verified: Optional[bool],
+    is_active: Optional[bool]
+) -> dict:
+    query = {"is_deleted": False}
+    if role is not None:
+        query["role"] = role
+    if is_email_verified is not None:
+        query["is_email_verified"] = is_email_verified
+    if is_active is not None:
+        query["is_active"] = is_active
+    return query
+
 @router.get("/users", response_model=list[UserResponse])
-async def get_all_users(admin_user: dict = Depends(get_current_admin)):
-    """Get all users (Admin only)"""
+async def get_all_users(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    role: Optional[str] = None,
+    is_email_verified: Optional[bool] = None,
+    is_active: Optional[bool] = None,
+    admin_user: dict = Depends(get_current_admin)
+):
+    """
+    Get users page by page (Admin only)
+    - Keyset pagination on _id: pass the X-Next-Cursor header value as ?cursor=
+    - Filters: role, is_email_verified, is_active
+    """
+    query = build_user_filter(role, is_email_verified, is_active)
+    if cursor:
+        query["_id"] = {"$gt": decode_user_cursor(cursor)}
+    
     users_collection = get_users_collection()
-    users_cursor = users_collection.find({"is_deleted": False})
-    users = await users_cursor.to_list(length=None)
+    # Fetch one extra document to know whether another page exists
+    users = await users_collection.find(
+        query, USER_RESPONSE_PROJECTION
+    ).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = encode_user_cursor(users[-1]["_id"])
     
     # Convert _id to string
     for user in users:
@@ -588,6 +761,72 @@ async def get_all_users(admin_user: dict = Depends(get_current_admin)):
         
     return users
 
+@router.get("/users/export")
+async def export_users(
+    role: Optional[str] = None,
+    is_email_verified: Optional[bool] = None,
+    is_active: Optional[bool] = None,
+    admin_user: dict = Depends(get_current_admin)
+):
+    """Export users as NDJSON, streamed straight from the cursor (Admin only)"""
+    logger.info(f"📤 User export requested by: {admin_user['email']}")
+    
+    users_collection = get_users_collection()
+    users_cursor = users_collection.find(
+        build_user_filter(role, is_email_verified, is_active),
+        USER_RESPONSE_PROJECTION,
+        batch_size=settings.EXPORT_BATCH_SIZE
+    ).sort("_id", 1)
+    
+    async def generate_ndjson():
+        async for user in users_cursor:
+            user["_id"] = str(user["_id"])
+            yield UserResponse.model_validate(user).model_dump_json(by_alias=True) + "\n"
+    
+    return StreamingResponse(
+        generate_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=users.ndjson"}
+    )
+
+@router.get("/cache/stats", response_model=dict)
+async def get_cache_stats(admin_user: dict = Depends(get_current_admin)):
+    """Get user cache hit/miss statistics (Admin only)"""
+    return get_user_cache().stats()
+
+@router.get("/security/hash-stats", response_model=dict)
+async def get_hash_stats(admin_user: dict = Depends(get_current_admin)):
+    """Get password hashing pool metrics: queue wait, hash time (Admin only)"""
+    return get_password_service().stats()
+
+@router.get("/avatar-variants/stats", response_model=dict)
+async def get_avatar_variant_stats(admin_user: dict = Depends(get_current_admin)):
+    """Get avatar resizing pool metrics: generated, failed, resize time (Admin only)"""
+    return get_variant_service().stats()
+
+@router.get("/avatar-storage/stats", response_model=dict)
+async def get_avatar_storage_stats(admin_user: dict = Depends(get_current_admin)):
+    """Get avatar storage backend, request counts and garbage collection (Admin only)"""
+    stats = get_storage().stats()
+    if avatar_gc.avatar_gc:
+        stats["gc"] = avatar_gc.avatar_gc.stats()
+    return stats
+
+@router.get("/logging", response_model=dict)
+async def get_logging(admin_user: dict = Depends(get_current_admin)):
+    """Get log level, sampling rules and dropped log records (Admin only)"""
+    return get_logging_stats()
+
+@router.put("/logging/level", response_model=dict)
+async def update_log_level(update: LogLevelUpdate, admin_user: dict = Depends(get_current_admin)):
+    """Change the log level of the root logger or of one logger at runtime (Admin only)"""
+    try:
+        stats = set_log_level(update.level, update.logger)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    logger.warning(f"📝 Log level of {update.logger or 'root'} set to {update.level.upper()} by {admin_user['email']}")
+    return stats
+
 @router.get("/users/{user_id}/verify", response_model=dict)
 async def verify_user(
     user_id: str
@@ -595,12 +834,19 @@ async def verify_user(
     """Verify user exists and is valid (No authentication required for inter-service calls)"""
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="Invalid user ID format")
-        
-    users_collection = get_users_collection()
-    user = await users_collection.find_one({"_id": ObjectId(user_id), "is_deleted": False})
     
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user_cache = get_user_cache()
+    generation = user_cache.generation()
+    user = await user_cache.get_by_id(user_id)
+    
+    if user is None:
+        users_collection = get_users_collection()
+        user = await users_collection.find_one({"_id": ObjectId(user_id), "is_deleted": False})
+        
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        await user_cache.set(user, generation)
     
     # Return verification result
     return {
@@ -661,6 +907,7 @@ async def update_user_by_admin(
         {"_id": ObjectId(user_id)},
         {"$set": update_data}
     )
+    await get_user_cache().invalidate(existing_user)
     
     updated_user = await users_collection.find_one({"_id": ObjectId(user_id)})
     updated_user["_id"] = str(updated_user["_id"])
@@ -678,17 +925,28 @@ async def delete_user_by_admin(
         
     users_collection = get_users_collection()
     
-    result = await users_collection.update_one(
-        {"_id": ObjectId(user_id)},
+    # Returns the document before the update (needed to invalidate by email)
+    deleted_user = await users_collection.find_one_and_update(
+        {"_id": ObjectId(user_id), "is_deleted": False},
         {
             "$set": {
                 "is_deleted": True,
                 "is_active": False,
                 "updated_at": datetime.utcnow()
             }
-        }
+        },
+        projection={"email": 1, "username": 1}
     )
     
+    if not deleted_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    await get_user_cache().invalidate(deleted_user)
+    await release_user_keys(deleted_user)
+    
+    return {"message": "User deleted successfully"}
+
+
 async def get_sharding_status():
     """Get detailed sharding information"""
     from ..database.connection import get_database, client
@@ -824,47 +1082,42 @@ async def get_db_stats():
 
 @router.post("/test-data/populate", response_model=dict)
 async def populate_test_data(
-    count: int = 50,
-    authorization: str = Header(None)
+    count: int = Query(50, ge=0, le=100000),
+    vehicles: int = Query(0, ge=0, le=100000),
+    bookings: int = Query(0, ge=0, le=100000),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    seed: Optional[int] = None,
+    admin_user: dict = Depends(get_current_admin)
 ):
-    """Populate test data for sharding demonstration"""
-    user = await verify_token(authorization)
-    
-    if user.get("role") != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin privileges required"
-        )
-    
-    from ..database.connection import get_database
-    from ..core.security import get_password_hash
-    from datetime import datetime
+    """
+    Populate test data for sharding demonstration (Admin only)
+    - count users, plus vehicles and bookings spread over HANOI/HO_CHI_MINH/DA_NANG
+    - For millions of documents use: python -m app.commands.generate_load_data
+    """
+    from ..database.load_data import generate_load_data
     
     db = get_database()
     
-    # Insert test users
-    users_data = [
-        {
-            "username": f"test_user_{i}",
-            "email": f"test{i}@example.com",
-            "full_name": f"Test User {i}",
-            "hashed_password": get_password_hash("Test123!"),
-            "role": "customer",
-            "phone": f"090{i:07d}",
-            "is_active": True,
-            "is_deleted": False,
-            "is_email_verified": True,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        for i in range(1, count + 1)
-    ]
+    # Same password for every test user -> hash once (off the event loop)
+    password_hash = await get_password_service().hash("Test123!")
     
-    result = await db.users.insert_many(users_data)
+    try:
+        report = await generate_load_data(
+            db,
+            users=count,
+            vehicles=vehicles,
+            bookings=bookings,
+            password_hash=password_hash,
+            batch_size=batch_size,
+            seed=seed
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     
     return {
         "message": f"{count} test users populated successfully",
-        "users_inserted": len(result.inserted_ids),
+        "users_inserted": report["inserted"].get("users", 0),
+        "report": report,
         "note": "Check distribution with /distribution endpoint"
     }
 
@@ -919,25 +1172,45 @@ async def get_user_distribution(authorization: str = Header(None)):
             detail=str(e)
         )
 
+def get_explain_stage(explain: dict) -> Optional[str]:
+    """Top stage of the winning plan (SINGLE_SHARD / SHARD_MERGE on mongos)"""
+    return explain.get('queryPlanner', {}).get('winningPlan', {}).get('stage')
+
 @router.get("/sharding/explain", response_model=dict)
 async def get_query_explain(
     collection: str = "users",
-    authorization: str = Header(None)
+    email: Optional[str] = None,
+    admin_user: dict = Depends(get_current_admin)
 ):
-    """Get explain plan for sharded query"""
-    user = await verify_token(authorization)
-    
-    if user.get("role") != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin privileges required"
-        )
-    
-    from ..database.connection import get_database
-    
+    """
+    Get explain plan for sharded query (Admin only)
+    - email: explain the email lookup path (user_lookup by _id, then users by _id)
+      next to the old broadcast query on users.email
+    """
     db = get_database()
     
     try:
+        if email:
+            lookup_explain = await db[LOOKUP_COLLECTION].find({"_id": email_key(email)}).explain()
+            broadcast_explain = await db.users.find({"email": email, "is_deleted": False}).explain()
+            
+            user_id = await resolve_user_id(email_key(email))
+            user_explain = None
+            if user_id is not None:
+                user_explain = await db.users.find({"_id": user_id, "is_deleted": False}).explain()
+            
+            return {
+                "email": email,
+                "routing": {
+                    "lookup_by_id": get_explain_stage(lookup_explain),
+                    "user_by_id": get_explain_stage(user_explain) if user_explain else None,
+                    "broadcast_by_email": get_explain_stage(broadcast_explain)
+                },
+                "lookup": lookup_explain.get('queryPlanner', {}),
+                "user": user_explain.get('queryPlanner', {}) if user_explain else None,
+                "broadcast": broadcast_explain.get('queryPlanner', {})
+            }
+        
         # Get explain for a simple query
         cursor = db[collection].find({}).limit(10)
         explain = await cursor.explain()
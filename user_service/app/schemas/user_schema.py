@@ -113,6 +113,12 @@ class TokenResponse(BaseModel):
     expires_in: int
 
 
+class LogLevelUpdate(BaseModel):
+    """Schema for changing the log level at runtime"""
+    level: str
+    logger: Optional[str] = None  # None = root logger
+
+
 class MessageResponse(BaseModel):
     """Schema for simple message response"""
     message: str
@@ -129,4 +135,5 @@ class UserStatsResponse(BaseModel):
     verified_users: int
     customers: int
     admins: int
+    window_days: int = 7
     daily_signups: list[DailySignup]
\ No newline at end of file
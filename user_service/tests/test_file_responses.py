@@ -0,0 +1,48 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.file_responses import _parse_range, etag_matches
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=900-2000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=999-999", (999, 999)),
+])
+def test_single_range(value, expected):
+    assert _parse_range(value, 1000) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "items=0-10",        # other unit
+    "bytes=0-10,20-30",  # multi-range: whole file
+    "bytes=abc-",
+    "bytes=-0",
+    "bytes=-",
+])
+def test_whole_file(value):
+    assert _parse_range(value, 1000) is None
+
+
+@pytest.mark.parametrize("value, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=20-10", 1000),
+    ("bytes=0-", 0),
+    ("bytes=-10", 0),
+    ("bytes=0-10", 0),
+])
+def test_unsatisfiable(value, size):
+    with pytest.raises(HTTPException) as error:
+        _parse_range(value, size)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == f"bytes */{size}"
+
+
+def test_etag_matches_weakly():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', 'W/"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
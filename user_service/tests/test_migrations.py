@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.database import migrations
+from app.database.migrations import FAILED, LeaseLost, Migration, MigrationRunner
+
+
+class Records:
+    """Just enough of a collection for the run record writes"""
+
+    def __init__(self):
+        self.doc = {"_id": "0001", "owner": None, "partitions": {}, "plan": [
+            {"name": name, "shard": shard} for name, shard in (("a", "s1"), ("b", "s1"), ("c", "s2"))
+        ]}
+        self.writes = []
+
+    async def update_one(self, query, update):
+        if any(self.doc.get(field) != value for field, value in query.items()):
+            return SimpleNamespace(matched_count=0)
+        self.writes.append(update)
+        for field, value in update.get("$set", {}).items():
+            self.doc[field] = value
+        return SimpleNamespace(matched_count=1)
+
+
+class Example(Migration):
+    version = "0001"
+    description = "example"
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    monkeypatch.setattr(migrations, "get_database", lambda: {"schema_migrations": Records()})
+    runner = MigrationRunner(max_docs_per_sec=0)
+    runner.records.doc["owner"] = runner.owner
+
+    async def claim(migration):
+        return runner.records.doc
+
+    runner._claim = claim
+    return runner
+
+
+def test_lease_is_renewed_while_partitions_scan_without_writing(runner, monkeypatch):
+    monkeypatch.setattr(migrations.settings, "MIGRATION_LEASE_SECONDS", 3)
+
+    async def silent_scan(migration, partition, checkpoint, counts):
+        await asyncio.sleep(2.2)
+
+    runner._run_partition = silent_scan
+    asyncio.run(runner.run(Example()))
+
+    renewals = [write for write in runner.records.writes if set(write["$set"]) == {"lease_until"}]
+    assert len(renewals) == 2
+    assert runner.records.doc["status"] == "done"
+
+
+def test_taken_over_lease_stops_the_run(runner, monkeypatch):
+    monkeypatch.setattr(migrations.settings, "MIGRATION_LEASE_SECONDS", 3)
+    cancelled = []
+
+    async def silent_scan(migration, partition, checkpoint, counts):
+        runner.records.doc["owner"] = "other-host:1"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(partition["name"])
+            raise
+
+    runner._run_partition = silent_scan
+    with pytest.raises(LeaseLost):
+        asyncio.run(runner.run(Example()))
+    assert sorted(cancelled) == ["a", "b", "c"]
+    assert runner.records.doc.get("status") != FAILED  # the new owner's record is left alone
+
+
+def test_failed_partition_cancels_the_others(runner):
+    cancelled = []
+
+    async def scan(migration, partition, checkpoint, counts):
+        if partition["name"] == "a":
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(partition["name"])
+            raise
+
+    runner._run_partition = scan
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(runner.run(Example()))
+    assert sorted(cancelled) == ["b", "c"]
+    assert runner.records.doc["status"] == FAILED
+    assert runner.records.doc["error"] == "RuntimeError: boom"